@@ -0,0 +1,116 @@
+import threading
+from collections import Counter
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+'''
+Process wide caches for assets which are expensive to create every frame.
+
+Images are decoded once per path and tilesets are created (and so sliced) once
+per (path, grid dimensions, render dimensions), then shared by everything that
+uses them. Fonts are loaded from disk once per (path, size). Rendered text
+surfaces are kept per (font, text, colour) and the least recently used are
+dropped once there are more than TEXT_CACHE_SIZE of them.
+
+counters records how many expensive loads and constructions really happened.
+
+Independent assets can be loaded concurrently with load_in_background, which runs
+the load on a small thread pool and returns a Future. Images, tilesets and fonts may
+be asked for from any thread, if one is already being loaded elsewhere the caller
+waits for it rather than loading it twice.
+
+'''
+
+TEXT_CACHE_SIZE = 512
+LOADER_THREADS = 4
+
+images = {}
+tilesets = {}
+fonts = {}
+text_surfaces = OrderedDict()
+counters = Counter()
+
+# Futures of the assets being loaded right now, by cache and key
+loading = {}
+loading_lock = threading.Lock()
+loader = None
+
+
+def load_in_background(load, *args):
+    # call load(*args) on the loader thread pool, returns a Future of its result
+    global loader
+    with loading_lock:
+        if loader is None:
+            loader = ThreadPoolExecutor(max_workers=LOADER_THREADS, thread_name_prefix="assets")
+    return loader.submit(load, *args)
+
+
+def get_cached(cache, key, load):
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    with loading_lock:
+        # it may have finished loading while we waited for the lock
+        value = cache.get(key)
+        if value is not None:
+            return value
+        future = loading.get((id(cache), key))
+        loads_here = future is None
+        if loads_here:
+            future = loading[(id(cache), key)] = Future()
+
+    if not loads_here:
+        return future.result()
+
+    try:
+        value = cache[key] = load()
+        future.set_result(value)
+        return value
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with loading_lock:
+            del loading[(id(cache), key)]
+
+
+def load_image(path):
+    counters['image_loads'] += 1
+    return pygame.image.load(path)
+
+
+def get_image(path):
+    return get_cached(images, path, lambda: load_image(path))
+
+
+def get_tileset(path, grid_dimensions, render_dimensions, rle=False):
+    from tile import Tileset
+
+    key = (path, tuple(grid_dimensions), tuple(render_dimensions), rle)
+    return get_cached(tilesets, key, lambda: Tileset(path, grid_dimensions, render_dimensions, rle))
+
+
+def load_font(path, size):
+    counters['font_loads'] += 1
+    return pygame.font.Font(path, size)
+
+
+def get_font(path, size):
+    return get_cached(fonts, (path, size), lambda: load_font(path, size))
+
+
+def render_text(font, text, colour, antialias=False):
+    key = (font, text, tuple(colour), antialias)
+    surface = text_surfaces.get(key)
+    if surface is not None:
+        text_surfaces.move_to_end(key)
+        return surface
+
+    surface = text_surfaces[key] = font.render(text, antialias, colour)
+    if len(text_surfaces) > TEXT_CACHE_SIZE:
+        text_surfaces.popitem(last=False)
+    return surface
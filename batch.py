@@ -0,0 +1,46 @@
+import pygame
+
+'''
+RenderBatch collects the blits of a frame and draws them with one Surface.blits call
+per layer, rather than one blit call each.
+
+Layers are drawn in order, so anything on a later layer is drawn over everything on
+an earlier one, whatever order they were submitted in. Within a layer blits are drawn
+in the order they were submitted.
+
+'''
+
+MAP = 0
+PLAYERS = 1
+SPELLS = 2
+OVERLAY = 3
+LAYERS = 4
+
+
+class RenderBatch():
+    def __init__(self, target, layers=LAYERS):
+        self.target = target
+        self.layers = [ [] for _ in range(layers) ]
+        self.flushes = 0
+        self.blit_count = 0
+
+    def blit(self, surface, position, layer=MAP):
+        # returns the area of the target that will be drawn over
+        self.layers[layer].append((surface, position))
+        return pygame.Rect(position, surface.get_size()).clip(self.target.get_rect())
+
+    def blit_many(self, blits, layer=MAP):
+        # add a list of (surface, position) pairs at once, the caller works out the areas
+        self.layers[layer].extend(blits)
+
+    def __len__(self):
+        return sum(len(layer) for layer in self.layers)
+
+    def flush(self):
+        # draw everything submitted since the last flush
+        for layer in self.layers:
+            if layer:
+                self.target.blits(layer, False)
+                self.flushes += 1
+                self.blit_count += len(layer)
+                layer.clear()
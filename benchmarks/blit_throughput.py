@@ -0,0 +1,88 @@
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+'''
+Blit throughput of a tile in each pixel format it could be kept in, drawn with one
+blit call per tile and with a single Surface.blits call for all of them.
+
+    as loaded          the subsurface of the tileset image, not converted
+    convert_alpha      the display's format with per pixel alpha, how tiles used to be kept
+    convert            the display's format without alpha, for opaque tiles
+    convert+rle        as above, RLE accelerated
+    convert_alpha+rle  per pixel alpha, RLE accelerated
+
+An opaque tile from the level tileset and a partly transparent one from the player
+tileset are measured, the convert formats only for the opaque one as they would lose
+the other's transparency. Numbers are megapixels drawn per second, higher is better.
+
+Run from the project directory:
+    python3 -m benchmarks.blit_throughput
+
+'''
+
+def formats(tile, opaque):
+    # (name, surface, RLE surface alpha or False), RLE is set after scaling as scaling drops it
+    tile = pygame.transform.scale(tile, (32, 32))
+    found = [
+        ('as loaded', tile, False),
+        ('convert_alpha', tile.convert_alpha(), False),
+    ]
+    if opaque:
+        found.append(('convert', tile.convert(), False))
+        found.append(('convert+rle', tile.convert(), None))
+    found.append(('convert_alpha+rle', tile.convert_alpha(), 255))
+    return found
+
+def throughput(screen, surface, positions, repeats, batched):
+    # prime RLE encoding, which happens on the first blit
+    screen.blit(surface, (0, 0))
+    blits = [ (surface, position) for position in positions ]
+    start = time.perf_counter()
+    for _ in range(repeats):
+        if batched:
+            screen.blits(blits, False)
+        else:
+            for position in positions:
+                screen.blit(surface, position)
+    elapsed = time.perf_counter() - start
+    pixels = surface.get_width() * surface.get_height() * len(positions) * repeats
+    return pixels / elapsed / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tiles', type=int, default=1024, help='tiles drawn per repeat')
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--screen', type=int, nargs=2, default=(1024, 1024))
+    args = parser.parse_args()
+
+    screen = pygame.display.set_mode(args.screen)
+    level_tiles = pygame.image.load('assets/tilesets/main.png')
+    player_tiles = pygame.image.load('assets/tilesets/player.png')
+    tiles = [
+        # DIRT, which has no transparent pixels
+        ('opaque', level_tiles.subsurface((2 * 64, 0, 64, 64)), True),
+        ('transparent', player_tiles.subsurface((0, 0, 32, 32)), False),
+    ]
+
+    rng = random.Random(1)
+    print('{:<12} {:<18} {:>14} {:>14}'.format('tile', 'format', 'blit Mpix/s', 'blits Mpix/s'))
+    for tile_name, tile, opaque in tiles:
+        for format_name, surface, rle_alpha in formats(tile, opaque):
+            if rle_alpha is not False:
+                surface.set_alpha(rle_alpha, pygame.RLEACCEL)
+            positions = [
+                (rng.randrange(0, args.screen[0] - 32), rng.randrange(0, args.screen[1] - 32))
+                for _ in range(args.tiles)
+            ]
+            single = throughput(screen, surface, positions, args.repeats, False)
+            batched = throughput(screen, surface, positions, args.repeats, True)
+            print('{:<12} {:<18} {:>14.1f} {:>14.1f}'.format(tile_name, format_name, single, batched))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+import argparse
+import concurrent.futures
+import multiprocessing
+import os
+import random
+import time
+
+from level import ProceduralLevel
+from network import GROUPS
+from network import Network
+import protocol
+
+'''
+A swarm of headless bots on the Pyre mesh, to find how many players it takes before
+the mesh falls over.
+
+--bots bots are started in worker processes, --per-process to a process, each with
+a real Network node on loopback in the world groups. Once they have had --discovery
+seconds to find each other they all walk the same ProceduralLevel for --seconds, a
+tile at a time through can_move_to, shouting their position position_send_rate
+times a second and casting --cast-rate spells a second, while reading everything
+the others shout.
+
+Each bot counts what it sent and received, and latency is taken from the timestamp
+every message carries to the moment the bot read it, which the bots' shared clock
+makes end to end. CPU is the process's own, Pyre's threads included, as a share of
+one core. Several counts can be given to run one swarm after another.
+
+Run from the project directory:
+    python3 -m benchmarks.bot_swarm --bots 2 4 8 16 --seconds 10
+
+'''
+
+MOVES = ((0, -1), (1, 0), (0, 1), (-1, 0))
+SPELL_VELOCITIES = ((0, -0.25), (0.25, 0), (0, 0.25), (-0.25, 0))
+# at most this many latencies from each bot go back to be summarised
+LATENCY_SAMPLES = 2000
+
+
+class Bot():
+    def __init__(self, number, level):
+        self.number = number
+        self.level = level
+        self.rng = random.Random(number)
+        self.network = Network(GROUPS)
+        self.encoder = protocol.Encoder()
+        self.x = self.rng.randrange(level.width)
+        self.y = self.rng.randrange(level.height)
+        while not level.can_move_to(self.x, self.y):
+            self.x = self.rng.randrange(level.width)
+            self.y = self.rng.randrange(level.height)
+        self.reset()
+
+    def reset(self):
+        self.sent = 0
+        self.spells_sent = 0
+        self.received = 0
+        self.spells_received = 0
+        self.latencies = []
+
+    def step(self, cast_chance):
+        dx, dy = self.rng.choice(MOVES)
+        if self.level.can_move_to(self.x + dx, self.y + dy):
+            self.x += dx
+            self.y += dy
+        self.network.shout("world:position", self.encoder.encode(protocol.POSITION, (self.x, self.y)))
+        self.sent += 1
+        if self.rng.random() < cast_chance:
+            vx, vy = self.rng.choice(SPELL_VELOCITIES)
+            self.network.shout("world:combat", self.encoder.encode(protocol.SPELL, (self.x + 0.375, self.y + 0.375, vx, vy)))
+            self.spells_sent += 1
+
+    def receive(self):
+        for event in self.network.get_events():
+            if event.type != "SHOUT" or event.message is None:
+                continue
+            if event.message.kind == protocol.POSITION:
+                self.received += 1
+                # both ends use the same wall clock, wrapped at 32 bits
+                self.latencies.append((protocol.timestamp_ms() - event.message.timestamp) & 0xFFFFFFFF)
+            elif event.message.kind == protocol.SPELL:
+                self.spells_received += 1
+
+    def summary(self, elapsed, peers):
+        latencies = sorted(self.latencies)
+        if len(latencies) > LATENCY_SAMPLES:
+            step = len(latencies) / LATENCY_SAMPLES
+            samples = [ latencies[int(index * step)] for index in range(LATENCY_SAMPLES) ]
+        else:
+            samples = latencies
+        return {
+            'bot': self.number,
+            'pid': os.getpid(),
+            'peers': peers,
+            'sent': self.sent,
+            'spells_sent': self.spells_sent,
+            'received': self.received,
+            'spells_received': self.spells_received,
+            'send_rate': (self.sent + self.spells_sent) / elapsed,
+            'receive_rate': (self.received + self.spells_received) / elapsed,
+            'latency_p50': percentile(latencies, 0.5),
+            'latency_p95': percentile(latencies, 0.95),
+            'latency_max': latencies[-1] if latencies else float('nan'),
+            'latency_samples': samples,
+            'decode_errors': self.network.decode_errors,
+        }
+
+
+def run_bots(numbers, size, seed, start_at, end_at, send_rate, cast_rate):
+    # runs in a worker process, start_at and end_at are wall clock times every process shares
+    level = ProceduralLevel(seed, size, size)
+    bots = [ Bot(number, level) for number in numbers ]
+    try:
+        # discovery, reading and throwing away whatever arrives meanwhile
+        while time.time() < start_at:
+            for bot in bots:
+                bot.network.get_events()
+            time.sleep(0.01)
+        peers = [ len(bot.network.peers()) for bot in bots ]
+        for bot in bots:
+            bot.reset()
+
+        cast_chance = cast_rate / send_rate
+        interval = 1.0 / send_rate
+        cpu_start = time.process_time()
+        start = time.time()
+        next_send = start
+        while True:
+            now = time.time()
+            if now >= end_at:
+                break
+            if now >= next_send:
+                for bot in bots:
+                    bot.step(cast_chance)
+                next_send = max(next_send + interval, now - interval)
+            for bot in bots:
+                bot.receive()
+            time.sleep(0.001)
+        elapsed = time.time() - start
+        cpu = (time.process_time() - cpu_start) / elapsed
+        return [ dict(bot.summary(elapsed, peer_count), cpu=cpu) for bot, peer_count in zip(bots, peers) ]
+    finally:
+        for bot in bots:
+            bot.network.stop()
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float('nan')
+
+def swarm(bots, per_process, args):
+    numbers = list(range(bots))
+    groups = [ numbers[index:index + per_process] for index in range(0, bots, per_process) ]
+    with concurrent.futures.ProcessPoolExecutor(len(groups)) as pool:
+        # start the processes before setting the clock running, spawning them is slow
+        list(pool.map(int, range(len(groups))))
+        start_at = time.time() + args.discovery
+        end_at = start_at + args.seconds
+        futures = [ pool.submit(run_bots, group, args.size, args.seed, start_at, end_at, args.send_rate, args.cast_rate)
+            for group in groups ]
+        return [ result for future in futures for result in future.result() ]
+
+def print_bots(results):
+    print('{:>4} {:>7} {:>6} {:>9} {:>9} {:>8} {:>8} {:>8} {:>6}'.format(
+        'bot', 'pid', 'peers', 'sent/s', 'recv/s', 'p50 ms', 'p95 ms', 'max ms', 'cpu%'))
+    for result in results:
+        print('{bot:>4} {pid:>7} {peers:>6} {send_rate:>9.1f} {receive_rate:>9.1f} {latency_p50:>8.1f} '
+              '{latency_p95:>8.1f} {latency_max:>8.1f} {0:>6.1f}'.format(result['cpu'] * 100, **result))
+
+def summarise(bots, results):
+    # share of the positions sent that reached every other bot
+    expected = sum(result['sent'] for result in results) * (bots - 1)
+    received = sum(result['received'] for result in results)
+    latencies = [ latency for result in results for latency in result['latency_samples'] ]
+    cpus = list({ result['pid']: result['cpu'] for result in results }.values())
+    return (
+        bots,
+        sum(1 for result in results if result['peers'] == bots - 1),
+        sum(result['send_rate'] for result in results) / bots,
+        sum(result['receive_rate'] for result in results) / bots,
+        received / expected * 100 if expected else float('nan'),
+        percentile(latencies, 0.5),
+        percentile(latencies, 0.95),
+        max(result['latency_max'] for result in results),
+        sum(cpus) / len(cpus) * 100,
+        max(cpus) * 100,
+        sum(result['decode_errors'] for result in results),
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--bots', type=int, nargs='+', default=(2, 4, 8))
+    parser.add_argument('--per-process', type=int, default=1, help='bots run by each worker process')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--discovery', type=float, default=5, help='seconds the bots have to find each other first')
+    parser.add_argument('--send-rate', type=float, default=15, help='positions each bot sends a second')
+    parser.add_argument('--cast-rate', type=float, default=1, help='spells each bot casts a second')
+    parser.add_argument('--size', type=int, default=64, help='width and height of the level')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--verbose', action='store_true', help='print every bot, not just the totals')
+    args = parser.parse_args()
+
+    # every bot starts its own Pyre node, none should inherit a copy of another's threads
+    multiprocessing.set_start_method('spawn')
+    rows = []
+    for bots in args.bots:
+        results = swarm(bots, args.per_process, args)
+        if args.verbose:
+            print('{0} bots'.format(bots))
+            print_bots(results)
+            print()
+        rows.append(summarise(bots, results))
+
+    print('{:>5} {:>6} {:>8} {:>8} {:>10} {:>8} {:>8} {:>8} {:>9} {:>8} {:>7}'.format(
+        'bots', 'meshed', 'sent/s', 'recv/s', 'delivered', 'p50 ms', 'p95 ms', 'max ms', 'mean cpu', 'max cpu', 'errors'))
+    for row in rows:
+        print('{:>5} {:>6} {:>8.1f} {:>8.1f} {:>9.1f}% {:>8.1f} {:>8.1f} {:>8.1f} {:>8.1f}% {:>7.1f}% {:>7}'.format(*row))
+    print('sent/s and recv/s are per bot, meshed is how many bots had found all the others')
+
+if __name__ == '__main__':
+    main()
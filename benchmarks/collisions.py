@@ -0,0 +1,72 @@
+import argparse
+import random
+import time
+
+import numpy
+from pygame.rect import Rect
+
+from level import ChunkedProceduralLevel
+from projectile import ProjectileSystem
+
+'''
+Time to find every spell-vs-player hit for every player, using the
+ProjectileSystem spatial hash versus Rect.colliderect for every spell against
+every player (what Spell.hit_target did, for the local player only).
+
+Run from the project directory:
+    python3 -m benchmarks.collisions --players 10 100 --spells 1000 10000
+
+'''
+
+class Target():
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--players', type=int, nargs='+', default=[10, 100])
+    parser.add_argument('--spells', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--area', type=int, default=64, help='width of the square everything is spread over')
+    args = parser.parse_args()
+
+    level = ChunkedProceduralLevel(42)
+    rng = random.Random(1)
+    print('{:>8} {:>8} {:>14} {:>14} {:>6} {:>6}'.format('players', 'spells', 'colliderect ms', 'hash ms', 'hits', 'equal'))
+    for player_count in args.players:
+        for spell_count in args.spells:
+            players = [ Target(rng.randrange(args.area), rng.randrange(args.area)) for _ in range(player_count) ]
+            projectiles = ProjectileSystem(level)
+            for _ in range(spell_count):
+                projectiles.spawn(rng.choice(players), rng.uniform(0, args.area), rng.uniform(0, args.area), 0, 0)
+
+            start = time.perf_counter()
+            spell_rects = [ (i, Rect(x * 32, y * 32, 8, 8), projectiles.owners[owner])
+                for i, (x, y, owner) in enumerate(zip(projectiles.x[:spell_count].tolist(),
+                    projectiles.y[:spell_count].tolist(), projectiles.owner[:spell_count].tolist())) ]
+            brute = set()
+            for player in players:
+                player_rect = Rect(player.x * 32, player.y * 32, 32, 32)
+                for i, rect, owner in spell_rects:
+                    if owner is not player and rect.colliderect(player_rect):
+                        brute.add((i, id(player)))
+            brute_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            projectiles.spatial_hash_dirty = True
+            hits = projectiles.find_hits(players)
+            hash_ms = (time.perf_counter() - start) * 1000
+
+            # colliderect works in truncated pixels, check the hash against exact all-pairs overlaps
+            exact = set()
+            xs = projectiles.x[:spell_count]
+            ys = projectiles.y[:spell_count]
+            for player in players:
+                overlapping = (xs >= player.x - 0.25) & (xs < player.x + 1) & (ys >= player.y - 0.25) & (ys < player.y + 1)
+                overlapping &= projectiles.owner[:spell_count] != projectiles.owner_ids.get(player, -1)
+                exact.update((i, id(player)) for i in numpy.flatnonzero(overlapping).tolist())
+            found = set((i, id(player)) for i, player in hits)
+            print('{:>8} {:>8} {:>14.3f} {:>14.3f} {:>6} {:>6}'.format(
+                player_count, spell_count, brute_ms, hash_ms, len(hits), str(found == exact)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+import argparse
+import json
+import platform
+import random
+import time
+
+import numpy
+import pygame
+
+import client
+from level import ChunkedProceduralLevel
+from level import ProceduralLevel
+from local_network import LocalNetwork
+import tile
+
+'''
+Frame times of the whole GameClient loop, run headless against a LocalNetwork of
+synthetic peers, across numbers of peers, numbers of live spells and level sizes.
+
+Each scenario runs a fresh client for some warm up frames and then records the
+time of every frame, uncapped, and reports the 50th, 95th and 99th percentiles in
+milliseconds. The results are written as JSON, and a previous results file can be
+given as a baseline to flag scenarios whose p95 got worse by more than a threshold.
+With --profile the client's FrameProfiler also runs and each scenario includes the
+average milliseconds spent in each phase of the frame.
+
+Run from the project directory:
+    python3 -m benchmarks.frame_times --output frame_times.json
+    python3 -m benchmarks.frame_times --baseline frame_times.json --output new.json
+
+'''
+
+PEERS = (0, 10, 100)
+SPELLS = (0, 1000)
+LEVELS = ('chunked', '64', '1024')
+
+
+class SpellOwner():
+    pass
+
+
+def create_level(name):
+    if name == 'chunked':
+        return ChunkedProceduralLevel(42)
+    size = int(name)
+    return ProceduralLevel(42, size, size)
+
+def add_spells(game, count, seed):
+    # spells that hover in open tiles on screen, so they stay alive for the whole run
+    projectiles = game.map.projectiles
+    projectiles.max_age = 1 << 30
+    level = game.map.level
+    radius = client.width // 2 // 32
+    rng = random.Random(seed)
+    owner = SpellOwner()
+    while projectiles.count < count:
+        xs = numpy.array([ rng.randint(-radius, radius) for _ in range(count) ])
+        ys = numpy.array([ rng.randint(-radius, radius) for _ in range(count) ])
+        free = (level.get_attributes(xs, ys, outside=tile.TileAttribute.COLLIDE.value) & tile.TileAttribute.COLLIDE.value) == 0
+        for x, y in zip(xs[free].tolist(), ys[free].tolist()):
+            if projectiles.count >= count:
+                break
+            projectiles.spawn(owner, x + 0.375, y + 0.375, 0, 0)
+
+def run_scenario(peers, spells, level_name, frames, warmup, seed, profile=False):
+    network = LocalNetwork(peers, seed=seed)
+    game = client.GameClient(headless=True, network=network, level=create_level(level_name))
+    game.tickspeed = 0
+    # one simulation tick per frame, however fast the frames are
+    game.fixed_frame_time = 1.0 / client.simulation_rate
+    game.profiler.set_enabled(profile)
+    add_spells(game, spells, seed)
+
+    frame_times = []
+    game.run(max_frames=warmup + frames, frame_times=frame_times)
+    milliseconds = numpy.array(frame_times[warmup:]) * 1000
+    result = {
+        'peers': peers,
+        'spells': spells,
+        'level': level_name,
+        'frames': frames,
+        'p50_ms': float(numpy.percentile(milliseconds, 50)),
+        'p95_ms': float(numpy.percentile(milliseconds, 95)),
+        'p99_ms': float(numpy.percentile(milliseconds, 99)),
+        'mean_ms': float(milliseconds.mean()),
+    }
+    if profile:
+        timings = game.profiler.recent()[-frames:]
+        result['phase_mean_ms'] = { phase: float(timings[:, column].mean() * 1000) for phase, column in game.profiler.columns.items() }
+    return result
+
+def scenario_key(result):
+    return (result['peers'], result['spells'], result['level'])
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path) as baseline_file:
+        baseline = { scenario_key(result): result for result in json.load(baseline_file)['results'] }
+
+    regressions = []
+    for result in results:
+        before = baseline.get(scenario_key(result))
+        if before is not None and result['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            regressions.append((result, before))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--warmup', type=int, default=30)
+    parser.add_argument('--peers', type=int, nargs='+', default=PEERS)
+    parser.add_argument('--spells', type=int, nargs='+', default=SPELLS)
+    parser.add_argument('--levels', nargs='+', default=LEVELS, help="'chunked' or the width and height of a fixed level")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='frame_times.json')
+    parser.add_argument('--baseline', help='previous results to compare against')
+    parser.add_argument('--profile', action='store_true', help='record the average time of each phase of the frame')
+    parser.add_argument('--threshold', type=float, default=0.2, help='fraction p95 may grow by before it counts as a regression')
+    args = parser.parse_args()
+
+    results = []
+    print('{:>6} {:>7} {:>8} {:>8} {:>8} {:>8}'.format('peers', 'spells', 'level', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for level_name in args.levels:
+        for peers in args.peers:
+            for spells in args.spells:
+                result = run_scenario(peers, spells, level_name, args.frames, args.warmup, args.seed, args.profile)
+                results.append(result)
+                print('{peers:>6} {spells:>7} {level:>8} {p50_ms:>8.2f} {p95_ms:>8.2f} {p99_ms:>8.2f}'.format(**result))
+                if args.profile:
+                    print('       ' + ', '.join('{} {:.2f}'.format(phase, ms) for phase, ms in result['phase_mean_ms'].items()))
+    pygame.quit()
+
+    with open(args.output, 'w') as output_file:
+        json.dump({
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'results': results,
+        }, output_file, indent=2)
+    print('results written to', args.output)
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.threshold)
+        for result, before in regressions:
+            print('regression: {peers} peers, {spells} spells, level {level}: p95 {0:.2f} ms -> {1:.2f} ms'.format(
+                before['p95_ms'], result['p95_ms'], **result))
+        if regressions:
+            raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
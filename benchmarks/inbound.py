@@ -0,0 +1,84 @@
+import argparse
+import time
+
+import protocol
+from inbound import InboundPipeline
+from interpolation import SnapshotBuffer
+from local_network import LocalNetwork
+from player import Position
+from player import SpellProperties
+
+'''
+Catching up on the network after the render loop stalls, applying every event that
+arrived in order versus applying what an InboundPipeline keeps of them.
+
+A LocalNetwork of --peers peers runs for --stall seconds of frames while nothing is
+read, then the whole backlog is applied in one frame: positions into each peer's
+snapshot buffer, as remote players get them, and spells into a list. The backlog is
+applied as though the frame came right after the stall, so spells older than the
+pipeline's max_age are dropped.
+
+Run from the project directory:
+    python3 -m benchmarks.inbound --peers 100 --stall 2
+
+'''
+
+def backlog(peers, stall, fps, seed):
+    network = LocalNetwork(peers, move_chance=0.5, cast_chance=0.05, seed=seed)
+    # the ENTER events come first
+    events = network.get_events()
+    for _ in range(int(stall * fps)):
+        events.extend(network.get_events())
+    return events
+
+def newest(buffer):
+    return buffer.xs[buffer.index(0)], buffer.ys[buffer.index(0)]
+
+def apply(events, buffers, spells):
+    for event in events:
+        if event.type != "SHOUT":
+            continue
+        if event.message.kind == protocol.POSITION:
+            buffers.setdefault(event.peer_uuid, SnapshotBuffer()).add(event.time, *Position(*event.message.values))
+        else:
+            spells.append(SpellProperties(*event.message.values))
+
+def apply_all(events):
+    sequences = protocol.SequenceTracker()
+    buffers = {}
+    spells = []
+    start = time.perf_counter()
+    apply([ event for event in events if event.type != "SHOUT" or sequences.accept(event.peer_uuid, event.message) ], buffers, spells)
+    return time.perf_counter() - start, buffers, spells
+
+def apply_pipeline(events, now):
+    pipeline = InboundPipeline()
+    buffers = {}
+    spells = []
+    start = time.perf_counter()
+    apply(pipeline.process(events, now), buffers, spells)
+    return time.perf_counter() - start, buffers, spells, pipeline.stats()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--peers', type=int, nargs='+', default=(10, 100))
+    parser.add_argument('--stall', type=float, nargs='+', default=(0.1, 2))
+    parser.add_argument('--fps', type=int, default=60)
+    args = parser.parse_args()
+
+    print('{:>6} {:>8} {:>8} {:>12} {:>13} {:>10} {:>8} {:>10} {:>10}'.format(
+        'peers', 'stall s', 'events', 'apply all ms', 'pipeline ms', 'coalesced', 'dropped', 'applied', 'same ends'))
+    for peers in args.peers:
+        for stall in args.stall:
+            events = backlog(peers, stall, args.fps, 1)
+            now = time.monotonic() + stall
+            all_time, all_buffers, all_spells = apply_all(events)
+            pipeline_time, buffers, spells, stats = apply_pipeline(events, now)
+            # every peer should end up where the full replay leaves it
+            same = all(newest(buffers[peer]) == newest(buffer) for peer, buffer in all_buffers.items())
+            print('{:>6} {:>8} {:>8} {:>12.2f} {:>13.2f} {:>10} {:>8} {:>10} {:>10}'.format(
+                peers, stall, len(events), all_time * 1000, pipeline_time * 1000,
+                stats['coalesced'], stats['dropped'], stats['applied'], str(same)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import os
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from level import ChunkedProceduralLevel
+from map import Map
+from renderer import IncrementalRenderer
+from tile import Tileset
+from tile import TileType
+
+'''
+Time per frame of redrawing the whole screen every frame versus the
+IncrementalRenderer, with the centre player standing still or walking a tile
+every few frames, and a handful of sprites moving around it. Then the same with
+--spells small squares flying all over the screen, the busy frames where the
+renderer gives up and redraws everything, and with a tile near the player changed
+every few frames.
+
+Run from the project directory:
+    python3 -m benchmarks.incremental_render --frames 600
+
+'''
+
+white = (255, 255, 255)
+
+def draw_sprites(screen, game_map, player, sprite, count, frame):
+    drawn = []
+    for i in range(count):
+        pos = game_map.get_pixel_pos(player.x + (i % 5) - 2, player.y + (i // 5) - 2 + (frame // 10) % 2)
+        drawn.append(screen.blit(sprite, pos))
+    return drawn
+
+def draw_spells(screen, spell, count, frame):
+    width, height = screen.get_size()
+    return [ screen.blit(spell, ((i * 97 + frame * 3) % width, (i * 61 + frame * (1 + i % 3)) % height)) for i in range(count) ]
+
+def run(incremental, frames, step_every, sprites, spells=0, change_every=0):
+    screen = pygame.display.set_mode((1024, 1024))
+    tileset = Tileset('assets/tilesets/main.png', (16, 16), (32, 32))
+    game_map = Map(screen, ChunkedProceduralLevel(42), tileset, None)
+    player = SimpleNamespace(x=0, y=0)
+    game_map.set_centre_player(player)
+    renderer = IncrementalRenderer(screen, game_map, white)
+    sprite = tileset.get_surface_by_id(0)
+    spell = pygame.Surface((8, 8))
+    level = game_map.level
+    # a tile near the player flips between what it was and something else
+    changed = (player.x + 3, player.y + 2)
+    original = level.get_tile(*changed)
+    tiles = (TileType.BRICK if original != TileType.BRICK else TileType.DIRT, original)
+
+    start = time.perf_counter()
+    for frame in range(frames):
+        if step_every and frame % step_every == 0:
+            player.x += 1
+        if change_every and frame and frame % change_every == 0:
+            level.set_tile(changed[0], changed[1], tiles[(frame // change_every) % 2])
+        if incremental:
+            renderer.begin_frame()
+            renderer.drawn(draw_sprites(screen, game_map, player, sprite, sprites, frame))
+            renderer.drawn(draw_spells(screen, spell, spells, frame))
+            renderer.end_frame()
+        else:
+            screen.fill(white)
+            game_map.render()
+            draw_sprites(screen, game_map, player, sprite, sprites, frame)
+            draw_spells(screen, spell, spells, frame)
+            pygame.display.update()
+    elapsed = time.perf_counter() - start
+    return elapsed / frames * 1000, pygame.image.tostring(screen, 'RGB')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--sprites', type=int, default=10)
+    parser.add_argument('--spells', type=int, nargs='+', default=(200, 1000))
+    args = parser.parse_args()
+
+    pygame.display.init()
+    cases = [ (name, step_every, 0, 0) for name, step_every in
+        (('idle', 0), ('step every 16 frames', 16), ('step every 4 frames', 4), ('step every frame', 1)) ]
+    cases += [ ('{0} spells'.format(spells), 0, spells, 0) for spells in args.spells ]
+    cases.append(('tile change every 8', 0, 0, 8))
+    for name, step_every, spells, change_every in cases:
+        full_ms, full_frame = run(False, args.frames, step_every, args.sprites, spells, change_every)
+        incremental_ms, incremental_frame = run(True, args.frames, step_every, args.sprites, spells, change_every)
+        print('{:<22} full {:7.3f} ms   incremental {:7.3f} ms   {:5.1f}%   identical frames: {}'.format(
+            name, full_ms, incremental_ms, 100 * incremental_ms / full_ms, full_frame == incremental_frame))
+
+if __name__ == '__main__':
+    main()
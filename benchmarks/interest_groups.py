@@ -0,0 +1,93 @@
+import argparse
+import sys
+import time
+
+from interest import InterestManager
+from interest import base_group
+from network import GROUPS
+from network import Network
+import protocol
+
+'''
+Starts several in-process Pyre nodes over loopback, places them in clusters far
+apart on the map, has every node shout the same number of position updates, and
+counts how many updates each node receives: once with everybody in the single
+world groups, once with area of interest groups. Exits with an error if any node
+didn't receive exactly the updates of the nodes it should hear from.
+
+Run from the project directory:
+    python3 -m benchmarks.interest_groups --clusters 3 --per-cluster 2
+
+'''
+
+def wait_for_peers(nodes, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if all(len(node.peers()) == len(nodes) - 1 for node in nodes):
+            return True
+        time.sleep(0.2)
+    return False
+
+def run(positions, messages, interest, settle, timeout):
+    nodes = [ Network(() if interest else GROUPS) for _ in positions ]
+    try:
+        managers = []
+        if interest:
+            managers = [ InterestManager(node, GROUPS) for node in nodes ]
+            for manager, position in zip(managers, positions):
+                manager.update(*position)
+
+        if not wait_for_peers(nodes, timeout):
+            raise RuntimeError('Nodes did not discover each other over loopback')
+        # let the JOINs reach everyone before shouting
+        time.sleep(settle)
+        for node in nodes:
+            node.get_events()
+
+        for index, (node, position) in enumerate(zip(nodes, positions)):
+            group = managers[index].shout_group("world:position") if interest else "world:position"
+            encoder = protocol.Encoder()
+            for _ in range(messages):
+                node.shout(group, encoder.encode(protocol.POSITION, position))
+
+        time.sleep(settle)
+        received = []
+        for node in nodes:
+            events = node.get_events()
+            received.append(sum(1 for event in events
+                if event.type == "SHOUT" and base_group(event.group) == "world:position"))
+        return received
+    finally:
+        for node in nodes:
+            node.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clusters', type=int, default=3)
+    parser.add_argument('--per-cluster', type=int, default=2)
+    parser.add_argument('--messages', type=int, default=20, help='position updates shouted by each node')
+    parser.add_argument('--settle', type=float, default=2.0, help='seconds to wait for joins and messages to arrive')
+    parser.add_argument('--timeout', type=float, default=30.0, help='seconds to wait for discovery')
+    args = parser.parse_args()
+
+    # clusters ten regions apart, far outside each other's area of interest
+    positions = [ (cluster * 320 + member, 5) for cluster in range(args.clusters) for member in range(args.per_cluster) ]
+
+    everyone = run(positions, args.messages, False, args.settle, args.timeout)
+    regional = run(positions, args.messages, True, args.settle, args.timeout)
+
+    print('{:>5} {:>12} {:>16} {:>16}'.format('node', 'position', 'world groups', 'interest groups'))
+    for index, position in enumerate(positions):
+        print('{:>5} {:>12} {:>16} {:>16}'.format(index, str(position), everyone[index], regional[index]))
+    print('{:>5} {:>12} {:>16} {:>16}'.format('total', '', sum(everyone), sum(regional)))
+    expected_everyone = (len(positions) - 1) * args.messages
+    expected_regional = (args.per_cluster - 1) * args.messages
+    print('expected: {0} per node with world groups, {1} with interest groups'.format(expected_everyone, expected_regional))
+
+    wrong = [ index for index in range(len(positions))
+        if everyone[index] != expected_everyone or regional[index] != expected_regional ]
+    if wrong:
+        sys.exit('nodes {0} received the wrong number of updates'.format(', '.join(str(index) for index in wrong)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import argparse
+import random
+
+import protocol
+from interpolation import SnapshotBuffer
+
+'''
+How smooth remote players look, and how many position updates it takes, when they
+jump to each update as it arrives versus when they are interpolated from a snapshot
+buffer at lower send rates.
+
+A simulated player walks in bursts, its updates arrive after a random delay and the
+receiver draws a frame at fps. Smoothness is the largest and the average distance a
+remote player moves between two drawn frames, in tiles; the player itself never
+moves more than one tile at a time.
+
+Run from the project directory:
+    python3 -m benchmarks.interpolation
+
+'''
+
+def walk(seconds, fps, moves_per_second, seed):
+    # the sending player's position on every frame
+    rng = random.Random(seed)
+    position = (0, 0)
+    moving = False
+    positions = []
+    for frame in range(seconds * fps):
+        if frame % fps == 0:
+            moving = rng.random() < 0.6
+        if moving and frame % max(1, fps // moves_per_second) == 0:
+            position = (position[0] + rng.choice((-1, 1)), position[1])
+        positions.append(position)
+    return positions
+
+def simulate(positions, fps, send_rate, latency, jitter, delay, max_extrapolation, seed, interpolate=True):
+    rng = random.Random(seed)
+    min_interval = 1.0 / send_rate if send_rate else 0
+    position_filter = protocol.ChangeFilter(keepalive=1.0, min_interval=min_interval)
+
+    # (arrival time, position) for every update sent
+    arrivals = []
+    for frame, position in enumerate(positions):
+        now = frame / fps
+        if position_filter.should_send(position, now):
+            arrivals.append((now + latency + rng.uniform(0, jitter), position))
+    arrivals.sort(key=lambda arrival: arrival[0])
+
+    snapshots = SnapshotBuffer(max_extrapolation=max_extrapolation)
+    latest = None
+    drawn = []
+    next_arrival = 0
+    for frame in range(len(positions)):
+        now = frame / fps
+        while next_arrival < len(arrivals) and arrivals[next_arrival][0] <= now:
+            arrival_time, position = arrivals[next_arrival]
+            snapshots.add(arrival_time, position[0], position[1])
+            latest = position
+            next_arrival += 1
+        if latest is None:
+            continue
+        drawn.append(snapshots.sample(now - delay) if interpolate else latest)
+
+    steps = [ abs(b[0] - a[0]) + abs(b[1] - a[1]) for a, b in zip(drawn, drawn[1:]) ]
+    moving_steps = [ step for step in steps if step > 0 ] or [0]
+    seconds = len(positions) / fps
+    return len(arrivals) / seconds, max(steps), sum(moving_steps) / len(moving_steps)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=int, default=120)
+    parser.add_argument('--fps', type=int, default=60)
+    parser.add_argument('--moves-per-second', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.03)
+    parser.add_argument('--jitter', type=float, default=0.03)
+    parser.add_argument('--delay', type=float, default=0.1)
+    parser.add_argument('--max-extrapolation', type=float, default=0.25)
+    args = parser.parse_args()
+
+    positions = walk(args.seconds, args.fps, args.moves_per_second, 1)
+    print('{:<24} {:>16} {:>18} {:>19}'.format('mode', 'updates per sec', 'largest step tiles', 'average step tiles'))
+    cases = [('snap, every change', 0, False)] + [
+        ('interpolated, {} Hz'.format(rate), rate, True) for rate in (20, 15, 10)
+    ]
+    for name, rate, interpolate in cases:
+        result = simulate(
+            positions, args.fps, rate, args.latency, args.jitter,
+            args.delay, args.max_extrapolation, 2, interpolate
+        )
+        print('{:<24} {:>16.1f} {:>18.2f} {:>19.2f}'.format(name, *result))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy
+
+from level import ProceduralLevel
+from level_cache import LevelCache
+
+'''
+Startup time of a fixed size ProceduralLevel generated from noise (cold, nothing
+cached yet) versus memory mapped from the LevelCache (warm).
+
+Each launch is a new Python process which imports level and builds the level, so the
+times include interpreter startup and imports like a real launch would. The in
+process times are for building the level alone, and the warm in process time also
+reads one screen of tiles, as the first frame would.
+
+Run from the project directory:
+    python3 -m benchmarks.level_cache --sizes 256 1024 4096
+
+'''
+
+LAUNCH = '''
+import sys
+from level import ProceduralLevel
+from level_cache import LevelCache
+size = int(sys.argv[2])
+ProceduralLevel(42, size, size, cache=LevelCache(sys.argv[1]))
+'''
+
+def launch(directory, size):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', LAUNCH, directory, str(size)], check=True)
+    return time.perf_counter() - start
+
+def in_process(directory, size, view):
+    cache = LevelCache(directory)
+    start = time.perf_counter()
+    level = ProceduralLevel(42, size, size, cache=cache)
+    loaded = time.perf_counter() - start
+    # one screen of tiles from the middle of the level
+    middle = size // 2
+    numpy.sum(level.get_tile_ids(middle, middle, view, view))
+    numpy.sum(level.grid.attributes[middle:middle + view, middle:middle + view])
+    return loaded, time.perf_counter() - start, level
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=(256, 1024, 4096))
+    parser.add_argument('--view', type=int, default=32, help='tiles across one screen')
+    args = parser.parse_args()
+
+    print('{:>6} {:>15} {:>15} {:>14} {:>14} {:>14} {:>10}'.format(
+        'size', 'cold launch ms', 'warm launch ms', 'generate ms', 'mmap load ms', 'load+view ms', 'identical'))
+    for size in args.sizes:
+        directory = tempfile.mkdtemp(prefix='level_cache_')
+        try:
+            cold_launch = launch(directory, size)
+            warm_launch = launch(directory, size)
+
+            start = time.perf_counter()
+            generated = ProceduralLevel(42, size, size)
+            generate = time.perf_counter() - start
+            load, load_and_view, loaded = in_process(directory, size, args.view)
+            identical = numpy.array_equal(generated.grid.tile_ids, loaded.grid.tile_ids)
+        finally:
+            shutil.rmtree(directory)
+
+        print('{:>6} {:>15.1f} {:>15.1f} {:>14.1f} {:>14.2f} {:>14.2f} {:>10}'.format(
+            size, cold_launch * 1000, warm_launch * 1000, generate * 1000, load * 1000, load_and_view * 1000, str(identical)))
+
+if __name__ == '__main__':
+    main()
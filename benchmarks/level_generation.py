@@ -0,0 +1,57 @@
+import argparse
+import time
+
+from level import ProceduralLevel
+
+'''
+Compares generating a ProceduralLevel grid one noise2d call per cell (the old path)
+with the vectorised TileGrid path.
+
+The vectorised path spreads its rows over level.GENERATION_THREADS threads, one a
+core, so its times fall with the cores available. On a single core a 4096 square
+level takes around 1.5 s, the under a second target for it needs two cores or more.
+
+Run from the project directory:
+    python3 -m benchmarks.level_generation --sizes 256 1024 4096
+
+'''
+
+def time_call(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def per_cell_grid(level, width, height):
+    return [
+        [ level.generate_grid_tile(i, j) for i in range(width) ] for j in range(height)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[256, 1024, 4096])
+    parser.add_argument('--per-cell-limit', type=int, default=1024,
+        help='skip the per cell path above this size, it takes minutes at 4096')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    level = ProceduralLevel(args.seed, 0, 0)
+
+    print('{:>6} {:>12} {:>12} {:>8} {:>6}'.format('size', 'per cell s', 'vector s', 'speedup', 'equal'))
+    for size in args.sizes:
+        vector_time, grid = time_call(lambda: level.generate_tile_ids(0, 0, size, size), args.repeat)
+
+        if size <= args.per_cell_limit:
+            cell_time, cells = time_call(lambda: per_cell_grid(level, size, size), 1)
+            equal = [ [ tile.tileset_id for tile in row ] for row in cells ] == grid.tolist()
+            print('{:>6} {:>12.3f} {:>12.3f} {:>7.1f}x {:>6}'.format(
+                size, cell_time, vector_time, cell_time / vector_time, str(equal)))
+        else:
+            print('{:>6} {:>12} {:>12.3f} {:>8} {:>6}'.format(size, '-', vector_time, '-', '-'))
+
+if __name__ == '__main__':
+    main()
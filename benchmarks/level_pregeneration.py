@@ -0,0 +1,87 @@
+import argparse
+import time
+
+import numpy
+
+from level import ChunkedProceduralLevel
+from level import ProceduralLevel
+from level_manager import LevelManager
+
+'''
+How long the main thread stalls to get a new level, generating it there when it's
+needed versus having a LevelManager generate it in worker processes ahead of time.
+
+For each size a level is generated synchronously, which is the hitch switching to it
+would cause. Then --levels levels are requested from a LevelManager and a frame loop
+polls it every 1/60 s until they have all arrived; the longest frame's poll is all
+the main thread pays, latency is from requesting a level to the poll that took it
+in. A size of 0 is a chunked level, whose chunks around the arrival point are made.
+
+Run from the project directory:
+    python3 -m benchmarks.level_pregeneration --sizes 0 256 1024 --workers 2
+
+'''
+
+def generate(seed, size):
+    if size:
+        return ProceduralLevel(seed, size, size)
+    level = ChunkedProceduralLevel(seed)
+    # the same chunks the LevelManager makes up front, and one screen of tiles
+    for chunk_y in range(-2, 3):
+        for chunk_x in range(-2, 3):
+            level.chunks.get(chunk_x, chunk_y)
+    return level
+
+def pregenerate(manager, size, levels, frame_time):
+    start = time.perf_counter()
+    names = [ 'level {0}-{1}'.format(size, number) for number in range(levels) ]
+    for number, name in enumerate(names):
+        manager.request(name, 100 + number, (size, size) if size else None)
+    requested = time.perf_counter() - start
+
+    polls = []
+    while any(manager.is_pending(name) for name in names):
+        time.sleep(frame_time)
+        poll_start = time.perf_counter()
+        manager.poll()
+        polls.append(time.perf_counter() - poll_start)
+    return requested, max(polls), manager.stats(), [ manager.get(name) for name in names ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=(0, 256, 1024))
+    parser.add_argument('--levels', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    manager = LevelManager(args.workers)
+    # workers are spawned on the first request, so start them before anything is timed
+    manager.request('warm up', 0, (1, 1))
+    while manager.is_pending('warm up'):
+        time.sleep(0.01)
+        manager.poll()
+
+    print('{:>6} {:>14} {:>12} {:>14} {:>14} {:>14} {:>10}'.format(
+        'size', 'sync stall ms', 'request ms', 'worst poll ms', 'latency ms', 'worst lat ms', 'identical'))
+    try:
+        for size in args.sizes:
+            start = time.perf_counter()
+            generated = generate(100, size)
+            stall = time.perf_counter() - start
+
+            manager.latencies.clear()
+            requested, worst_poll, stats, levels = pregenerate(manager, size, args.levels, 1 / 60)
+            if size:
+                identical = numpy.array_equal(generated.grid.tile_ids, levels[0].grid.tile_ids)
+            else:
+                identical = numpy.array_equal(generated.get_tile_ids(-64, -64, 160, 160), levels[0].get_tile_ids(-64, -64, 160, 160))
+            print('{:>6} {:>14.2f} {:>12.2f} {:>14.2f} {:>14.1f} {:>14.1f} {:>10}'.format(
+                size or 'chunks', stall * 1000, requested * 1000, worst_poll * 1000,
+                stats['latency_mean'] * 1000, stats['latency_max'] * 1000, str(identical)))
+    finally:
+        print()
+        print(', '.join('{0} {1}'.format(name, value) for name, value in manager.stats().items() if not name.startswith('latency')))
+        manager.shutdown()
+
+if __name__ == '__main__':
+    main()
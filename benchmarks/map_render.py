@@ -0,0 +1,64 @@
+import argparse
+import os
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from level import ChunkedProceduralLevel
+from level import ProceduralLevel
+from map import Map
+from tile import Tileset
+
+'''
+Frames per second of Map.render blitting every visible tile versus blitting
+the pre-baked region surfaces of the RenderCache.
+
+The centre player walks one tile every few frames so region baking shows up in
+the cached numbers, like it would in game.
+
+Run from the project directory:
+    python3 -m benchmarks.map_render --frames 600
+
+'''
+
+def run(level, cache_render, frames, screen_size, step_every):
+    screen = pygame.display.set_mode(screen_size)
+    tileset = Tileset('assets/tilesets/main.png', (16, 16), (32, 32))
+    game_map = Map(screen, level, tileset, None, cache_render=cache_render)
+    player = SimpleNamespace(x=level.width // 2 if level.width else 0, y=level.height // 2 if level.height else 0)
+    game_map.set_centre_player(player)
+
+    start = time.perf_counter()
+    for frame in range(frames):
+        if frame % step_every == 0:
+            player.x += 1
+        screen.fill((255, 255, 255))
+        game_map.render()
+    elapsed = time.perf_counter() - start
+    return frames / elapsed, screen.copy()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--size', type=int, default=1024, help='level width and height in tiles')
+    parser.add_argument('--screen', type=int, nargs=2, default=(1024, 1024))
+    parser.add_argument('--step-every', type=int, default=8, help='frames between player moves')
+    args = parser.parse_args()
+
+    pygame.display.init()
+    levels = {
+        'fixed {0}x{0}'.format(args.size): ProceduralLevel(42, args.size, args.size),
+        'chunked': ChunkedProceduralLevel(42),
+    }
+    for name, level in levels.items():
+        per_tile_fps, per_tile_frame = run(level, False, args.frames, args.screen, args.step_every)
+        cached_fps, cached_frame = run(level, True, args.frames, args.screen, args.step_every)
+        identical = pygame.image.tostring(per_tile_frame, 'RGB') == pygame.image.tostring(cached_frame, 'RGB')
+        print('{:<16} per tile {:8.1f} fps   cached {:8.1f} fps   {:5.1f}x   identical frames: {}'.format(
+            name, per_tile_fps, cached_fps, cached_fps / per_tile_fps, identical))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import os
+import random
+import time
+import uuid
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from player import Player
+from player import PlayerManager
+
+'''
+Per frame cost of keeping the remote players up to date, rebuilding them from the
+whole peer list every frame (PlayerManager.set, as the client used to) versus
+adding and removing them as ENTER and EXIT events arrive.
+
+--peers peers are connected and each frame --churn of them leave and as many new ones
+arrive. The event driven side also pays for a sweep of the whole list every
+--sweep seconds at 60 frames a second, spread over the frames.
+
+Run from the project directory:
+    python3 -m benchmarks.peer_membership --peers 10 100 1000
+
+'''
+
+def frames(peers, churn, count, seed):
+    # the peers connected on each frame, and who entered and exited since the one before
+    rng = random.Random(seed)
+    connected = [ uuid.UUID(int=rng.getrandbits(128)) for _ in range(peers) ]
+    for _ in range(count):
+        exited = rng.sample(connected, churn)
+        entered = [ uuid.UUID(int=rng.getrandbits(128)) for _ in range(churn) ]
+        connected = [ peer for peer in connected if peer not in exited ] + entered
+        yield list(connected), entered, exited
+
+def rebuild(manager, steps):
+    start = time.perf_counter()
+    for connected, entered, exited in steps:
+        manager.set(connected)
+    return time.perf_counter() - start
+
+def event_driven(manager, steps, sweep_every):
+    start = time.perf_counter()
+    for frame, (connected, entered, exited) in enumerate(steps):
+        for peer in entered:
+            manager.add(peer)
+        for peer in exited:
+            manager.remove(peer)
+        if frame % sweep_every == 0:
+            manager.set(connected)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--peers', type=int, nargs='+', default=(10, 100, 1000))
+    parser.add_argument('--churn', type=int, default=1, help='peers leaving and arriving each frame')
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--sweep', type=float, default=5.0)
+    args = parser.parse_args()
+
+    screen = pygame.display.set_mode((64, 64))
+    print('{:>6} {:>18} {:>18} {:>9}'.format('peers', 'rebuild us/frame', 'events us/frame', 'speedup'))
+    for peers in args.peers:
+        steps = list(frames(peers, args.churn, args.frames, 1))
+        initial = steps[0][0]
+        managers = []
+        for _ in range(2):
+            manager = PlayerManager(Player(screen, None))
+            manager.set(initial)
+            managers.append(manager)
+        rebuild_time = rebuild(managers[0], steps) / args.frames
+        event_time = event_driven(managers[1], steps, max(1, int(args.sweep * 60))) / args.frames
+        assert set(managers[0].others) == set(managers[1].others)
+        print('{:>6} {:>18.1f} {:>18.1f} {:>8.1f}x'.format(peers, rebuild_time * 1e6, event_time * 1e6, rebuild_time / event_time))
+
+if __name__ == '__main__':
+    main()
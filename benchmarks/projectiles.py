@@ -0,0 +1,68 @@
+import argparse
+import math
+import random
+import time
+
+from level import ChunkedProceduralLevel
+from projectile import ProjectileSystem
+
+'''
+Time to advance and cull every live spell once, for the ProjectileSystem arrays
+versus one Python object per spell moved and checked against the level in a loop
+(the old Spell.render path without the drawing, plus the new collision check).
+
+Run from the project directory:
+    python3 -m benchmarks.projectiles --counts 1000 10000 100000
+
+'''
+
+class ObjectSpell():
+    def __init__(self, x, y, velo_x, velo_y):
+        self.x, self.y, self.velo_x, self.velo_y = x, y, velo_x, velo_y
+
+    def update(self, level):
+        self.x += self.velo_x
+        self.y += self.velo_y
+        return level.can_move_to(math.floor(self.x + 0.125), math.floor(self.y + 0.125))
+
+def spawn_positions(level, count):
+    rng = random.Random(1)
+    spells = []
+    while len(spells) < count:
+        x, y = rng.randint(-50, 50), rng.randint(-50, 50)
+        if level.can_move_to(x, y):
+            velocity = rng.choice(((0.25, 0), (-0.25, 0), (0, 0.25), (0, -0.25)))
+            spells.append((x + 0.375, y + 0.375, velocity[0], velocity[1]))
+    return spells
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--counts', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--steps', type=int, default=60)
+    args = parser.parse_args()
+
+    level = ChunkedProceduralLevel(42)
+    print('{:>8} {:>14} {:>14} {:>10}'.format('spells', 'objects ms', 'arrays ms', 'live after'))
+    print('(ms per step, averaged over the run as spells hit walls)')
+    for count in args.counts:
+        spells = spawn_positions(level, count)
+
+        objects = [ ObjectSpell(*spell) for spell in spells ]
+        start = time.perf_counter()
+        for _ in range(args.steps):
+            objects = [ spell for spell in objects if spell.update(level) ]
+        object_ms = (time.perf_counter() - start) / args.steps * 1000
+
+        # never expire from age during the run, only from hitting walls
+        projectiles = ProjectileSystem(level, max_age=10 ** 6)
+        for i, spell in enumerate(spells):
+            projectiles.spawn(i % 100, *spell)
+        start = time.perf_counter()
+        for _ in range(args.steps):
+            projectiles.step()
+        array_ms = (time.perf_counter() - start) / args.steps * 1000
+
+        print('{:>8} {:>14.3f} {:>14.3f} {:>10}'.format(count, object_ms, array_ms, projectiles.count))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import random
+import timeit
+
+import numpy
+
+from level import ChunkedProceduralLevel
+from level import ProceduralLevel
+from tile import TileAttribute
+
+'''
+The bulk Level queries against answering the same questions one cell at a time with
+can_move_to and TileType.has_attribute:
+
+    positions  can each of a batch of entities move where it is
+    view       how many cells of one screen of tiles are solid
+    paths      is the straight path of each of a batch of entities blocked
+
+Run from the project directory:
+    python3 -m benchmarks.region_queries --entities 1000
+
+'''
+
+def per_cell(level, xs, ys, paths, view):
+    collide = TileAttribute.COLLIDE
+    def positions():
+        return [ level.can_move_to(x, y) for x, y in zip(xs, ys) ]
+    def count_view():
+        min_x, min_y, max_x, max_y = view
+        return sum(
+            level.get_tile(x, y).has_attribute(collide)
+            for y in range(min_y, max_y) for x in range(min_x, max_x)
+        )
+    def blocked():
+        results = []
+        for from_x, from_y, to_x, to_y in paths:
+            samples = int(numpy.ceil(max(abs(to_x - from_x), abs(to_y - from_y)) / level.PATH_STEP)) + 1
+            results.append(any(
+                not level.can_move_to(int(numpy.floor(from_x + (to_x - from_x) * i / max(samples - 1, 1))),
+                                      int(numpy.floor(from_y + (to_y - from_y) * i / max(samples - 1, 1))))
+                for i in range(samples)
+            ))
+        return results
+    return positions, count_view, blocked
+
+def bulk(level, xs, ys, paths, view):
+    collide = TileAttribute.COLLIDE.value
+    xs = numpy.array(xs)
+    ys = numpy.array(ys)
+    path_array = numpy.array(paths)
+    def positions():
+        return level.can_move_to_many(xs, ys)
+    def count_view():
+        return level.count_with(collide, *view)
+    def blocked():
+        return level.paths_blocked(path_array[:, 0], path_array[:, 1], path_array[:, 2], path_array[:, 3])
+    return positions, count_view, blocked
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entities', type=int, default=1000)
+    parser.add_argument('--path-length', type=float, default=4)
+    parser.add_argument('--view', type=int, default=32, help='tiles across one screen')
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    size = 256
+    xs = [ rng.randrange(size) for _ in range(args.entities) ]
+    ys = [ rng.randrange(size) for _ in range(args.entities) ]
+    paths = []
+    for x, y in zip(xs, ys):
+        angle = rng.uniform(0, 2 * numpy.pi)
+        paths.append((x + 0.5, y + 0.5, x + 0.5 + numpy.cos(angle) * args.path_length, y + 0.5 + numpy.sin(angle) * args.path_length))
+    view = (100, 100, 100 + args.view, 100 + args.view)
+
+    print('{:<10} {:<10} {:>14} {:>10} {:>9} {:>6}'.format('level', 'query', 'per cell ms', 'bulk ms', 'speedup', 'same'))
+    for name, level in (('fixed', ProceduralLevel(42, size, size)), ('chunked', ChunkedProceduralLevel(42))):
+        for query_name, slow, fast in zip(('positions', 'view', 'paths'), per_cell(level, xs, ys, paths, view), bulk(level, xs, ys, paths, view)):
+            same = numpy.array_equal(numpy.asarray(slow()), numpy.asarray(fast()))
+            slow_ms = timeit.timeit(slow, number=args.number) / args.number * 1000
+            fast_ms = timeit.timeit(fast, number=args.number) / args.number * 1000
+            print('{:<10} {:<10} {:>14.3f} {:>10.3f} {:>8.1f}x {:>6}'.format(name, query_name, slow_ms, fast_ms, slow_ms / fast_ms, str(same)))
+
+if __name__ == '__main__':
+    main()
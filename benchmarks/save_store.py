@@ -0,0 +1,63 @@
+import argparse
+import configparser
+import os
+import tempfile
+import time
+
+from save_store import SaveStore
+
+'''
+Main thread cost of saving the player, writing the INI file in place on every save
+as the game used to versus updating a SaveStore which writes behind it.
+
+--saves saves are made --interval seconds apart, like autosaves of a moving player,
+and the longest and average time the caller spent on each is reported, with how many
+times the file was actually written. --fsync makes the in place writes sync to disk
+too, as the store's do, for a like for like comparison.
+
+Run from the project directory:
+    python3 -m benchmarks.save_store --saves 200 --interval 0.005
+
+'''
+
+def save_in_place(path, values, fsync):
+    config = configparser.ConfigParser()
+    config['Player'] = { key: str(value) for key, value in values.items() }
+    with open(path, 'w') as configfile:
+        config.write(configfile)
+        if fsync:
+            configfile.flush()
+            os.fsync(configfile.fileno())
+
+def run(save, saves, interval):
+    times = []
+    for number in range(saves):
+        values = { 'name': 'player', 'x': number, 'y': -number, 'mute': 'True' }
+        start = time.perf_counter()
+        save(values)
+        times.append(time.perf_counter() - start)
+        time.sleep(interval)
+    return max(times), sum(times) / len(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--saves', type=int, default=200)
+    parser.add_argument('--interval', type=float, default=0.005)
+    parser.add_argument('--fsync', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='save_store_') as directory:
+        path = os.path.join(directory, 'player_save')
+        in_place = run(lambda values: save_in_place(path, values, args.fsync), args.saves, args.interval)
+
+        store = SaveStore(os.path.join(directory, 'store_save'))
+        behind = run(store.update, args.saves, args.interval)
+        store.close()
+        writes = store.stats()['writes']
+
+    print('{:<14} {:>12} {:>12} {:>8}'.format('', 'worst ms', 'mean ms', 'writes'))
+    print('{:<14} {:>12.3f} {:>12.3f} {:>8}'.format('in place', in_place[0] * 1000, in_place[1] * 1000, args.saves))
+    print('{:<14} {:>12.3f} {:>12.3f} {:>8}'.format('write behind', behind[0] * 1000, behind[1] * 1000, writes))
+
+if __name__ == '__main__':
+    main()
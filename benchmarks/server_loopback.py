@@ -0,0 +1,197 @@
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import client
+import protocol
+from level import ChunkedProceduralLevel
+from level import ProceduralLevel
+from network import ServerNetwork
+from server import GameServer
+
+'''
+A GameServer and its clients all on loopback in one process, to check the server
+mode end to end and see what it costs.
+
+The server runs on a thread, on free ports. --walkers scripted clients connect with a
+ServerNetwork each, on a thread of their own, walk around the level a tile at a time
+sending their position position_send_rate times a second, and now and then cast a
+spell. A headless GameClient connects too and runs its normal loop, and at the end
+its view of the other players and of the server's spells is compared with the
+server's own. Last a client sends a move the server can't accept and waits for the
+correction. If the game client didn't see every walker and take the server's level,
+no position came back in a snapshot, or no correction came, it exits with an error.
+
+Latency is from a walker sending a position to another walker's network handing it
+over in a snapshot, so it includes waiting for the next snapshot.
+
+Run from the project directory:
+    python3 -m benchmarks.server_loopback --walkers 8 --seconds 5
+
+'''
+
+MOVES = ((0, -1), (1, 0), (0, 1), (-1, 0))
+SPELL_VELOCITIES = ((0, -0.25), (0.25, 0), (0, 0.25), (-0.25, 0))
+
+
+class Walker():
+    def __init__(self, address, level, rng):
+        self.network = ServerNetwork(address)
+        self.level = level
+        self.rng = rng
+        self.encoder = protocol.Encoder()
+        self.x, self.y = rng.randint(-16, 16), rng.randint(-16, 16)
+        while not level.can_move_to(self.x, self.y):
+            self.x += 1
+        # (x, y): when that position was first sent, for the latency
+        self.sent = {}
+
+    def step(self, now, cast_chance):
+        self.network.get_events()
+        correction = self.network.take_correction()
+        if correction is not None:
+            self.x, self.y = correction
+        dx, dy = self.rng.choice(MOVES)
+        if self.level.can_move_to(self.x + dx, self.y + dy):
+            self.x += dx
+            self.y += dy
+        self.sent.setdefault((self.x, self.y), now)
+        self.network.shout(None, self.encoder.encode(protocol.POSITION, (self.x, self.y)))
+        if self.rng.random() < cast_chance:
+            vx, vy = self.rng.choice(SPELL_VELOCITIES)
+            self.network.shout(None, self.encoder.encode(protocol.SPELL, (self.x + 0.375, self.y + 0.375, vx, vy)))
+
+
+def walk(address, level, count, cast_chance, stop, latencies):
+    # runs on its own thread, which owns the walkers' sockets
+    rng = random.Random(1)
+    walkers = [ Walker(address, level, rng) for _ in range(count) ]
+    observer = walkers[0]
+    next_send = time.perf_counter()
+    try:
+        while not stop.is_set():
+            now = time.perf_counter()
+            if now >= next_send:
+                for walker in walkers:
+                    walker.step(now, cast_chance)
+                next_send += 1.0 / client.position_send_rate
+            else:
+                for walker in walkers:
+                    walker.network.get_events()
+
+            snapshot = observer.network.last_snapshot
+            if snapshot is not None:
+                received = time.perf_counter()
+                positions = dict(zip(snapshot.players['id'].tolist(), zip(snapshot.players['x'].tolist(), snapshot.players['y'].tolist())))
+                for walker in walkers[1:]:
+                    position = positions.get(walker.network.player_id)
+                    sent = walker.sent.pop(position, None)
+                    if sent is not None:
+                        latencies.append(received - sent)
+                observer.network.last_snapshot = None
+            time.sleep(0.001)
+    finally:
+        for walker in walkers:
+            walker.network.stop()
+
+def check_correction(address, level, timeout=5.0):
+    # a move too far from the last comes back as a correction to the last one accepted
+    network = ServerNetwork(address)
+    encoder = protocol.Encoder()
+    x, y = 0, 0
+    while not level.can_move_to(x, y):
+        x += 1
+    try:
+        network.shout(None, encoder.encode(protocol.POSITION, (x, y)))
+        network.shout(None, encoder.encode(protocol.POSITION, (x + 1000, y)))
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            network.get_events()
+            correction = network.take_correction()
+            if correction is not None:
+                return tuple(correction) == (x, y)
+            time.sleep(0.01)
+        return False
+    finally:
+        network.stop()
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float('nan')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--walkers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--snapshot-rate', type=int, default=20)
+    parser.add_argument('--cast-chance', type=float, default=0.05, help='chance a walker casts on each send')
+    args = parser.parse_args()
+
+    server = GameServer(port=0, snapshot_rate=args.snapshot_rate)
+    server.bind()
+    address = server.endpoints()[0]
+    server_thread = threading.Thread(target=server.run, name="server", daemon=True)
+    server_thread.start()
+
+    game = client.GameClient(headless=True, network=ServerNetwork(address))
+    # the walkers have their own copy of the server's level, it isn't safe to share
+    level = ChunkedProceduralLevel(server.seed) if server.size is None else ProceduralLevel(server.seed, *server.size)
+    stop = threading.Event()
+    latencies = []
+    walker_thread = threading.Thread(
+        target=walk, args=(address, level, args.walkers, args.cast_chance, stop, latencies), name="walkers"
+    )
+    walker_thread.start()
+
+    frame_times = []
+    start = time.perf_counter()
+    try:
+        game.run(max_frames=int(args.seconds * game.tickspeed), frame_times=frame_times)
+        players_seen = len(game.players.placed())
+        spells_drawn = game.map.projectiles.count
+        server_spells = server.projectiles.count
+        same_level = game.map.level.seed == server.seed
+        stop.set()
+        walker_thread.join()
+        corrected = check_correction(address, level)
+    finally:
+        stop.set()
+        walker_thread.join()
+        game.network.stop()
+        server.stop()
+        server_thread.join()
+
+    stats = server.stats()
+    elapsed = time.perf_counter() - start
+    print('server: {ticks} ticks, {snapshots} snapshots, {received} messages received, {hits} hits, '
+          '{rejected_moves} moves and {rejected_spells} spells rejected'.format(**stats))
+    print('snapshots: {:.0f} bytes on average, {:.1f} KB/s to each client'.format(
+        stats['snapshot_bytes'] / max(1, stats['snapshots']), stats['snapshot_bytes'] / elapsed / 1024))
+    print('players seen by the game client: {} of {} walkers'.format(players_seen, args.walkers))
+    print('spells at the end: {} drawn by the game client, {} on the server'.format(spells_drawn, server_spells))
+    print('position latency ms: p50 {:.1f}, p95 {:.1f}, max {:.1f}'.format(
+        percentile(latencies, 0.5) * 1000, percentile(latencies, 0.95) * 1000, max(latencies or [float('nan')]) * 1000))
+    print('game client frame ms: p50 {:.2f}, p95 {:.2f}'.format(
+        percentile(frame_times, 0.5) * 1000, percentile(frame_times, 0.95) * 1000))
+    print('correction for a rejected move: {}'.format('received' if corrected else 'missing'))
+
+    failures = []
+    if players_seen != args.walkers:
+        failures.append('the game client saw {0} of {1} walkers'.format(players_seen, args.walkers))
+    if not same_level:
+        failures.append("the game client isn't playing the server's level")
+    if not latencies:
+        failures.append('no walker position came back in a snapshot')
+    if not corrected:
+        failures.append('no correction came back for a rejected move')
+    if failures:
+        sys.exit('; '.join(failures))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+'''
+Where the client's startup time goes.
+
+The first part is a -X importtime report of importing client: the total, the modules
+client imports directly, and the slowest modules by their own import time. The second
+launches the client without a window or sound, against a LocalNetwork so no Pyre node
+is started, and times how long until the menu is drawn and how long until everything
+the game needs has loaded in the background. The level is chunked unless --fixed is
+given, and a fixed level is generated every launch unless --cache is given.
+
+Run from the project directory:
+    python3 -m benchmarks.startup
+    python3 -m benchmarks.startup --fixed 1024 --cache
+
+'''
+
+LAUNCH = '''
+import sys
+import time
+start = time.perf_counter()
+
+import client
+from local_network import LocalNetwork
+imported = time.perf_counter()
+
+size, cache_directory, music_path = int(sys.argv[1]), sys.argv[2], sys.argv[3]
+client.music_path = music_path
+if size:
+    client.chunked_level = False
+    client.level_size = (size, size)
+    client.level_cache_directory = cache_directory or None
+
+game = client.GameClient(network=LocalNetwork(0))
+game.run(max_frames=1)
+menu = time.perf_counter()
+game.finish_loading()
+ready = time.perf_counter()
+print(imported - start, menu - start, ready - start)
+'''
+
+def import_report(top):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import client'],
+        stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, universal_newlines=True, check=True
+    )
+    # lines look like "import time:  self [us] | cumulative | imported package", indented by depth
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), depth, int(own), int(cumulative)))
+
+    total = sum(own for name, depth, own, cumulative in modules)
+    client_depth = next(depth for name, depth, own, cumulative in modules if name == 'client')
+    direct = [ module for module in modules if module[1] == client_depth + 1 ]
+    slowest = sorted(modules, key=lambda module: module[2], reverse=True)[:top]
+    return total, sorted(direct, key=lambda module: module[3], reverse=True)[:top], slowest
+
+def write_silence(path):
+    # the game's own song isn't in the repository, so launches play a second of silence
+    with wave.open(path, 'wb') as silence:
+        silence.setnchannels(1)
+        silence.setsampwidth(2)
+        silence.setframerate(22050)
+        silence.writeframes(b'\0\0' * 22050)
+
+def launch(size, cache_directory, music_path):
+    environment = dict(os.environ, SDL_VIDEODRIVER='dummy', SDL_AUDIODRIVER='dummy', PYGAME_HIDE_SUPPORT_PROMPT='1')
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', LAUNCH, str(size), cache_directory, music_path],
+        stdout=subprocess.PIPE, universal_newlines=True, env=environment, check=True
+    )
+    total = time.perf_counter() - start
+    imported, menu, ready = (float(value) for value in result.stdout.split()[-3:])
+    return imported, menu, ready, total
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--top', type=int, default=12)
+    parser.add_argument('--launches', type=int, default=3)
+    parser.add_argument('--fixed', type=int, default=0, help='use a fixed size level this wide and high')
+    parser.add_argument('--cache', action='store_true', help='cache the fixed size level between launches')
+    args = parser.parse_args()
+
+    total, direct, slowest = import_report(args.top)
+    print('importing client: {:.1f} ms'.format(total / 1000))
+    print()
+    print('{:<36} {:>14}'.format('imported by client', 'cumulative ms'))
+    for name, depth, own, cumulative in direct:
+        print('{:<36} {:>14.1f}'.format(name, cumulative / 1000))
+    print()
+    print('{:<36} {:>14}'.format('slowest modules', 'self ms'))
+    for name, depth, own, cumulative in slowest:
+        print('{:<36} {:>14.1f}'.format(name, own / 1000))
+    print()
+
+    with tempfile.TemporaryDirectory(prefix='startup_') as directory:
+        music_path = os.path.join(directory, 'silence.wav')
+        write_silence(music_path)
+        cache_directory = os.path.join(directory, 'levels') if args.cache else ''
+
+        print('{:>7} {:>10} {:>10} {:>13} {:>15}'.format('launch', 'import ms', 'menu ms', 'game ready ms', 'process ms'))
+        for number in range(args.launches):
+            imported, menu, ready, process = launch(args.fixed, cache_directory, music_path)
+            print('{:>7} {:>10.1f} {:>10.1f} {:>13.1f} {:>15.1f}'.format(number + 1, imported * 1000, menu * 1000, ready * 1000, process * 1000))
+
+if __name__ == '__main__':
+    main()
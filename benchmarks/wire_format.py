@@ -0,0 +1,80 @@
+import argparse
+import random
+import timeit
+
+import bson
+
+import protocol
+
+'''
+Encode/decode cost and size of world:position and world:combat messages in the
+binary protocol versus the bson documents they replace, plus the bytes per second
+one player sends for a recorded style of movement: bson every frame against
+binary only on change with a one second keepalive.
+
+Run from the project directory:
+    python3 -m benchmarks.wire_format
+
+'''
+
+def micro(number):
+    position = {'x': 1234, 'y': -567}
+    spell = {'x': 12.375, 'y': 40.375, 'x_velocity': 0.25, 'y_velocity': 0.0}
+    encoder = protocol.Encoder()
+
+    rows = []
+    for name, kind, document in (('position', protocol.POSITION, position), ('spell', protocol.SPELL, spell)):
+        values = tuple(document.values())
+        bson_data = bson.dumps(document)
+        binary_data = encoder.encode(kind, values)
+        rows.append((
+            name,
+            len(bson_data), len(binary_data),
+            timeit.timeit(lambda: bson.dumps(document), number=number) / number * 1e6,
+            timeit.timeit(lambda: encoder.encode(kind, values), number=number) / number * 1e6,
+            timeit.timeit(lambda: bson.loads(bson_data), number=number) / number * 1e6,
+            timeit.timeit(lambda: protocol.decode(binary_data), number=number) / number * 1e6,
+        ))
+    return rows
+
+def bandwidth(seconds, fps, moves_per_second):
+    # a player walking in bursts: moving for a few seconds, then standing still
+    rng = random.Random(1)
+    position = (0, 0)
+    encoder = protocol.Encoder()
+    position_filter = protocol.ChangeFilter(keepalive=1.0)
+    bson_bytes = 0
+    binary_bytes = 0
+    moving = False
+    for frame in range(seconds * fps):
+        now = frame / fps
+        if frame % fps == 0:
+            moving = rng.random() < 0.5
+        if moving and frame % max(1, fps // moves_per_second) == 0:
+            position = (position[0] + rng.choice((-1, 0, 1)), position[1] + rng.choice((-1, 0, 1)))
+
+        bson_bytes += len(bson.dumps({'x': position[0], 'y': position[1]}))
+        if position_filter.should_send(position, now):
+            binary_bytes += len(encoder.encode(protocol.POSITION, position))
+    return bson_bytes / seconds, binary_bytes / seconds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--number', type=int, default=20000)
+    parser.add_argument('--seconds', type=int, default=120)
+    parser.add_argument('--fps', type=int, default=60)
+    parser.add_argument('--moves-per-second', type=int, default=20)
+    args = parser.parse_args()
+
+    print('{:<10} {:>10} {:>12} {:>14} {:>16} {:>14} {:>16}'.format(
+        'message', 'bson bytes', 'binary bytes', 'bson encode us', 'binary encode us', 'bson decode us', 'binary decode us'))
+    for row in micro(args.number):
+        print('{:<10} {:>10} {:>12} {:>14.2f} {:>16.2f} {:>14.2f} {:>16.2f}'.format(*row))
+
+    bson_rate, binary_rate = bandwidth(args.seconds, args.fps, args.moves_per_second)
+    print()
+    print('position bytes per second per peer: bson every frame {:.0f}, binary on change {:.0f} ({:.1f}x less)'.format(
+        bson_rate, binary_rate, bson_rate / binary_rate))
+
+if __name__ == '__main__':
+    main()
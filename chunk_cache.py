@@ -0,0 +1,53 @@
+from collections import OrderedDict
+
+'''
+ChunkCache keeps the most recently used chunks of a level, generating them on demand.
+
+Chunks are keyed by chunk coordinates (x // chunk_size, y // chunk_size). When the
+cache is full the least recently used chunk is dropped; because generation is
+deterministic it is simply rebuilt the next time it is touched.
+
+'''
+
+class ChunkCache():
+    def __init__(self, generate_chunk, max_chunks=256):
+        self.generate_chunk = generate_chunk
+        self.max_chunks = max_chunks
+        self.chunks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, chunk_x, chunk_y):
+        key = (chunk_x, chunk_y)
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.hits += 1
+            self.chunks.move_to_end(key)
+            return chunk
+
+        self.misses += 1
+        chunk = self.generate_chunk(chunk_x, chunk_y)
+        self.chunks[key] = chunk
+        if len(self.chunks) > self.max_chunks:
+            self.chunks.popitem(last=False)
+            self.evictions += 1
+        return chunk
+
+    def put(self, chunk_x, chunk_y, chunk):
+        # add a chunk generated elsewhere, e.g. ahead of time by a LevelManager
+        self.chunks[(chunk_x, chunk_y)] = chunk
+        self.chunks.move_to_end((chunk_x, chunk_y))
+        if len(self.chunks) > self.max_chunks:
+            self.chunks.popitem(last=False)
+            self.evictions += 1
+
+    def peek(self, chunk_x, chunk_y):
+        # look up a chunk without generating it or changing its age
+        return self.chunks.get((chunk_x, chunk_y))
+
+    def clear(self):
+        self.chunks.clear()
+
+    def __len__(self):
+        return len(self.chunks)
@@ -1,26 +1,42 @@
+import argparse
+import os
 import pygame
 import pygame.locals
-import socket
-import select
-import random
 import time
 import logging
-import zmq
-import pdb
-import bson
-import uuid
-from pyre import Pyre
-from pyre import zhelper
 from collections import namedtuple
+from concurrent.futures import Future
 from enum import Enum
 
+import assets
 from map import *
 from network import Network
+from network import ThreadedNetwork
+from network import ServerNetwork
+from network import GROUPS
+from interest import InterestManager
+from interest import base_group
+from inbound import InboundPipeline
+import protocol
 from player import *
 from screen import MainMenu
 from level import ProceduralLevel
-from tile import Tileset
+from level import ChunkedProceduralLevel
+from level_cache import LevelCache
+from level_manager import LevelManager
 from music import LevelMusic
+from renderer import IncrementalRenderer
+from batch import RenderBatch
+from profiler import FrameProfiler
+from profiler import ProfilerOverlay
+from timestep import FixedTimestep
+import save_store
+from settings import font
+from settings import level_tileset_path
+from settings import player_animation_tileset_path
+from settings import music_path
+from settings import interpolation_delay
+from settings import save_path
 
 white = (255,255,255)
 black = (0,0,0)
@@ -29,9 +45,50 @@ red = (255, 0, 0)
 width = 1024
 height = 1024
 
-font = 'assets/fonts/alterebro-pixel-font.ttf'
-level_tileset_path = 'assets/tilesets/main.png'
-player_animation_tileset_path = 'assets/tilesets/player.png'
+# generate the world lazily in chunks, with no edges, instead of a fixed size grid;
+# off by default, --chunked turns it on
+chunked_level = False
+# width and height in tiles of the level when it isn't chunked
+level_size = (50, 50)
+# where fixed size levels are cached once generated, None to always generate them
+level_cache_directory = 'cache/levels'
+# worker processes generating the levels after this one while it's played, see level_manager.py
+level_workers = 2
+# how many levels ahead of the current one to have generated, F4 moves on to the next
+upcoming_levels = 2
+# keep the previous frame and only redraw what changed, rather than the whole screen
+incremental_render = True
+# run the Pyre node on a background thread so network hiccups don't drop frames
+threaded_network = True
+# only talk to players in nearby regions of the map, rather than everyone, see interest.py
+interest_management = True
+# connect to a game server at this address, e.g. 'tcp://127.0.0.1:5555', rather than the
+# Pyre mesh, see server.py
+server_address = None
+
+# seconds between saves of the player's position while playing, 0 to only save from the menu
+autosave_interval = 10.0
+
+# seconds between checks of every peer, on top of following peers' ENTER and EXIT events
+peer_sweep_interval = 5.0
+
+# seconds without a position before a peer is hidden, they send one at least every second
+# while in our area of interest
+peer_timeout = 3.0
+
+# most position updates sent per second, interpolation keeps it smooth in between
+position_send_rate = 15
+
+# simulation ticks per second, spell speeds and lifetimes are per tick
+simulation_rate = 60
+# most ticks run in one frame before the simulation gives up catching up and slows down
+max_ticks_per_frame = 5
+
+# time the phases of every frame from the start, F3 toggles it and its overlay in game
+profiling = False
+# write the profiled frames to this CSV file when the game closes, e.g. 'frames.csv'
+profile_csv = None
+PROFILER_PHASES = ('wait', 'input', 'map', 'players', 'spells', 'network', 'send', 'draw', 'overlay', 'display')
 
 class GameState(Enum):
     MENU = 0
@@ -41,18 +98,67 @@ class GameState(Enum):
     QUIT = 4
     MUTE = 5
 
+log = logging.getLogger("client")
+
 class GameClient():
     game_state = GameState.MENU
 
-    def __init__(self):
-        self.network = Network()
+    def __init__(self, headless=False, network=None, level=None):
+        # headless runs without a window or sound, straight into the game, e.g. for benchmarks
+        self.headless = headless
+        self.tickspeed = 60
+        self.timestep = FixedTimestep(simulation_rate, max_ticks_per_frame)
+        # if set, each frame advances the simulation by this many seconds rather than the
+        # real time since the last frame, so headless runs are repeatable
+        self.fixed_frame_time = None
+        if network is None and server_address is not None:
+            network = ServerNetwork(server_address)
+        elif network is None:
+            # with interest management the world groups are joined region by region instead
+            groups = () if interest_management else GROUPS
+            network = ThreadedNetwork(groups) if threaded_network else Network(groups)
+        self.network = network
+        # a server decides where everyone is and what the spells hit, rather than each client
+        self.server = network if isinstance(network, ServerNetwork) else None
+        use_interest = interest_management and self.server is None
+        self.interest = InterestManager(self.network, GROUPS) if use_interest else None
         self.setup_pygame()
-        me = Player(self.screen, self.map)
+        self.level_manager = LevelManager(
+            level_workers,
+            cache_directory=level_cache_directory if not chunked_level else None
+        )
+        self.level_number = 0
+        self.start_loading(level)
+        # the map is created once its assets have loaded, see finish_loading
+        self.map = None
+        self.renderer = None
+        # players and spells are drawn together at the end of each frame, see batch.py
+        self.batch = RenderBatch(self.screen)
+        # the menu needs the player's name and settings straight away, but not its sprites
+        me = Player(self.screen, None, load_tileset=False)
         self.players = PlayerManager(me)
-        self.map.set_centre_player(self.players.me)
         self.menu = MainMenu(self.screen, self.players)
+        self.profiler = FrameProfiler(PROFILER_PHASES, enabled=profiling or profile_csv is not None)
+        self.profiler_overlay = None
+
+        # numbers what we send, see protocol.py, and picks out what to apply of what we receive,
+        # see inbound.py
+        self.encoder = protocol.Encoder()
+        self.inbound = InboundPipeline()
+        # only send our position when it changes, at most position_send_rate times a second,
+        # plus a keepalive every second
+        self.position_filter = protocol.ChangeFilter(keepalive=1.0, min_interval=1.0 / position_send_rate)
+
+        if headless:
+            self.finish_loading()
+            self.game_state = GameState.PLAY
 
     def setup_pygame(self):
+        if self.headless:
+            # SDL's dummy drivers need no display or sound card
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
+            os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
         # Initialise screen/display
         self.screen = pygame.display.set_mode((width, height), pygame.HWSURFACE)
 
@@ -60,7 +166,8 @@ class GameClient():
         pygame.font.init()
 
         # Initialise music
-        pygame.mixer.init()
+        if not self.headless:
+            pygame.mixer.init()
 
         # Initialise the joystick.
         pygame.joystick.init()
@@ -73,44 +180,135 @@ class GameClient():
             pygame.locals.JOYAXISMOTION,
             pygame.locals.KEYDOWN])
 
+    def create_level(self):
+        if chunked_level:
+            return ChunkedProceduralLevel(self.level_seed(0))
+        cache = LevelCache(level_cache_directory) if level_cache_directory is not None else None
+        return ProceduralLevel(self.level_seed(0), level_size[0], level_size[1], cache=cache)
+
+    def level_seed(self, number):
+        return 42 + number
+
+    def level_name(self, number):
+        return "main" if number == 0 else "level {0}".format(number)
+
+    def start_loading(self, level=None):
+        # load everything the game needs but the menu doesn't at the same time, in the
+        # background, so the menu is up while it loads
+        if level is None:
+            level_future = assets.load_in_background(self.create_level)
+        else:
+            level_future = Future()
+            level_future.set_result(level)
+
+        self.music = LevelMusic(music_path)
+        self.loading = {
+            'level': level_future,
+            'tileset': assets.load_in_background(assets.get_tileset, level_tileset_path, (16, 16), (32, 32), True),
+            'player tileset': assets.load_in_background(assets.get_tileset, player_animation_tileset_path, (3, 4), (32, 32), True),
+        }
+        if not self.headless:
+            self.loading['music'] = assets.load_in_background(self.music.load_music)
+
+    def finish_loading(self):
+        # wait for anything still loading and set up the map, before the game is first played
+        if self.map is not None:
+            return
+        for future in self.loading.values():
+            future.result()
+
+        self.players.me.set_tileset(self.loading['player tileset'].result())
         self.levels = {
-            "main": ProceduralLevel(42)
+            "main": self.loading['level'].result()
         }
+        self.use_level(self.levels.get("main"))
+        # headless runs are for measuring the game loop, without workers competing for the CPU
+        if not self.headless:
+            self.request_upcoming_levels()
 
+    def use_level(self, level):
         self.map = Map(
             self.screen,
-            self.levels.get("main"),
-            Tileset(level_tileset_path, (16, 16), (32, 32)),
-            LevelMusic('assets/music/song.mp3')
+            level,
+            self.loading['tileset'].result(),
+            self.music
         )
-        self.map.music.load_music()
+        me = self.players.me
+        me.map = self.map
+        for player in self.players.others.values():
+            player.map = self.map
+        self.map.set_centre_player(me)
+        self.renderer = IncrementalRenderer(self.screen, self.map, white) if incremental_render else None
+
+    def request_upcoming_levels(self):
+        me = self.players.me
+        size = None if chunked_level else level_size
+        for number in range(self.level_number + 1, self.level_number + upcoming_levels + 1):
+            self.level_manager.request(self.level_name(number), self.level_seed(number), size, (me.x, me.y))
+
+    def next_level(self):
+        # move on to the next level if it has been generated, never waits for it
+        if self.server is not None:
+            log.info("the server decides the level")
+            return False
+        name = self.level_name(self.level_number + 1)
+        level = self.level_manager.get(name)
+        if level is None:
+            log.info("%s isn't ready yet", name)
+            return False
+        self.level_manager.discard(name)
+        self.levels = { name: level }
+        self.level_number += 1
+        self.use_level(level)
+        # where we were on the last level may well be a wall on this one
+        self.place_on_open_tile()
+        self.request_upcoming_levels()
+        return True
 
     def set_state(self, new_state):
         if(new_state and new_state != self.game_state):
             self.game_state = new_state
 
             if(self.game_state.value == GameState.PLAY.value):
+                self.finish_loading()
                 pygame.key.set_repeat(50, 50)
             else:
                 pygame.key.set_repeat(0, 0)
 
-    def run(self):
+    def run(self, max_frames=None, frame_times=None):
+        # stops after max_frames if given, and appends each frame's time to frame_times if given
         running = True
         clock = pygame.time.Clock()
-        tickspeed = 60
+        frames = 0
+        last_frame_start = time.perf_counter()
         last_direction = None
-        cast = False # Flag for when player casts spell.
+        cast = None # Properties of the spell the player just cast.
+        known_peers = 0
+        last_peer_sweep = None
+        last_autosave = time.perf_counter()
         me = self.players.me
+        profiler = self.profiler
 
-        if me.mute == "False":
+        if me.mute == "False" and not self.headless:
+            self.loading['music'].result()
             LevelMusic.play_music_repeat()
 
         try:
             while running:
-                self.screen.fill((white))
-                clock.tick(tickspeed)
+                profiler.begin_frame()
+                # set when this frame's game view is drawn by the incremental renderer
+                incremental_frame = False
+                if self.renderer is None or self.game_state.value != GameState.PLAY.value:
+                    self.screen.fill((white))
+                    if self.renderer is not None:
+                        self.renderer.invalidate()
+                clock.tick(self.tickspeed)
+                frame_start = time.perf_counter()
+                elapsed = frame_start - last_frame_start if self.fixed_frame_time is None else self.fixed_frame_time
+                last_frame_start = frame_start
+                profiler.mark('wait')
                 if(self.game_state.value == GameState.MENU.value):
-                    self.menu.render((self.map.screen.get_width() * 0.45, self.map.screen.get_height()*0.4))
+                    self.menu.render((self.screen.get_width() * 0.45, self.screen.get_height()*0.4))
                     for event in pygame.event.get():
                         if event.type == pygame.QUIT or event.type == pygame.locals.QUIT:
                             running = False
@@ -139,6 +337,10 @@ class GameClient():
                             break
                         elif event.type == pygame.locals.KEYDOWN and event.key == pygame.locals.K_ESCAPE:
                             self.set_state(GameState.MENU)
+                        elif event.type == pygame.locals.KEYDOWN and event.key == pygame.locals.K_F3:
+                            self.toggle_profiler()
+                        elif event.type == pygame.locals.KEYDOWN and event.key == pygame.locals.K_F4:
+                            self.next_level()
 
                         elif event.type == pygame.locals.KEYDOWN:
                             if event.key == pygame.locals.K_UP:
@@ -154,15 +356,14 @@ class GameClient():
                                 me.move(Movement.RIGHT)
                                 last_direction = Movement.RIGHT
                             elif event.key == pygame.locals.K_RETURN:
-                                cast = True
                                 if last_direction == Movement.LEFT:
-                                    me.attack(Action.SPELL, Movement.LEFT)
+                                    cast = me.attack(Action.SPELL, Movement.LEFT)
                                 elif last_direction == Movement.UP:
-                                    me.attack(Action.SPELL, Movement.UP)
+                                    cast = me.attack(Action.SPELL, Movement.UP)
                                 elif last_direction == Movement.DOWN:
-                                    me.attack(Action.SPELL, Movement.DOWN)
+                                    cast = me.attack(Action.SPELL, Movement.DOWN)
                                 else:
-                                    me.attack(Action.SPELL, Movement.RIGHT)
+                                    cast = me.attack(Action.SPELL, Movement.RIGHT)
                             pygame.event.clear(pygame.locals.KEYDOWN)
 
                     # https://stackoverflow.com/a/15596758/3954432
@@ -207,61 +408,214 @@ class GameClient():
                                 me.move(Movement.LEFT)
                                 last_direction = Movement.LEFT
                         last_update = pygame.time.get_ticks()
-
-                    self.map.render()
-                    me.render()
-                    for spell in me.cast_spells:
-                        spell.render()
-
-                    self.players.set(self.network.node.peers())
+                    profiler.mark('input')
+
+                    # a player with a name has been set up or loaded, and so has a save to keep
+                    # up to date. Saving only marks it changed, see save_store.py.
+                    if autosave_interval and not self.headless and me.name and frame_start - last_autosave >= autosave_interval:
+                        me.save_to_config()
+                        last_autosave = frame_start
+
+                    self.level_manager.poll()
+                    if self.renderer is not None:
+                        self.renderer.begin_frame()
+                        incremental_frame = True
+                    else:
+                        self.map.render()
+                    profiler.mark('map')
+                    # areas of the screen drawn over the map
+                    drawn = me.render(batch=self.batch)
+                    profiler.mark('players')
+                    for tick in range(self.timestep.advance(elapsed)):
+                        self.tick()
+                    profiler.mark('spells')
+
+                    # peers come and go with ENTER and EXIT events, now and then the whole
+                    # list is checked in case an event was missed
+                    if last_peer_sweep is None or frame_start - last_peer_sweep >= peer_sweep_interval:
+                        self.sweep_peers()
+                        last_peer_sweep = frame_start
                     # check network
-                    events = self.network.get_events()
+                    # only the newest position from each peer, and recent spells in order
+                    events = self.inbound.process(self.network.get_events())
                     if events:
                         try:
-                            for event in self.network.get_events():
-                                print(event.peer_uuid, event.type, event.group, event.msg)
-
-                                if event.group == "world:position":
-                                    new_position = bson.loads(event.msg[0])
-                                    network_player = self.players.get(event.peer_uuid)
-                                if event.group == "world:combat":
-                                    new_spell_properties = bson.loads(event.msg[0])
-                                    network_spell_caster = self.players.get(event.peer_uuid)
-                                    network_spell_caster.cast_spells.append(Spell(network_spell_caster, (0, 0)))
-                                    network_spell_caster.cast_spells[-1].set_properties(SpellProperties(**new_spell_properties))
-
-                                if network_player:
-                                    network_player.set_position(Position(**new_position))
+                            for event in events:
+                                log.debug("%s %s %s %s", event.peer_uuid, event.type, event.group, event.message)
+
+                                if event.type != "SHOUT":
+                                    self.update_membership(event)
+                                    continue
+
+                                message = event.message
+                                group = base_group(event.group)
+                                if group == "world:position":
+                                    network_player = self.players.add(event.peer_uuid)
+                                    network_player.add_snapshot(event.time, Position(*message.values))
+                                if group == "world:combat":
+                                    network_spell_caster = self.players.add(event.peer_uuid)
+                                    spell = SpellProperties(*message.values)
+                                    network_spell_caster.cast_spell((spell.x_velocity, spell.y_velocity), (spell.x, spell.y))
 
                         except Exception as e:
                             print(e)
                             import traceback
                             print(traceback.format_exc())
                             pass
-
-                    # if there are other peers we can start sending to groups
-                    if self.players.others:
-                        self.network.node.shout("world:position", bson.dumps(me.get_position()._asdict()))
-                        if cast == True:
-                            self.network.node.shout("world:combat", bson.dumps(me.cast_spells[-1].get_properties()._asdict()))
-                            cast = False
-                    for playerUUID, player in self.players.others.items():
-                        try:
-                            player.render()
-                            for spell in player.cast_spells:
-                                spell.render()
-                                spell.hit_target(me)
-
-                        except PlayerException as e:
-                            # PlayerException due to no initial position being set for that player
-                            print(e)
-                            pass
-
-                pygame.display.update()
+                    if self.server is not None:
+                        self.apply_server_state()
+                    # peers which have gone quiet, or out of our area of interest, are hidden
+                    self.players.expire(time.monotonic() - peer_timeout)
+                    profiler.mark('network')
+
+                    position_group = "world:position"
+                    combat_group = "world:combat"
+                    if self.interest is not None:
+                        # a new region means different listeners, who need our position
+                        if self.interest.update(me.x, me.y):
+                            self.position_filter.reset()
+                        position_group = self.interest.shout_group(position_group)
+                        combat_group = self.interest.shout_group(combat_group)
+
+                    # if there are other peers we can start sending to groups, a server always
+                    # wants to know
+                    if self.players.others or self.server is not None:
+                        # new peers need our position straight away rather than at the next keepalive
+                        if len(self.players.others) > known_peers:
+                            self.position_filter.reset()
+                        if self.position_filter.should_send(me.get_position()):
+                            self.network.shout(position_group, self.encoder.encode(protocol.POSITION, me.get_position()))
+                        if cast:
+                            self.network.shout(combat_group, self.encoder.encode(protocol.SPELL, cast))
+                            cast = None
+                    known_peers = len(self.players.others)
+                    profiler.mark('send')
+                    render_time = time.monotonic() - interpolation_delay
+                    for player in self.players.placed():
+                        drawn.extend(player.render(render_time, self.batch))
+                    profiler.mark('players')
+                    drawn.extend(self.map.projectiles.render(self.map, self.timestep.alpha(), self.batch))
+                    profiler.mark('spells')
+                    self.batch.flush()
+                    profiler.mark('draw')
+                    if self.profiler_overlay is not None:
+                        drawn.extend(self.profiler_overlay.render(self.screen))
+                        profiler.mark('overlay')
+
+                if incremental_frame:
+                    self.renderer.drawn(drawn)
+                    self.renderer.end_frame()
+                else:
+                    pygame.display.update()
+                profiler.mark('display')
+                profiler.end_frame()
+
+                if frame_times is not None:
+                    frame_times.append(time.perf_counter() - frame_start)
+                frames += 1
+                if max_frames is not None and frames >= max_frames:
+                    running = False
         finally:
             self.network.stop()
+            self.level_manager.shutdown()
+            if not save_store.get_store(save_path).close():
+                log.error("the player could not be saved to %s", save_path)
+            if profile_csv is not None:
+                profiler.write_csv(profile_csv)
+
+    def tick(self):
+        # advance the game world by one fixed step
+        self.map.projectiles.step()
+        if self.server is not None:
+            # the spells only move on here until the next snapshot, the server finds the hits
+            return
+        # spells are used up by the first player they hit
+        hits = self.map.projectiles.find_hits([self.players.me] + self.players.placed())
+        self.map.projectiles.remove_indices([ spell for spell, player in hits ])
+
+    def apply_server_state(self):
+        welcome = self.server.take_welcome()
+        if welcome is not None:
+            player_id, port, seed, width, height = welcome
+            level = self.map.level
+            if seed != level.seed or (width, height) != (level.width or 0, level.height or 0):
+                # the server checks moves against its level, so play on that one
+                log.info("using the server's level, seed %d, %dx%d", seed, width, height)
+                level = ChunkedProceduralLevel(seed) if width == 0 else ProceduralLevel(seed, width, height)
+                self.levels = { self.level_name(0): level }
+                self.level_number = 0
+                self.use_level(level)
+            self.place_on_open_tile()
+        spells = self.server.take_spells()
+        if spells is not None:
+            self.map.projectiles.replace(spells['x'], spells['y'], spells['x_velocity'], spells['y_velocity'])
+        correction = self.server.take_correction()
+        if correction is not None:
+            self.players.me.set_position(Position(*correction))
+
+    def place_on_open_tile(self, max_radius=64):
+        # move to the nearest tile that can be walked on, searching a ring at a time
+        me = self.players.me
+        level = self.map.level
+        x, y = me.x, me.y
+        if level.width:
+            x = min(max(x, 0), level.width - 1)
+            y = min(max(y, 0), level.height - 1)
+        for radius in range(max_radius + 1):
+            for dy in range(-radius, radius + 1):
+                for dx in range(-radius, radius + 1):
+                    if max(abs(dx), abs(dy)) == radius and level.can_move_to(x + dx, y + dy):
+                        me.set_position(Position(x + dx, y + dy))
+                        return True
+        log.error("no open tile within %d of %d, %d", max_radius, x, y)
+        return False
+
+    def update_membership(self, event):
+        # ENTER and JOIN mean a peer is there, even if we missed it arriving. LEAVE is only
+        # a peer moving out of one of our groups, e.g. to another region, it's still there.
+        if event.type == "ENTER" or event.type == "JOIN":
+            self.players.add(event.peer_uuid)
+        elif event.type == "EXIT":
+            self.remove_peer(event.peer_uuid)
+
+    def remove_peer(self, uuid):
+        # a peer has gone, so have its spells
+        player = self.players.others.get(uuid)
+        if player is not None and self.map is not None:
+            self.map.projectiles.remove_owner(player)
+        self.players.remove(uuid)
+        self.inbound.forget(uuid)
+
+    def sweep_peers(self):
+        # make the players match the network's list of peers
+        peers = self.network.peers()
+        departed = set(self.players.others) - set(peers)
+        for uuid in departed:
+            self.remove_peer(uuid)
+        added, removed = self.players.set(peers)
+        removed += len(departed)
+        if added or removed:
+            log.info("peer sweep added %d and removed %d players", added, removed)
+
+    def toggle_profiler(self):
+        if self.profiler_overlay is None:
+            self.profiler.set_enabled(True)
+            self.profiler_overlay = ProfilerOverlay(self.profiler, font)
+        else:
+            # keep timing if the frames are wanted in a CSV file
+            self.profiler.set_enabled(profiling or profile_csv is not None)
+            self.profiler_overlay = None
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--server', help='address of a game server to connect to, e.g. tcp://127.0.0.1:5555')
+    parser.add_argument('--chunked', action='store_true', help='play an endless level generated in chunks')
+    args = parser.parse_args()
+    if args.server:
+        server_address = args.server
+    if args.chunked:
+        chunked_level = True
+
     logger = logging.getLogger("pyre")
     logger.setLevel(logging.INFO)
     logger.addHandler(logging.StreamHandler())
@@ -0,0 +1,46 @@
+import numpy
+
+from tile import TileType
+
+'''
+TileGrid stores a level as two parallel NumPy arrays indexed [y, x]:
+
+tile_ids   - the tileset id of every cell (uint8)
+attributes - the TileAttribute bitmask of every cell (uint8)
+
+'''
+
+TILE_TYPES_BY_ID = { tile_type.tileset_id: tile_type for tile_type in TileType }
+
+# attributes of every tileset id, so a whole array of ids can be converted in one lookup
+ATTRIBUTES_BY_ID = numpy.zeros(256, dtype=numpy.uint8)
+for tile_type in TileType:
+    ATTRIBUTES_BY_ID[tile_type.tileset_id] = tile_type.attributes
+
+
+class TileGrid():
+    def __init__(self, tile_ids, attributes=None):
+        # attributes are worked out from tile_ids unless they're given, e.g. when loaded
+        self.tile_ids = numpy.ascontiguousarray(tile_ids, dtype=numpy.uint8)
+        if attributes is None:
+            attributes = ATTRIBUTES_BY_ID[self.tile_ids]
+        self.attributes = numpy.ascontiguousarray(attributes, dtype=numpy.uint8)
+        self.height, self.width = self.tile_ids.shape
+
+    @classmethod
+    def empty(cls, width, height, tile_type=TileType.DIRT):
+        return cls(numpy.full((height, width), tile_type.tileset_id, dtype=numpy.uint8))
+
+    def get_tile(self, x, y):
+        return TILE_TYPES_BY_ID[int(self.tile_ids[y, x])]
+
+    def set_tile(self, x, y, tile_type):
+        self.tile_ids[y, x] = tile_type.tileset_id
+        self.attributes[y, x] = tile_type.attributes
+
+    def has_attribute(self, x, y, attribute):
+        return self.attributes[y, x] & attribute.value == attribute.value
+
+    def to_lists(self):
+        # the old list of lists of TileType representation, mainly for comparisons
+        return [ [ TILE_TYPES_BY_ID[tile_id] for tile_id in row ] for row in self.tile_ids.tolist() ]
@@ -0,0 +1,82 @@
+import time
+
+import protocol
+
+'''
+InboundPipeline turns a frame's batch of network events into the ones worth applying.
+
+Positions are latest wins: only the newest position from each peer in a batch is
+kept, as applying the older ones first would only be overwritten. Everything else,
+spell casts and peers coming and going, is kept in the order it arrived. Messages
+older than one already applied from the same peer are dropped, as before.
+
+To keep the backlog bounded after a stall, spell casts received more than max_age
+seconds ago are dropped, and only the newest max_spells of a batch are kept, so a
+long frame is caught up on in the next one rather than replayed.
+
+'''
+
+
+class InboundPipeline():
+    def __init__(self, max_spells=256, max_age=1.0):
+        self.max_spells = max_spells
+        self.max_age = max_age
+        self.sequences = protocol.SequenceTracker()
+        self.received = 0
+        self.applied = 0
+        # positions superseded by a newer one from the same peer in the same batch
+        self.coalesced = 0
+        # spells dropped for being too old or too many
+        self.dropped = 0
+
+    def process(self, events, now=None):
+        # the events of a batch to apply, in the order to apply them
+        if now is None:
+            now = time.monotonic()
+        self.received += len(events)
+
+        # index of the newest position from each peer, by sequence rather than arrival
+        newest = {}
+        positions = 0
+        spells = []
+        for index, event in enumerate(events):
+            if event.type != "SHOUT":
+                continue
+            message = event.message
+            if message.kind == protocol.POSITION:
+                positions += 1
+                kept = newest.get(event.peer_uuid)
+                if kept is None or protocol.is_newer(message.sequence, events[kept].message.sequence):
+                    newest[event.peer_uuid] = index
+            elif now - event.time > self.max_age:
+                self.dropped += 1
+            else:
+                spells.append(index)
+        self.coalesced += positions - len(newest)
+        if len(spells) > self.max_spells:
+            self.dropped += len(spells) - self.max_spells
+            spells = spells[-self.max_spells:]
+
+        keep = set(newest.values())
+        keep.update(spells)
+        accepted = []
+        for index, event in enumerate(events):
+            if event.type == "SHOUT":
+                if index not in keep or not self.sequences.accept(event.peer_uuid, event.message):
+                    continue
+            accepted.append(event)
+        self.applied += len(accepted)
+        return accepted
+
+    def forget(self, peer_uuid):
+        # a peer has left, if it comes back its sequences start again
+        self.sequences.forget(peer_uuid)
+
+    def stats(self):
+        return {
+            'received': self.received,
+            'applied': self.applied,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'stale': self.sequences.dropped,
+        }
@@ -0,0 +1,66 @@
+'''
+Area of interest management for Pyre groups.
+
+The map is split into square regions of region_size tiles and each region has its
+own copy of every world group, e.g. "world:position@2,-1". A client shouts only into
+its own region's groups and joins the groups of every region within radius regions
+of it, so it hears the players near it rather than everyone on the network.
+
+'''
+
+REGION_SEPARATOR = '@'
+
+
+def region_group(group, region):
+    return '{0}{1}{2},{3}'.format(group, REGION_SEPARATOR, region[0], region[1])
+
+
+def base_group(group):
+    # "world:position@2,-1" -> "world:position", plain group names are returned as they are
+    if group is None:
+        return None
+    return group.split(REGION_SEPARATOR, 1)[0]
+
+
+class InterestManager():
+    def __init__(self, network, groups, region_size=32, radius=1):
+        self.network = network
+        self.groups = groups
+        self.region_size = region_size
+        self.radius = radius
+        self.region = None
+        self.joined = set()
+        self.joins = 0
+        self.leaves = 0
+
+    def region_of(self, x, y):
+        return (int(x) // self.region_size, int(y) // self.region_size)
+
+    def wanted_groups(self, region):
+        return set(
+            region_group(group, (region[0] + dx, region[1] + dy))
+            for group in self.groups
+            for dx in range(-self.radius, self.radius + 1)
+            for dy in range(-self.radius, self.radius + 1)
+        )
+
+    def update(self, x, y):
+        # join and leave groups as the player moves between regions, True if it did
+        region = self.region_of(x, y)
+        if region == self.region:
+            return False
+        self.region = region
+
+        wanted = self.wanted_groups(region)
+        for group in sorted(wanted - self.joined):
+            self.network.join(group)
+            self.joins += 1
+        for group in sorted(self.joined - wanted):
+            self.network.leave(group)
+            self.leaves += 1
+        self.joined = wanted
+        return True
+
+    def shout_group(self, group):
+        # the copy of group for the region the player is in
+        return region_group(group, self.region)
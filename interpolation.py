@@ -0,0 +1,80 @@
+'''
+SnapshotBuffer keeps the most recent timestamped positions received for a remote player.
+
+Remote players are drawn a little in the past (the interpolation delay), between the
+two snapshots either side of that moment, so they glide from update to update
+instead of jumping. If the next snapshot is late the last known velocity is carried
+on for at most max_extrapolation seconds, and never further than one more update's
+worth of movement, then the player waits where it is.
+
+'''
+
+class SnapshotBuffer():
+    def __init__(self, size=32, max_extrapolation=0.25):
+        self.size = size
+        self.max_extrapolation = max_extrapolation
+        self.times = [0.0] * size
+        self.xs = [0.0] * size
+        self.ys = [0.0] * size
+        # index the next snapshot is written to, and how many are stored
+        self.head = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+
+    def add(self, time, x, y):
+        if self.count and time < self.newest_time():
+            # out of order, older than what we already have
+            return False
+        self.times[self.head] = time
+        self.xs[self.head] = x
+        self.ys[self.head] = y
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+        return True
+
+    def index(self, age):
+        # ring index of the snapshot age steps back from the newest
+        return (self.head - 1 - age) % self.size
+
+    def newest_time(self):
+        return self.times[self.index(0)]
+
+    def sample(self, time):
+        if not self.count:
+            return None
+
+        newest = self.index(0)
+        if time >= self.times[newest]:
+            if self.count == 1:
+                return (self.xs[newest], self.ys[newest])
+            # carry on at the last known velocity for a short while
+            previous = self.index(1)
+            duration = self.times[newest] - self.times[previous]
+            if duration <= 0:
+                return (self.xs[newest], self.ys[newest])
+            ahead = min(time - self.times[newest], self.max_extrapolation, duration) / duration
+            return (
+                self.xs[newest] + (self.xs[newest] - self.xs[previous]) * ahead,
+                self.ys[newest] + (self.ys[newest] - self.ys[previous]) * ahead
+            )
+
+        # walk back to the pair of snapshots either side of time
+        for age in range(1, self.count):
+            older = self.index(age)
+            if self.times[older] <= time:
+                newer = self.index(age - 1)
+                duration = self.times[newer] - self.times[older]
+                fraction = (time - self.times[older]) / duration if duration > 0 else 1.0
+                return (
+                    self.xs[older] + (self.xs[newer] - self.xs[older]) * fraction,
+                    self.ys[older] + (self.ys[newer] - self.ys[older]) * fraction
+                )
+
+        oldest = self.index(self.count - 1)
+        return (self.xs[oldest], self.ys[oldest])
@@ -1,38 +1,208 @@
+import concurrent.futures
+import os
+
+import numpy
 from opensimplex import OpenSimplex
 
+from chunk_cache import ChunkCache
+from grid import TileGrid
+import simplex
+from simplex import VectorisedOpenSimplex
 from tile import TileAttribute
 from tile import TileType
 
+# threads generate_tile_ids spreads a large rectangle over
+GENERATION_THREADS = os.cpu_count() or 1
+
 class Level():
+    '''
+    A grid of tiles, queried one cell at a time or in bulk.
+
+    The bulk queries work on the attribute bitmask of every cell, so they answer for
+    a whole rectangle, or a whole batch of positions or paths, in a few array
+    operations. They take a mask of TileAttribute values (see tile.attribute_mask)
+    and match cells with any of those attributes.
+    '''
+    # how far apart, in tiles, paths are sampled by paths_blocked
+    PATH_STEP = 0.5
+
+    def __init__(self):
+        # called with (x, y) whenever set_tile changes a tile
+        self.tile_listeners = []
+
     def load_tiles(self):
         self.width = 0
         self.height = 0
-        self.grid = [[]]
+        self.grid = TileGrid.empty(0, 0)
 
     def get_tile(self, x, y):
-        return self.grid[y][x]
+        return self.grid.get_tile(x, y)
+
+    def get_tile_ids(self, x, y, width, height):
+        # tileset ids of a rectangle of tiles, which must lie inside the level
+        return self.grid.tile_ids[y:y + height, x:x + width]
+
+    def get_attributes(self, xs, ys, outside=0):
+        # attribute bitmasks of many cells at once, cells outside the level get outside
+        xs = numpy.asarray(xs)
+        ys = numpy.asarray(ys)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        attributes = numpy.full(xs.shape, outside, dtype=numpy.uint8)
+        attributes[inside] = self.grid.attributes[ys[inside], xs[inside]]
+        return attributes
+
+    def get_attribute_grid(self, x, y, width, height, outside=0):
+        # attribute bitmasks of a rectangle of tiles, indexed [y, x], cells outside the level get outside
+        attributes = numpy.full((height, width), outside, dtype=numpy.uint8)
+        min_x, min_y, max_x, max_y = self.clip(x, y, x + width, y + height)
+        if max_x > min_x and max_y > min_y:
+            attributes[min_y - y:max_y - y, min_x - x:max_x - x] = self.grid.attributes[min_y:max_y, min_x:max_x]
+        return attributes
+
+    def cells_with(self, mask, min_x, min_y, max_x, max_y):
+        # x and y arrays of the cells in [min, max) with any attribute in mask
+        attributes = self.get_attribute_grid(min_x, min_y, max(0, max_x - min_x), max(0, max_y - min_y))
+        ys, xs = numpy.nonzero(attributes & mask)
+        return xs + min_x, ys + min_y
+
+    def count_with(self, mask, min_x, min_y, max_x, max_y):
+        # how many cells in [min, max) have any attribute in mask, e.g. tile.HAZARDS in view
+        attributes = self.get_attribute_grid(min_x, min_y, max(0, max_x - min_x), max(0, max_y - min_y))
+        return int(numpy.count_nonzero(attributes & mask))
+
+    def any_at(self, xs, ys, mask, outside=0):
+        # for a batch of positions, whether the cell each is in has any attribute in mask
+        xs = numpy.floor(numpy.asarray(xs)).astype(numpy.int64)
+        ys = numpy.floor(numpy.asarray(ys)).astype(numpy.int64)
+        return (self.get_attributes(xs, ys, outside) & mask) != 0
+
+    def can_move_to_many(self, xs, ys):
+        # can_move_to for a batch of positions
+        collide = TileAttribute.COLLIDE.value
+        return ~self.any_at(xs, ys, collide, outside=collide)
+
+    def paths_blocked(self, from_xs, from_ys, to_xs, to_ys, mask=TileAttribute.COLLIDE.value, outside=None):
+        # for a batch of straight paths, whether any cell along each has an attribute in
+        # mask, leaving a finite level counts as blocked unless outside says otherwise.
+        # Paths are sampled every PATH_STEP tiles, so one only grazing the corner of a
+        # cell may miss it.
+        if outside is None:
+            outside = mask
+        from_xs = numpy.atleast_1d(numpy.asarray(from_xs, dtype=numpy.float64))
+        from_ys = numpy.atleast_1d(numpy.asarray(from_ys, dtype=numpy.float64))
+        delta_xs = numpy.atleast_1d(numpy.asarray(to_xs, dtype=numpy.float64)) - from_xs
+        delta_ys = numpy.atleast_1d(numpy.asarray(to_ys, dtype=numpy.float64)) - from_ys
+
+        # every sample of every path in one flat array, tagged with the path it's from
+        lengths = numpy.maximum(numpy.abs(delta_xs), numpy.abs(delta_ys))
+        samples = numpy.ceil(lengths / self.PATH_STEP).astype(numpy.int64) + 1
+        paths = numpy.repeat(numpy.arange(len(samples)), samples)
+        starts = numpy.cumsum(samples) - samples
+        fractions = (numpy.arange(len(paths)) - starts[paths]) / numpy.maximum(samples - 1, 1)[paths]
+
+        hit = self.any_at(
+            from_xs[paths] + delta_xs[paths] * fractions,
+            from_ys[paths] + delta_ys[paths] * fractions,
+            mask, outside
+        )
+        return numpy.bincount(paths[hit], minlength=len(samples)) > 0
+
+    def path_blocked(self, from_x, from_y, to_x, to_y, mask=TileAttribute.COLLIDE.value):
+        return bool(self.paths_blocked(from_x, from_y, to_x, to_y, mask)[0])
+
+    def set_tile(self, x, y, tile_type):
+        self.grid.set_tile(x, y, tile_type)
+        self.tile_changed(x, y)
+
+    def add_tile_listener(self, listener):
+        self.tile_listeners.append(listener)
+
+    def tile_changed(self, x, y):
+        for listener in self.tile_listeners:
+            listener(x, y)
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def clip(self, min_x, min_y, max_x, max_y):
+        # clamp a tile range (max exclusive) to the cells that exist
+        return (
+            max(0, min_x), max(0, min_y),
+            min(max_x, self.width), min(max_y, self.height)
+        )
 
     def can_move_to(self, x, y):
         if x < 0 or x >= self.width:
             return False
         elif y < 0 or y >= self.height:
             return False
-        elif self.get_tile(x, y).has_attribute(TileAttribute.COLLIDE):
+        elif self.grid.has_attribute(x, y, TileAttribute.COLLIDE):
             return False
         return True
 
 
 class ProceduralLevel(Level):
-    def __init__(self, seed, width = 50, height = 50):
+    # bump whenever generated levels change, so cached copies of old ones aren't used
+    GENERATOR_VERSION = 1
+
+    def __init__(self, seed, width = 50, height = 50, cache = None, grid = None):
+        # cache is an optional LevelCache to load the level from, or store it in, and grid
+        # the level's TileGrid if it has already been generated, e.g. by a LevelManager
+        super().__init__()
+        self.seed = seed
+        self.cache = cache
         self.openSimplex = OpenSimplex(seed)
-        self.load_tiles(width, height)
+        self.noise = VectorisedOpenSimplex(self.openSimplex)
+        if grid is None:
+            self.load_tiles(width, height)
+        else:
+            self.width = width
+            self.height = height
+            self.grid = grid
 
     def load_tiles(self, width, height):
         self.width = width
         self.height = height
-        self.grid = [
-            [ self.generate_grid_tile(i, j) for i in range(width) ] for j in range(height)
-        ] 
+        if self.cache is None:
+            self.grid = self.generate_grid(width, height)
+        else:
+            key = (self.GENERATOR_VERSION, self.seed, width, height)
+            self.grid = self.cache.get(key, lambda: self.generate_grid(width, height))
+
+    def generate_grid(self, width, height):
+        return TileGrid(self.generate_tile_ids(0, 0, width, height))
+
+    def generate_tile_ids(self, x, y, width, height):
+        # vectorised generate_grid_tile for every cell of the given rectangle
+        tile_ids = numpy.full((height, width), TileType.DIRT.tileset_id, dtype=numpy.uint8)
+        if width == 0:
+            return tile_ids
+
+        # work through a band of rows at a time so the noise temporaries stay small, numpy
+        # lets go of the GIL while it works so bands can be generated on several threads
+        band = max(1, simplex.BLOCK_SIZE // width)
+        rows = range(0, height, band)
+        if GENERATION_THREADS > 1 and len(rows) > 1:
+            with concurrent.futures.ThreadPoolExecutor(GENERATION_THREADS) as pool:
+                list(pool.map(lambda row: self.generate_band(tile_ids, x, y, row, band), rows))
+        else:
+            for row in rows:
+                self.generate_band(tile_ids, x, y, row, band)
+        return tile_ids
+
+    def generate_band(self, tile_ids, x, y, row, band):
+        # fills in up to band rows of tile_ids, from row on, for the rectangle at (x, y)
+        height, width = tile_ids.shape
+        rows = min(band, height - row)
+        xs = numpy.tile(numpy.arange(x, x + width) / 10, rows)
+        ys = numpy.repeat(numpy.arange(y + row, y + row + rows) / 10, width)
+        # float32 noise is quicker but only close to the exact value, so the few cells near
+        # enough to zero for their sign to be in doubt are worked out again exactly
+        noise = self.noise.noise2d(xs, ys, numpy.float32)
+        brick = noise < 0
+        doubtful = numpy.flatnonzero(numpy.abs(noise) < simplex.FLOAT32_ERROR)
+        brick[doubtful] = self.noise.noise2d(xs[doubtful], ys[doubtful]) < 0
+        tile_ids[row:row + rows][brick.reshape(rows, width)] = TileType.BRICK.tileset_id
 
     def generate_grid_tile(self, x, y):
         noise = self.openSimplex.noise2d(x / 10, y / 10)
@@ -40,3 +210,104 @@ class ProceduralLevel(Level):
             return TileType.BRICK
         else:
             return TileType.DIRT
+
+
+class ChunkedProceduralLevel(ProceduralLevel):
+    '''
+    An unbounded ProceduralLevel which only generates the chunks that get touched.
+
+    width and height are None, there are no edges to stop at.
+    '''
+    def __init__(self, seed, chunk_size = 32, max_chunks = 256):
+        Level.__init__(self)
+        self.seed = seed
+        self.cache = None
+        self.openSimplex = OpenSimplex(seed)
+        self.noise = VectorisedOpenSimplex(self.openSimplex)
+        self.chunk_size = chunk_size
+        self.width = None
+        self.height = None
+        # tiles changed with set_tile by chunk, reapplied when an evicted chunk is regenerated
+        self.edits = {}
+        self.chunks = ChunkCache(self.generate_chunk, max_chunks)
+
+    def generate_chunk(self, chunk_x, chunk_y):
+        origin_x = chunk_x * self.chunk_size
+        origin_y = chunk_y * self.chunk_size
+        chunk = TileGrid(self.generate_tile_ids(origin_x, origin_y, self.chunk_size, self.chunk_size))
+        for (local_x, local_y), tile_type in self.edits.get((chunk_x, chunk_y), {}).items():
+            chunk.set_tile(local_x, local_y, tile_type)
+        return chunk
+
+    def get_chunk(self, x, y):
+        # the chunk containing tile (x, y) and the tile's position inside it
+        chunk_x, local_x = divmod(x, self.chunk_size)
+        chunk_y, local_y = divmod(y, self.chunk_size)
+        return self.chunks.get(chunk_x, chunk_y), local_x, local_y
+
+    def get_tile(self, x, y):
+        chunk, local_x, local_y = self.get_chunk(x, y)
+        return chunk.get_tile(local_x, local_y)
+
+    def set_tile(self, x, y, tile_type):
+        chunk, local_x, local_y = self.get_chunk(x, y)
+        chunk_edits = self.edits.setdefault((x // self.chunk_size, y // self.chunk_size), {})
+        chunk_edits[(local_x, local_y)] = tile_type
+        chunk.set_tile(local_x, local_y, tile_type)
+        self.tile_changed(x, y)
+
+    def get_attributes(self, xs, ys, outside=0):
+        xs = numpy.asarray(xs)
+        ys = numpy.asarray(ys)
+        attributes = numpy.empty(xs.shape, dtype=numpy.uint8)
+        if not xs.size:
+            return attributes
+
+        chunk_xs, local_xs = numpy.divmod(xs.ravel(), self.chunk_size)
+        chunk_ys, local_ys = numpy.divmod(ys.ravel(), self.chunk_size)
+        flat_attributes = attributes.ravel()
+
+        # group the cells by chunk so each touched chunk is looked up once
+        keys = (chunk_xs.astype(numpy.int64) << 32) + (chunk_ys.astype(numpy.int64) & 0xFFFFFFFF)
+        order = numpy.argsort(keys, kind='mergesort')
+        starts = numpy.flatnonzero(numpy.diff(keys[order])) + 1
+        for group in numpy.split(order, starts):
+            first = group[0]
+            chunk = self.chunks.get(int(chunk_xs[first]), int(chunk_ys[first]))
+            flat_attributes[group] = chunk.attributes[local_ys[group], local_xs[group]]
+        return attributes
+
+    def get_tile_ids(self, x, y, width, height):
+        return self.assemble('tile_ids', x, y, width, height)
+
+    def get_attribute_grid(self, x, y, width, height, outside=0):
+        # there is no outside, every cell exists
+        return self.assemble('attributes', x, y, width, height)
+
+    def assemble(self, layer, x, y, width, height):
+        # copy a rectangle of one of the chunks' arrays (tile_ids or attributes) out of every chunk it covers
+        cells = numpy.empty((height, width), dtype=numpy.uint8)
+        size = self.chunk_size
+        for chunk_y in range(y // size, (y + height - 1) // size + 1):
+            for chunk_x in range(x // size, (x + width - 1) // size + 1):
+                chunk = self.chunks.get(chunk_x, chunk_y)
+                # overlap of the chunk and the requested rectangle, in world coordinates
+                min_x = max(x, chunk_x * size)
+                min_y = max(y, chunk_y * size)
+                max_x = min(x + width, (chunk_x + 1) * size)
+                max_y = min(y + height, (chunk_y + 1) * size)
+                cells[min_y - y:max_y - y, min_x - x:max_x - x] = getattr(chunk, layer)[
+                    min_y - chunk_y * size:max_y - chunk_y * size,
+                    min_x - chunk_x * size:max_x - chunk_x * size
+                ]
+        return cells
+
+    def in_bounds(self, x, y):
+        return True
+
+    def clip(self, min_x, min_y, max_x, max_y):
+        return (min_x, min_y, max_x, max_y)
+
+    def can_move_to(self, x, y):
+        chunk, local_x, local_y = self.get_chunk(x, y)
+        return not chunk.has_attribute(local_x, local_y, TileAttribute.COLLIDE)
@@ -0,0 +1,123 @@
+import logging
+import mmap
+import os
+import struct
+import zlib
+
+import numpy
+
+from grid import ATTRIBUTES_BY_ID
+from grid import TileGrid
+
+'''
+LevelCache keeps generated levels on disk so they can be loaded instead of generated.
+
+A level is stored in one file per (generator version, seed, width, height):
+
+    header      magic, format version, generator version, seed, width, height,
+                checksum of the tile attribute table, checksum of the data
+    tile ids    width * height u8, row by row
+    attributes  width * height u8, row by row
+
+Files are memory mapped copy on write, so loading one reads only the header and the
+pages of the level that are actually used, and set_tile never writes back to disk.
+A file is only used if its header matches the key and the current tile attributes,
+and it is the right size; anything else is regenerated and replaced. The data
+checksum is only checked when asked to, as it reads the whole file.
+
+'''
+
+log = logging.getLogger("level_cache")
+
+MAGIC = b'UNTL'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHIqIIII')
+
+# changes whenever a tile type's attributes do, which would make stored attributes wrong
+ATTRIBUTES_CHECKSUM = zlib.crc32(ATTRIBUTES_BY_ID.tobytes())
+
+
+class LevelCacheError(Exception):
+    pass
+
+
+class LevelCache():
+    def __init__(self, directory='cache/levels', verify=False):
+        self.directory = directory
+        self.verify = verify
+        self.hits = 0
+        self.misses = 0
+        self.invalid = 0
+
+    def path(self, key):
+        generator_version, seed, width, height = key
+        return os.path.join(self.directory, 'level-v{0}-{1}-{2}x{3}.bin'.format(generator_version, seed, width, height))
+
+    def load(self, key):
+        # the cached TileGrid for key, raises LevelCacheError if the file can't be used
+        generator_version, seed, width, height = key
+        path = self.path(key)
+        with open(path, 'rb') as level_file:
+            header = level_file.read(HEADER.size)
+            if len(header) != HEADER.size:
+                raise LevelCacheError('{0}: truncated header'.format(path))
+            magic, format_version, file_generator_version, file_seed, file_width, file_height, attributes_checksum, data_checksum = HEADER.unpack(header)
+            if magic != MAGIC or format_version != FORMAT_VERSION:
+                raise LevelCacheError('{0}: not a level cache file of format {1}'.format(path, FORMAT_VERSION))
+            if (file_generator_version, file_seed, file_width, file_height) != tuple(key):
+                raise LevelCacheError('{0}: stored for a different level'.format(path))
+            if attributes_checksum != ATTRIBUTES_CHECKSUM:
+                raise LevelCacheError('{0}: tile attributes have changed since it was stored'.format(path))
+
+            cells = width * height
+            if os.fstat(level_file.fileno()).st_size != HEADER.size + cells * 2:
+                raise LevelCacheError('{0}: wrong size for a {1}x{2} level'.format(path, width, height))
+            if not cells:
+                return TileGrid.empty(width, height)
+
+            # the mapping stays open for as long as the arrays use it
+            data = mmap.mmap(level_file.fileno(), 0, access=mmap.ACCESS_COPY)
+
+        if self.verify and zlib.crc32(memoryview(data)[HEADER.size:]) != data_checksum:
+            raise LevelCacheError('{0}: data checksum does not match'.format(path))
+
+        tile_ids = numpy.frombuffer(data, dtype=numpy.uint8, count=cells, offset=HEADER.size).reshape(height, width)
+        attributes = numpy.frombuffer(data, dtype=numpy.uint8, count=cells, offset=HEADER.size + cells).reshape(height, width)
+        return TileGrid(tile_ids, attributes)
+
+    def save(self, key, grid):
+        generator_version, seed, width, height = key
+        tile_ids = numpy.ascontiguousarray(grid.tile_ids).tobytes()
+        attributes = numpy.ascontiguousarray(grid.attributes).tobytes()
+        data_checksum = zlib.crc32(attributes, zlib.crc32(tile_ids))
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, generator_version, seed, width, height, ATTRIBUTES_CHECKSUM, data_checksum)
+
+        # write to a temporary file and rename it over, so a reader never sees half a level
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        temporary_path = '{0}.{1}.tmp'.format(path, os.getpid())
+        with open(temporary_path, 'wb') as level_file:
+            level_file.write(header)
+            level_file.write(tile_ids)
+            level_file.write(attributes)
+        os.replace(temporary_path, path)
+
+    def get(self, key, generate):
+        # the cached grid for key, or generate() one and store it for next time
+        try:
+            grid = self.load(key)
+            self.hits += 1
+            return grid
+        except FileNotFoundError:
+            pass
+        except LevelCacheError:
+            self.invalid += 1
+
+        self.misses += 1
+        grid = generate()
+        try:
+            self.save(key, grid)
+        except OSError as e:
+            # not being able to cache the level is no reason not to play it
+            log.warning("could not cache level: %s", e)
+        return grid
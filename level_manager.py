@@ -0,0 +1,174 @@
+import logging
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from grid import TileGrid
+from level import ChunkedProceduralLevel
+from level import ProceduralLevel
+from level_cache import LevelCache
+
+'''
+LevelManager generates the levels the player hasn't reached yet in a pool of worker
+processes, so their noise is worked out alongside the game instead of in a hitch on
+the main thread when the player gets there.
+
+Workers send back nothing but the tile id and attribute arrays, a byte each per cell,
+and the level is put back together around them. Fixed size levels come back whole,
+chunked levels as the chunks around where the player will arrive, the rest of a
+chunked level is generated as it's explored like any other. Nothing ever waits for a
+worker: poll picks up whatever has finished, and get returns None for a level which
+isn't ready yet.
+
+'''
+
+log = logging.getLogger("level_manager")
+
+
+def generate_level(seed, width, height, cache_directory):
+    # runs in a worker, the tile ids and attributes of a whole fixed size level
+    cache = LevelCache(cache_directory) if cache_directory is not None else None
+    grid = ProceduralLevel(seed, width, height, cache=cache).grid
+    return grid.tile_ids, grid.attributes
+
+
+def generate_chunks(seed, chunk_size, chunks):
+    # runs in a worker, (chunk x, chunk y, tile ids, attributes) of each chunk
+    level = ChunkedProceduralLevel(seed, chunk_size, max_chunks=len(chunks))
+    generated = []
+    for chunk_x, chunk_y in chunks:
+        chunk = level.generate_chunk(chunk_x, chunk_y)
+        generated.append((chunk_x, chunk_y, chunk.tile_ids, chunk.attributes))
+    return generated
+
+
+def use_spawn():
+    # workers are spawned rather than forked, a copy of the game's SDL and network threads
+    # is no use to a worker. ProcessPoolExecutor only takes a context from Python 3.7, so
+    # it's set for the whole process.
+    if multiprocessing.get_start_method(allow_none=True) != 'spawn':
+        multiprocessing.set_start_method('spawn', force=True)
+
+
+class LevelManager():
+    def __init__(self, workers=2, cache_directory=None, chunk_size=32, chunk_radius=2, history=100):
+        # cache_directory is a LevelCache directory workers load fixed size levels from and
+        # store them in, chunk_radius how many chunks around the arrival point are made up front
+        self.workers = workers
+        self.cache_directory = cache_directory
+        self.chunk_size = chunk_size
+        self.chunk_radius = chunk_radius
+        self.pool = None
+        self.levels = {}
+        # name: (Future, time requested, function making the level from the Future's result)
+        self.pending = {}
+        # seconds from requesting each level to poll picking it up, most recent last
+        self.latencies = deque(maxlen=history)
+        self.generated = 0
+        self.failed = 0
+
+    def start(self):
+        if self.pool is None:
+            use_spawn()
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            # workers are otherwise started one per request, each stalling the request for a few ms
+            for _ in range(self.workers):
+                self.pool.submit(int)
+
+    def request(self, name, seed, size=None, centre=(0, 0)):
+        # start generating a level, size is (width, height) or None for a chunked level
+        # made around the tile centre, does nothing if the level is ready or on its way
+        if name in self.levels or name in self.pending:
+            return
+        self.start()
+        if size is None:
+            centre_x = centre[0] // self.chunk_size
+            centre_y = centre[1] // self.chunk_size
+            radius = self.chunk_radius
+            chunks = [
+                (chunk_x, chunk_y)
+                for chunk_y in range(centre_y - radius, centre_y + radius + 1)
+                for chunk_x in range(centre_x - radius, centre_x + radius + 1)
+            ]
+            future = self.pool.submit(generate_chunks, seed, self.chunk_size, chunks)
+            build = lambda chunks: self.build_chunked(seed, chunks)
+        else:
+            width, height = size
+            future = self.pool.submit(generate_level, seed, width, height, self.cache_directory)
+            build = lambda arrays: ProceduralLevel(seed, width, height, grid=TileGrid(*arrays))
+        self.pending[name] = (future, time.perf_counter(), build)
+
+    def build_chunked(self, seed, chunks):
+        level = ChunkedProceduralLevel(seed, self.chunk_size)
+        for chunk_x, chunk_y, tile_ids, attributes in chunks:
+            level.chunks.put(chunk_x, chunk_y, TileGrid(tile_ids, attributes))
+        return level
+
+    def poll(self, limit=1):
+        # take in up to limit levels which have finished since the last poll, without waiting
+        # for any which haven't, and return their names. Putting a level together takes a
+        # couple of ms, so by default one a frame is taken in.
+        ready = []
+        for name, (future, requested, build) in list(self.pending.items()):
+            if len(ready) >= limit:
+                break
+            if not future.done():
+                continue
+            del self.pending[name]
+            try:
+                self.levels[name] = build(future.result())
+            except BrokenProcessPool:
+                # a worker died, everything still pending is lost with it
+                log.exception("level worker died while generating %s", name)
+                self.failed += 1 + len(self.pending)
+                self.pending.clear()
+                self.pool = None
+                break
+            except Exception:
+                log.exception("generating level %s failed", name)
+                self.failed += 1
+                continue
+            self.latencies.append(time.perf_counter() - requested)
+            self.generated += 1
+            ready.append(name)
+        return ready
+
+    def get(self, name):
+        # the level if it's ready, otherwise None
+        return self.levels.get(name)
+
+    def is_pending(self, name):
+        return name in self.pending
+
+    def discard(self, name):
+        # forget a level, or stop it being generated if it hasn't been started yet
+        self.levels.pop(name, None)
+        pending = self.pending.pop(name, None)
+        if pending is not None:
+            pending[0].cancel()
+
+    def stats(self):
+        generating = sum(1 for future, requested, build in self.pending.values() if future.running())
+        latencies = list(self.latencies)
+        return {
+            'workers': self.workers if self.pool is not None else 0,
+            'queued': len(self.pending) - generating,
+            'generating': generating,
+            'ready': len(self.levels),
+            'generated': self.generated,
+            'failed': self.failed,
+            'latency_last': latencies[-1] if latencies else None,
+            'latency_mean': sum(latencies) / len(latencies) if latencies else None,
+            'latency_max': max(latencies) if latencies else None,
+        }
+
+    def shutdown(self):
+        # waits for any level already being generated, the rest are dropped
+        for future, requested, build in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
@@ -0,0 +1,102 @@
+import random
+import time
+import uuid
+from collections import deque
+
+import protocol
+from network import NetworkEvent
+from network import GROUPS
+
+'''
+LocalNetwork is an in-process stand-in for Network, for running the game without
+real Pyre peers, e.g. headless benchmarks.
+
+It makes up a number of synthetic peers which wander around near the origin and cast
+spells. Each get_events call is one step of their simulation, and their updates go
+through the real wire format so decoding costs the same as it would on the network.
+Anything shouted is counted and thrown away.
+
+'''
+
+MOVES = ((0, -1), (1, 0), (0, 1), (-1, 0))
+SPELL_VELOCITIES = ((0, -0.25), (0.25, 0), (0, 0.25), (-0.25, 0))
+
+
+class SyntheticPeer():
+    def __init__(self, rng, spread):
+        self.uuid = uuid.UUID(int=rng.getrandbits(128))
+        self.x = rng.randint(-spread, spread)
+        self.y = rng.randint(-spread, spread)
+        self.encoder = protocol.Encoder()
+
+
+class LocalNetwork():
+    def __init__(self, peers=10, move_chance=0.2, cast_chance=0.02, spread=8, seed=0):
+        self.rng = random.Random(seed)
+        self.synthetic_peers = [ SyntheticPeer(self.rng, spread) for _ in range(peers) ]
+        self.move_chance = move_chance
+        self.cast_chance = cast_chance
+        self.groups = set()
+
+        self.received = 0
+        self.sent = 0
+        self.decode_errors = 0
+        self.tick_times = deque(maxlen=120)
+
+        self.pending = deque(
+            NetworkEvent("ENTER", peer.uuid, "SYNTHETIC", None, None, time.monotonic())
+            for peer in self.synthetic_peers
+        )
+
+    def peers(self):
+        return [ peer.uuid for peer in self.synthetic_peers ]
+
+    def shout(self, group, data):
+        self.sent += 1
+
+    def join(self, group):
+        self.groups.add(group)
+
+    def leave(self, group):
+        self.groups.discard(group)
+
+    def stop(self):
+        pass
+
+    def event(self, peer, group, kind, values):
+        # round trip through the wire format, as a real peer's message would
+        message = protocol.decode(peer.encoder.encode(kind, values))
+        return NetworkEvent("SHOUT", peer.uuid, "SYNTHETIC", group, message, time.monotonic())
+
+    def step(self):
+        rng = self.rng
+        for peer in self.synthetic_peers:
+            if rng.random() < self.move_chance:
+                dx, dy = rng.choice(MOVES)
+                peer.x += dx
+                peer.y += dy
+                self.pending.append(self.event(peer, GROUPS[0], protocol.POSITION, (peer.x, peer.y)))
+            if rng.random() < self.cast_chance:
+                vx, vy = rng.choice(SPELL_VELOCITIES)
+                self.pending.append(self.event(peer, GROUPS[1], protocol.SPELL, (peer.x + 0.375, peer.y + 0.375, vx, vy)))
+
+    def get_events(self):
+        start = time.perf_counter()
+        self.step()
+        events = list(self.pending)
+        self.pending.clear()
+        self.received += len(events)
+        self.tick_times.append(time.perf_counter() - start)
+        return events
+
+    def stats(self):
+        tick_times = list(self.tick_times) or [0]
+        return {
+            'inbox_depth': len(self.pending),
+            'outbox_depth': 0,
+            'received': self.received,
+            'sent': self.sent,
+            'decode_errors': self.decode_errors,
+            'tick_ms_average': sum(tick_times) / len(tick_times) * 1000,
+            'tick_ms_max': max(tick_times) * 1000,
+        }
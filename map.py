@@ -7,30 +7,53 @@ import os.path
 
 from enum import Enum
 
-from player import *
+from projectile import ProjectileSystem
+from render_cache import RenderCache
 
 class Map():
-    def __init__(self, screen, level, tileset, music):
+    def __init__(self, screen, level, tileset, music, cache_render=True):
         self.screen = screen
         self.level = level
         self.tileset = tileset
         self.music = music
+        # bake the level into region surfaces rather than blitting every tile every frame
+        self.render_cache = RenderCache(level, tileset) if cache_render else None
+        # every live spell in the level, whoever cast it
+        self.projectiles = ProjectileSystem(level)
 
     def set_centre_player(self, player):
         player.is_centre = True
         self.centre_player = player
 
-    def render(self):
+    def render(self, area=None):
+        # draw the tiles under an area of the screen, the whole screen by default
+        if area is None:
+            area = self.screen.get_rect()
+        else:
+            self.screen.set_clip(area)
+
         # get the tile at the top left and bottom right
-        top_left_pos = self.get_map_pos(0, 0)
-        bot_right_pos = self.get_map_pos(self.screen.get_width(), self.screen.get_height())
-        for x in range(max(0, top_left_pos[0]), min(bot_right_pos[0] + 2, self.level.width)):
-            for y in range(max(0, top_left_pos[1]), min(bot_right_pos[1] + 2, self.level.height)):
-                # TODO more readable ranges please
-                # for every tile in between
+        top_left_pos = self.get_map_pos(area.left, area.top)
+        bot_right_pos = self.get_map_pos(area.right, area.bottom)
+        min_x, min_y, max_x, max_y = self.level.clip(
+            top_left_pos[0], top_left_pos[1], bot_right_pos[0] + 2, bot_right_pos[1] + 2
+        )
+        if self.render_cache is not None:
+            self.render_cache.render(self.screen, self, min_x, min_y, max_x, max_y)
+        else:
+            self.render_tiles(min_x, min_y, max_x, max_y)
+
+        self.screen.set_clip(None)
+
+    def render_tiles(self, min_x, min_y, max_x, max_y):
+        # every tile in the range, drawn with a single blits call
+        blits = []
+        for x in range(min_x, max_x):
+            for y in range(min_y, max_y):
                 pixel_pos = self.get_pixel_pos(x, y)
                 tile_image = self.tileset.get_surface_by_id(self.level.get_tile(x, y).tileset_id)
-                self.screen.blit(tile_image, (pixel_pos[0], pixel_pos[1]))
+                blits.append((tile_image, (pixel_pos[0], pixel_pos[1])))
+        self.screen.blits(blits, False)
 
     def get_pixel_pos(self, x, y):
         # converts coordinates from those on the map to a position on the screen
@@ -1,9 +1,7 @@
+import os
 import pygame
 import pygame.locals
 
-from pyknon.genmidi import Midi
-from pyknon.music import NoteSeq
-
 class LevelMusic():
     def __init__(self, location):
         self.location = location
@@ -30,6 +28,10 @@ class LevelMusic():
     # Append given notes to a music file.
     @staticmethod
     def create_music(note_seq, given_tempo, given_track, song_name):
+        # pyknon is only needed here, so it isn't imported until music is created
+        from pyknon.genmidi import Midi
+        from pyknon.music import NoteSeq
+
         notes = NoteSeq(note_seq)
         midi = Midi(1, tempo=given_tempo)
         midi.seq_notes(notes, track=given_track)
@@ -1,29 +1,438 @@
-import zmq
-from pyre import Pyre
+import logging
+import threading
+import time
+from collections import deque
+from collections import namedtuple
+
+import protocol
+
+# zmq and pyre are imported when a node is first created rather than here, so code which
+# only needs GROUPS or NetworkEvent, like LocalNetwork, doesn't pay for them
+
+GROUPS = ("world:position", "world:combat")
+
+# A Pyre event with its message already decoded, message is None for anything but SHOUTs.
+# time is when it was received, from time.monotonic.
+NetworkEvent = namedtuple('NetworkEvent', ['type', 'peer_uuid', 'peer_name', 'group', 'message', 'time'])
+
+log = logging.getLogger("network")
+
+
+class NetworkError(Exception):
+    pass
+
+
+def create_node(name="GAME_NODE", groups=GROUPS):
+    from pyre import Pyre
+
+    node = Pyre(name)
+    node.set_header("HELLO", "ABC")
+    node.start()
+    for group in groups:
+        node.join(group)
+    return node
+
+
+def to_network_event(event):
+    # returns None for messages which can't be decoded
+    message = None
+    if event.type == "SHOUT":
+        try:
+            message = protocol.decode(event.msg[0])
+        except protocol.ProtocolError:
+            return None
+    return NetworkEvent(event.type, event.peer_uuid, event.peer_name, event.group, message, time.monotonic())
 
 
 class Network():
-    def __init__(self):
-        self.node = Pyre("GAME_NODE")
-        self.node.set_header("HELLO", "ABC")
-        self.node.start()
-        self.node.join("world:position")
-        self.node.join("world:combat")
+    def __init__(self, groups=GROUPS):
+        import zmq
+        # kept, so the methods called every frame or every shout needn't import it again
+        self.zmq = zmq
+
+        self.node = create_node(groups=groups)
 
         self.poller = zmq.Poller()
         self.poller.register(self.node.socket(), zmq.POLLIN)
 
+        self.received = 0
+        self.sent = 0
+        self.decode_errors = 0
+        self.tick_times = deque(maxlen=120)
+
     def poll(self):
         return dict(self.poller.poll(0))
 
     def peers(self):
         return self.node.peers()
 
+    def shout(self, group, data):
+        self.node.shout(group, data)
+        self.sent += 1
+
+    def join(self, group):
+        self.node.join(group)
+
+    def leave(self, group):
+        self.node.leave(group)
+
     def stop(self):
         self.node.stop()
 
     def get_events(self):
+        zmq = self.zmq
+
+        start = time.perf_counter()
+        events = []
         changes = self.poll()
         if self.node.socket() in changes and changes[self.node.socket()] == zmq.POLLIN:
-            events = self.node.recent_events()
-            return events
+            for event in self.node.recent_events():
+                self.received += 1
+                network_event = to_network_event(event)
+                if network_event is None:
+                    self.decode_errors += 1
+                else:
+                    events.append(network_event)
+        self.tick_times.append(time.perf_counter() - start)
+        return events
+
+    def stats(self):
+        tick_times = list(self.tick_times) or [0]
+        return {
+            'inbox_depth': 0,
+            'outbox_depth': 0,
+            'received': self.received,
+            'sent': self.sent,
+            'decode_errors': self.decode_errors,
+            'tick_ms_average': sum(tick_times) / len(tick_times) * 1000,
+            'tick_ms_max': max(tick_times) * 1000,
+        }
+
+
+class ThreadedNetwork(Network):
+    '''
+    A Network whose Pyre node lives on a background thread.
+
+    The worker thread owns the node: it receives and decodes incoming events into
+    the inbox, and sends whatever the render loop queued in the outbox. Both are
+    deques, which can be appended to and popped from different threads without a
+    lock. get_events only drains the inbox, so network hiccups never stall a frame.
+
+    If the node can't be started the worker records why and get_events raises it as a
+    NetworkError, rather than the game carrying on as if it were connected.
+    '''
+    def __init__(self, groups=GROUPS, poll_timeout=100, max_inbox=4096, max_outbox=1024):
+        import zmq
+        self.zmq = zmq
+
+        self.groups = groups
+        self.poll_timeout = poll_timeout
+        # if the render loop stalls the oldest events are dropped once max_inbox are waiting
+        self.inbox = deque(maxlen=max_inbox)
+        # likewise the oldest shouts once max_outbox are waiting to be sent, joins and
+        # leaves are few and are never dropped
+        self.outbox = deque(maxlen=max_outbox)
+        self.group_changes = deque()
+        # replaced, never mutated, so the render thread can read it at any time
+        self.known_peers = frozenset()
+
+        self.received = 0
+        self.sent = 0
+        self.decode_errors = 0
+        self.inbox_dropped = 0
+        self.outbox_dropped = 0
+        self.tick_times = deque(maxlen=120)
+        # why the node couldn't be started, if it couldn't
+        self.error = None
+
+        # a pair of sockets used to wake the worker when something is queued to send
+        context = zmq.Context.instance()
+        address = "inproc://network-wake-{0}".format(id(self))
+        self.wake_receiver = context.socket(zmq.PAIR)
+        self.wake_receiver.bind(address)
+        self.wake_sender = context.socket(zmq.PAIR)
+        self.wake_sender.connect(address)
+
+        self.running = True
+        # not waiting for the node to start lets the game get on with loading meanwhile,
+        # everything sent before then waits in the outbox
+        self.thread = threading.Thread(target=self.run, name="network", daemon=True)
+        self.thread.start()
+
+    def wake(self):
+        zmq = self.zmq
+
+        try:
+            self.wake_sender.send(b"", zmq.NOBLOCK)
+        except zmq.Again:
+            # the worker already has wake ups waiting
+            pass
+
+    def peers(self):
+        return list(self.known_peers)
+
+    def shout(self, group, data):
+        if self.error is not None:
+            return
+        if len(self.outbox) == self.outbox.maxlen:
+            self.outbox_dropped += 1
+        self.outbox.append((group, data))
+        self.wake()
+
+    def join(self, group):
+        self.group_changes.append(("JOIN", group))
+        self.wake()
+
+    def leave(self, group):
+        self.group_changes.append(("LEAVE", group))
+        self.wake()
+
+    def stop(self):
+        self.running = False
+        self.wake()
+        self.thread.join()
+        self.wake_sender.close()
+        self.wake_receiver.close()
+
+    def get_events(self):
+        if self.error is not None:
+            raise NetworkError('The network node could not be started: {0}'.format(self.error)) from self.error
+        # take only what has arrived so far, the worker may keep appending
+        return [ self.inbox.popleft() for _ in range(len(self.inbox)) ]
+
+    def run(self):
+        zmq = self.zmq
+
+        try:
+            self.node = create_node(groups=self.groups)
+        except Exception as e:
+            log.exception("the network node could not be started")
+            self.error = e
+            self.outbox.clear()
+            return
+        poller = zmq.Poller()
+        poller.register(self.node.socket(), zmq.POLLIN)
+        poller.register(self.wake_receiver, zmq.POLLIN)
+
+        try:
+            while self.running:
+                changes = dict(poller.poll(self.poll_timeout))
+                start = time.perf_counter()
+
+                if self.wake_receiver in changes:
+                    while self.wake_receiver.poll(0):
+                        self.wake_receiver.recv()
+
+                if self.node.socket() in changes:
+                    self.receive()
+                self.send()
+
+                self.tick_times.append(time.perf_counter() - start)
+        finally:
+            self.node.stop()
+
+    def receive(self):
+        for event in self.node.recent_events():
+            self.received += 1
+            if event.type == "ENTER":
+                self.known_peers = self.known_peers | { event.peer_uuid }
+            elif event.type == "EXIT":
+                self.known_peers = self.known_peers - { event.peer_uuid }
+
+            network_event = to_network_event(event)
+            if network_event is None:
+                self.decode_errors += 1
+            else:
+                if len(self.inbox) == self.inbox.maxlen:
+                    self.inbox_dropped += 1
+                self.inbox.append(network_event)
+
+    def send(self):
+        # group changes first, so shouts queued after a join go out after it
+        while self.group_changes:
+            command, group = self.group_changes.popleft()
+            if command == "JOIN":
+                self.node.join(group)
+            else:
+                self.node.leave(group)
+        while self.outbox:
+            group, data = self.outbox.popleft()
+            self.node.shout(group, data)
+            self.sent += 1
+
+    def stats(self):
+        stats = super().stats()
+        stats['inbox_depth'] = len(self.inbox)
+        stats['outbox_depth'] = len(self.outbox)
+        stats['inbox_dropped'] = self.inbox_dropped
+        stats['outbox_dropped'] = self.outbox_dropped
+        stats['error'] = None if self.error is None else str(self.error)
+        return stats
+
+
+class ServerNetwork():
+    '''
+    Connects to a GameServer, see server.py, instead of joining the Pyre mesh.
+
+    To the client it looks like any other Network. Moves and casts are shouted as
+    usual and go to the server, and each snapshot the server publishes comes back as
+    ENTER and EXIT events for players arriving and leaving, and a position event for
+    every other player. Peers are the server's player ids. Spells belong to the
+    server: take_spells returns those of the newest snapshot, once, and
+    take_correction the player's own position if the server turned down a move.
+    '''
+    def __init__(self, address):
+        import zmq
+        self.zmq = zmq
+
+        self.address = address
+        self.context = zmq.Context.instance()
+        self.dealer = self.context.socket(zmq.DEALER)
+        self.dealer.setsockopt(zmq.LINGER, 500)
+        self.dealer.connect(address)
+        # connected once the server's WELCOME says where snapshots are published
+        self.subscriber = None
+        self.player_id = None
+        self.welcome = None
+
+        self.known_players = frozenset()
+        self.last_snapshot = None
+        self.spells = None
+        self.correction = None
+
+        self.received = 0
+        self.sent = 0
+        self.decode_errors = 0
+        self.snapshots = 0
+        self.tick_times = deque(maxlen=120)
+        self.send(protocol.encode(protocol.HELLO, 0, ()))
+
+    def send(self, data):
+        zmq = self.zmq
+
+        try:
+            self.dealer.send(data, zmq.NOBLOCK)
+            self.sent += 1
+        except zmq.Again:
+            pass
+
+    def peers(self):
+        return list(self.known_players)
+
+    def shout(self, group, data):
+        # the server works out who needs to hear it
+        self.send(data)
+
+    def join(self, group):
+        pass
+
+    def leave(self, group):
+        pass
+
+    def stop(self):
+        if self.dealer.closed:
+            return
+        self.send(protocol.encode(protocol.BYE, 0, ()))
+        self.dealer.close()
+        if self.subscriber is not None:
+            self.subscriber.close(0)
+
+    def subscribe(self, port):
+        zmq = self.zmq
+
+        self.subscriber = self.context.socket(zmq.SUB)
+        # only the newest snapshot is kept waiting, older ones are no use
+        self.subscriber.setsockopt(zmq.CONFLATE, 1)
+        self.subscriber.setsockopt(zmq.SUBSCRIBE, b"")
+        self.subscriber.connect("{0}:{1}".format(self.address.rsplit(":", 1)[0], port))
+
+    def take_welcome(self):
+        # (player id, publisher port, seed, width, height) the first time after it arrives
+        welcome, self.welcome = self.welcome, None
+        return welcome
+
+    def take_spells(self):
+        # the spells of a snapshot which hasn't been taken yet, or None
+        spells, self.spells = self.spells, None
+        return spells
+
+    def take_correction(self):
+        correction, self.correction = self.correction, None
+        return correction
+
+    def get_events(self):
+        zmq = self.zmq
+
+        start = time.perf_counter()
+        while True:
+            try:
+                data = self.dealer.recv(zmq.NOBLOCK)
+            except zmq.Again:
+                break
+            self.received += 1
+            try:
+                message = protocol.decode(data)
+            except protocol.ProtocolError:
+                self.decode_errors += 1
+                continue
+            if message.kind == protocol.WELCOME:
+                self.welcome = message.values
+                self.player_id = message.values[0]
+                if self.subscriber is None:
+                    self.subscribe(message.values[1])
+            elif message.kind == protocol.POSITION:
+                self.correction = message.values
+
+        snapshot = None
+        while self.subscriber is not None:
+            try:
+                data = self.subscriber.recv(zmq.NOBLOCK)
+            except zmq.Again:
+                break
+            self.received += 1
+            try:
+                snapshot = protocol.decode_snapshot(data)
+            except protocol.ProtocolError:
+                self.decode_errors += 1
+
+        events = []
+        if snapshot is not None:
+            events = self.snapshot_events(snapshot)
+        self.tick_times.append(time.perf_counter() - start)
+        return events
+
+    def snapshot_events(self, snapshot):
+        now = time.monotonic()
+        self.snapshots += 1
+        self.last_snapshot = snapshot
+        self.spells = snapshot.spells
+
+        players = snapshot.players[snapshot.players['id'] != self.player_id]
+        ids = players['id'].tolist()
+        present = frozenset(ids)
+        events = [
+            NetworkEvent("EXIT", player_id, "SERVER", None, None, now)
+            for player_id in self.known_players - present
+        ]
+        events.extend(
+            NetworkEvent("ENTER", player_id, "SERVER", None, None, now)
+            for player_id in present - self.known_players
+        )
+        self.known_players = present
+        for player_id, x, y in zip(ids, players['x'].tolist(), players['y'].tolist()):
+            message = protocol.Message(protocol.POSITION, snapshot.sequence, snapshot.timestamp, (x, y))
+            events.append(NetworkEvent("SHOUT", player_id, "SERVER", GROUPS[0], message, now))
+        return events
+
+    def stats(self):
+        tick_times = list(self.tick_times) or [0]
+        return {
+            'inbox_depth': 0,
+            'outbox_depth': 0,
+            'received': self.received,
+            'sent': self.sent,
+            'decode_errors': self.decode_errors,
+            'snapshots': self.snapshots,
+            'tick_ms_average': sum(tick_times) / len(tick_times) * 1000,
+            'tick_ms_max': max(tick_times) * 1000,
+        }
@@ -3,12 +3,13 @@ from enum import Enum
 import math
 import random
 import pygame
-import configparser
-from pygame.rect import Rect
 
-import client
-from tile import Tileset
+import assets
+import batch as batch_module
+import save_store
+import settings
 import map as map_module
+from interpolation import SnapshotBuffer
 
 
 class Movement(Enum):
@@ -27,7 +28,7 @@ class PlayerException(Exception):
     pass
 
 class Player():
-    def __init__(self, screen, map, colour=(255, 255, 255)):
+    def __init__(self, screen, map, colour=(255, 255, 255), interpolate=False, load_tileset=True):
         self.screen = screen
         self.map = map
         self.ready = False
@@ -35,46 +36,49 @@ class Player():
         self.size = (map_module.TILE_PIX_WIDTH, map_module.TILE_PIX_HEIGHT)
         self.step = 1
         self.colour = colour
-        self.cast_spells = []
         self.spell_limit = 50
         self.mute = 'True'
-        self.tileset = Tileset(client.player_animation_tileset_path, (3, 4), (32, 32))
+        # without load_tileset the sprites are given later with set_tileset, so the menu
+        # needn't wait for them, see GameClient.finish_loading
+        self.tileset = None
+        if load_tileset:
+            self.tileset = assets.get_tileset(settings.player_animation_tileset_path, (3, 4), (32, 32), rle=True)
         self.name = ''
+        self.profile = settings.save_profile
         self.x, self.y = (0, 0)
         self.initial_position = (0, 0)
         self.animation_ticker = 0
-        self.set_position(self.initial_position)
+        # remote players are drawn from their recent network updates, see interpolation.py
+        self.snapshots = SnapshotBuffer(max_extrapolation=settings.max_extrapolation) if interpolate else None
+        # when the network last sent a remote player's position, from time.monotonic
+        self.last_update = None
+        # remote players aren't placed, drawn or hit until the network says where they are
+        if not interpolate:
+            self.set_position(self.initial_position)
+        assets.counters['player_constructions'] += 1
 
     def __raiseNoPosition(self):
         raise PlayerException({"message": "Player does not have a position set", "player": self})
 
 
     def save_to_config(self):
-        config = configparser.ConfigParser()
-
-        config['Player'] = {}
-        config['Player']['name'] = self.name
-        config['Player']['x'] = str(self.x)
-        config['Player']['y'] = str(self.y)
-        config['Player']['mute'] = str(self.mute)
-
-        with open('player_save', 'w') as configfile:
-            config.write(configfile)
-
-        return
+        # only updates the store's copy, it's written to disk in the background
+        save_store.get_store(settings.save_path).update({
+            'name': self.name,
+            'x': self.x,
+            'y': self.y,
+            'mute': self.mute,
+        }, self.profile)
 
     def load_from_config(self):
-        config = configparser.ConfigParser()
-        config.read('player_save')
-
-        if 'Player' in config:
-            player_save_info = config['Player']
+        player_save_info = save_store.get_store(settings.save_path).load(self.profile)
 
-            self.set_name(player_save_info['name'])
+        if player_save_info is not None:
+            self.set_name(player_save_info.get('name', ''))
             self.set_position(
                 (
-                    int(player_save_info['x']),
-                    int(player_save_info['y'])
+                    int(player_save_info.get('x', 0)),
+                    int(player_save_info.get('y', 0))
                 )
             )
             self.set_mute(player_save_info.get('mute', 'True'))
@@ -90,44 +94,70 @@ class Player():
         self.tileset = tileset
 
     def set_position(self, position):
-        # Derive direction (for networked players)
-        if self.x < position[0]:
-            self.animation_ticker = self.tileset.find_id(self.x % 3, 2)
-        elif self.x > position[0]:
-            self.animation_ticker = self.tileset.find_id(self.x % 3, 1)
-
-        if self.y < position[1]:
-            self.animation_ticker = self.tileset.find_id(self.y % 3, 0)
-        elif self.y > position[1]:
-            self.animation_ticker = self.tileset.find_id(self.y % 3, 3)
+        # Derive direction (for networked players), once there are sprites to animate
+        if self.tileset is not None:
+            if self.x < position[0]:
+                self.animation_ticker = self.tileset.find_id(self.x % 3, 2)
+            elif self.x > position[0]:
+                self.animation_ticker = self.tileset.find_id(self.x % 3, 1)
+
+            if self.y < position[1]:
+                self.animation_ticker = self.tileset.find_id(self.y % 3, 0)
+            elif self.y > position[1]:
+                self.animation_ticker = self.tileset.find_id(self.y % 3, 3)
 
         self.x, self.y = position
         self.ready = True
 
+    def add_snapshot(self, time, position):
+        # a position received from the network at time (time.monotonic)
+        if self.snapshots.add(time, position[0], position[1]):
+            self.set_position(position)
+            self.last_update = time
+
+    def unplace(self):
+        # forget where a remote player is until the network sends its position again
+        self.ready = False
+        self.last_update = None
+        self.snapshots.clear()
+
+    def get_render_position(self, render_time=None):
+        if self.snapshots is None or render_time is None or not len(self.snapshots):
+            return (self.x, self.y)
+        return self.snapshots.sample(render_time)
+
     def set_mute(self, mute, save = False):
         self.mute = mute
         if save: self.save_to_config()
 
-    def render(self):
-        font = pygame.font.Font(client.font, 30)
-        name_tag = font.render(self.name, False, (255, 255, 255))
+    def render(self, render_time=None, batch=None):
+        # render_time is the moment remote players are drawn at, already delayed for interpolation,
+        # with a batch the player is drawn when it's flushed rather than straight away
+        font = assets.get_font(settings.font, 30)
+        name_tag = assets.render_text(font, self.name, (255, 255, 255))
 
-        centre = self.map.get_pixel_pos(self.x, self.y)
+        centre = self.map.get_pixel_pos(*self.get_render_position(render_time))
 
         name_tag_pos = (
             centre[0] + ((self.size[0] - name_tag.get_width()) // 2),
             centre[1] - ((self.size[1] + name_tag.get_height()) // 2)
         )
 
-        self.screen.blit(name_tag, name_tag_pos)
-
         sprite = self.tileset.get_surface_by_id(self.animation_ticker)
-        self.screen.blit(sprite, centre)
+        if batch is None:
+            name_tag_rect = self.screen.blit(name_tag, name_tag_pos)
+            self.screen.blit(sprite, centre)
+        else:
+            name_tag_rect = batch.blit(name_tag, name_tag_pos, batch_module.PLAYERS)
+            batch.blit(sprite, centre, batch_module.PLAYERS)
 
         # create collision rectangle
         self.rect = sprite.get_rect()
         self.rect.topleft = centre
 
+        # the areas of the screen drawn over
+        return [name_tag_rect, self.rect.copy()]
+
     def move(self, direction):
         if not self.ready:
             self.__raiseNoPosition()
@@ -159,64 +189,37 @@ class Player():
     def attack(self, action, direction):
         if action == Action.SPELL:
             if direction == Movement.UP:
-                spell = Spell(self, (0, -0.25))
+                velocity = (0, -0.25)
             elif direction == Movement.RIGHT:
-                spell = Spell(self, (0.25, 0))
+                velocity = (0.25, 0)
             elif direction == Movement.DOWN:
-                spell = Spell(self, (0, 0.25))
+                velocity = (0, 0.25)
             elif direction == Movement.LEFT:
-                spell = Spell(self, (-0.25, 0))
+                velocity = (-0.25, 0)
 
-            # Remove first element of list if limit reached.
-            if len(self.cast_spells) > self.spell_limit:
-                self.cast_spells[1:]
-            self.cast_spells.append(spell)
+            return self.cast_spell(velocity)
         elif action == Action.SWIPE:
             #TODO
             return
 
-class Spell():
-    def __init__(self, player, velocity, position=None, size=(0.25, 0.25), colour=(0,0,0)):
-        self.player = player
-        self.size = size
-        self.colour = colour
+    def cast_spell(self, velocity, position=None):
+        projectiles = self.map.projectiles
         if position == None:
             # spawn at player - additional maths centres the spell
-            self.x = self.player.x + 0.5 - (size[0] / 2)
-            self.y = self.player.y + 0.5 - (size[1] / 2)
-        else:
-            self.set_position(position)
-
-        self.set_velocity(velocity)
-
-    def render(self):
-        pixel_pos = self.player.map.get_pixel_pos(self.x, self.y);
-        pixel_size = (
-            self.size[0] * map_module.TILE_PIX_WIDTH,
-            self.size[1] * map_module.TILE_PIX_HEIGHT
-        )
-        self.rect = pygame.draw.rect(self.player.screen, self.colour, Rect(pixel_pos, pixel_size))
-
-        # move the projectile by its velocity
-        self.x += self.velo_x
-        self.y += self.velo_y
-
-    def get_properties(self):
-        return SpellProperties(self.x, self.y, self.velo_x, self.velo_y)
-
-    def set_properties(self, properties):
-        self.x, self.y, self.velo_x, self.velo_y = properties
-
-    def set_position(self, position):
-        self.x, self.y = position
+            position = (
+                self.x + 0.5 - (projectiles.size[0] / 2),
+                self.y + 0.5 - (projectiles.size[1] / 2)
+            )
 
-    def set_velocity(self, velocity):
-        self.velo_x, self.velo_y = velocity
+        # the projectile system drops this player's oldest spell once the limit is reached
+        projectiles.spawn(self, position[0], position[1], velocity[0], velocity[1], self.spell_limit)
+        return SpellProperties(position[0], position[1], velocity[0], velocity[1])
 
-    def hit_target(self, target):
-        if self.rect.colliderect(target.rect):
-            # TODO - decide on what to do with collision
-            pass
+def peer_colour(uuid):
+    # the same colour for a peer every time, from a generator of its own so the global
+    # random state is left alone
+    rng = random.Random(str(uuid))
+    return (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255))
 
 class PlayerManager():
     def __init__(self, me):
@@ -224,13 +227,39 @@ class PlayerManager():
         self.me.load_from_config()
         self.others = {}
 
+    def add(self, uuid):
+        # the Player for a peer, built the first time the peer is seen
+        player = self.others.get(uuid)
+        if player is None:
+            player = Player(self.me.screen, self.me.map, colour=peer_colour(uuid), interpolate=True)
+            self.others[uuid] = player
+        return player
+
+    def remove(self, uuid):
+        return self.others.pop(uuid, None) is not None
+
+    def placed(self):
+        # the peers whose position is known, the only ones drawn or hit
+        return [ player for player in self.others.values() if player.ready ]
+
+    def expire(self, before):
+        # unplace peers not heard from since before, e.g. those outside our area of
+        # interest, returns how many
+        expired = [ player for player in self.others.values() if player.ready and player.last_update < before ]
+        for player in expired:
+            player.unplace()
+        return len(expired)
+
     def set(self, players):
-        newPlayers = {}
-        for uuid in players:
-            random.seed(uuid)
-            colour = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
-            newPlayers[uuid] = self.others.get(uuid, Player(self.me.screen, self.me.map, colour=colour))
-        self.others = newPlayers
+        # make the peers exactly players, returns how many were added and removed
+        players = set(players)
+        removed = [ uuid for uuid in self.others if uuid not in players ]
+        for uuid in removed:
+            del self.others[uuid]
+        added = [ uuid for uuid in players if uuid not in self.others ]
+        for uuid in added:
+            self.add(uuid)
+        return len(added), len(removed)
 
     def all(self):
         return list(self.others.values()).push(self.me)
@@ -0,0 +1,121 @@
+import csv
+import time
+
+import numpy
+
+import assets
+
+'''
+FrameProfiler times the phases of each frame of the game loop.
+
+The loop calls mark(phase) as it finishes each phase, and the time since the previous
+mark (or the start of the frame) is added to that phase. Phases can be marked more
+than once a frame, their times add up. Each frame's timings go into one row of a fixed
+size ring buffer, so the profiler never allocates while the game runs.
+
+When it isn't enabled every call returns straight away, so it can be left in the loop.
+
+'''
+
+class FrameProfiler():
+    def __init__(self, phases, size=600, enabled=False):
+        self.phases = tuple(phases)
+        self.columns = { phase: column for column, phase in enumerate(self.phases) }
+        self.size = size
+        self.timings = numpy.zeros((size, len(self.phases)), dtype=numpy.float64)
+        self.enabled = enabled
+        self.clear()
+
+    def clear(self):
+        self.timings[:] = 0
+        # the row the current frame is written to, and how many frames are stored
+        self.head = 0
+        self.count = 0
+        self.frames = 0
+        self.last = None
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        self.last = None
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.timings[self.head] = 0
+        self.last = time.perf_counter()
+
+    def mark(self, phase):
+        if not self.enabled or self.last is None:
+            return
+        now = time.perf_counter()
+        self.timings[self.head, self.columns[phase]] += now - self.last
+        self.last = now
+
+    def end_frame(self):
+        if not self.enabled or self.last is None:
+            return
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+        self.frames += 1
+        self.last = None
+
+    def recent(self):
+        # stored frames oldest first, in seconds
+        if self.count < self.size:
+            return self.timings[:self.count]
+        return numpy.roll(self.timings, -self.head, axis=0)
+
+    def summary(self):
+        # {phase: (average, maximum)} in milliseconds over the stored frames
+        timings = self.recent()
+        if not len(timings):
+            return { phase: (0.0, 0.0) for phase in self.phases }
+        averages = timings.mean(axis=0) * 1000
+        maxima = timings.max(axis=0) * 1000
+        return { phase: (averages[column], maxima[column]) for phase, column in self.columns.items() }
+
+    def write_csv(self, path):
+        timings = self.recent()
+        first_frame = self.frames - len(timings)
+        with open(path, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(['frame'] + [ phase + '_ms' for phase in self.phases ] + ['total_ms'])
+            for row, frame_timings in enumerate(timings.tolist()):
+                writer.writerow(
+                    [first_frame + row] +
+                    [ '{:.4f}'.format(timing * 1000) for timing in frame_timings ] +
+                    ['{:.4f}'.format(sum(frame_timings) * 1000)]
+                )
+
+
+class ProfilerOverlay():
+    # draws a profiler's per phase averages and maxima in the top left of the screen
+    def __init__(self, profiler, font_path, font_size=24, refresh=30):
+        self.profiler = profiler
+        self.font = assets.get_font(font_path, font_size)
+        # the text only changes every refresh frames, so the rendered lines can be reused
+        self.refresh = refresh
+        self.lines = []
+        self.rendered_at = None
+
+    def render_lines(self):
+        summary = self.profiler.summary()
+        total_average = sum(average for average, maximum in summary.values())
+        texts = ['{:<10} {:>7} {:>7}'.format('phase', 'avg ms', 'max ms')]
+        texts += [ '{:<10} {:7.2f} {:7.2f}'.format(phase, *summary[phase]) for phase in self.profiler.phases ]
+        texts.append('{:<10} {:7.2f}'.format('total', total_average))
+        self.lines = [ self.font.render(text, False, (255, 255, 255), (0, 0, 0)) for text in texts ]
+
+    def render(self, screen):
+        # returns the areas of the screen drawn over
+        frames = self.profiler.frames
+        if self.rendered_at is None or frames - self.rendered_at >= self.refresh:
+            self.render_lines()
+            self.rendered_at = frames
+
+        rects = []
+        y = 0
+        for line in self.lines:
+            rects.append(screen.blit(line, (0, y)))
+            y += line.get_height()
+        return rects
@@ -0,0 +1,243 @@
+import numpy
+import pygame
+
+import batch as batch_module
+import map as map_module
+import tile
+from spatial import SpatialHash
+
+'''
+ProjectileSystem stores every live spell in parallel NumPy arrays rather than one
+object per spell, so the whole lot can be moved and culled in a few array operations.
+
+Positions and velocities are in tiles (velocities per step). The positions before the
+last step are kept too, so rendering can draw spells part way between two steps. A
+spell is removed once
+it is max_age steps old, leaves a finite level, or its centre enters a COLLIDE tile.
+Each owner may only have a limited number of live spells, casting another removes
+that owner's oldest one.
+
+Hits against players are found through a SpatialHash of the spell positions, which
+is rebuilt at most once per step and only when something asks for hits.
+
+'''
+
+class ProjectileSystem():
+    def __init__(self, level, size=(0.25, 0.25), colour=(0, 0, 0), max_age=240, capacity=256):
+        self.level = level
+        self.size = size
+        self.colour = colour
+        self.max_age = max_age
+        self.count = 0
+
+        self.x = numpy.zeros(capacity, dtype=numpy.float64)
+        self.y = numpy.zeros(capacity, dtype=numpy.float64)
+        self.previous_x = numpy.zeros(capacity, dtype=numpy.float64)
+        self.previous_y = numpy.zeros(capacity, dtype=numpy.float64)
+        self.velocity_x = numpy.zeros(capacity, dtype=numpy.float64)
+        self.velocity_y = numpy.zeros(capacity, dtype=numpy.float64)
+        self.owner = numpy.zeros(capacity, dtype=numpy.int32)
+        self.age = numpy.zeros(capacity, dtype=numpy.int32)
+
+        # owners can be anything hashable, the arrays hold a small integer id for each;
+        # a removed owner's id is reused, and its slot in owners is None until then
+        self.owner_ids = {}
+        self.owners = []
+        self.free_owner_ids = []
+
+        self.spatial_hash = SpatialHash()
+        self.spatial_hash_dirty = False
+        # a filled square every spell is drawn with, made when first needed
+        self.surface = None
+
+    def arrays(self):
+        return (self.x, self.y, self.previous_x, self.previous_y, self.velocity_x, self.velocity_y, self.owner, self.age)
+
+    def get_owner_id(self, owner):
+        owner_id = self.owner_ids.get(owner)
+        if owner_id is None:
+            if self.free_owner_ids:
+                owner_id = self.free_owner_ids.pop()
+                self.owners[owner_id] = owner
+            else:
+                owner_id = len(self.owners)
+                self.owners.append(owner)
+            self.owner_ids[owner] = owner_id
+        return owner_id
+
+    def grow(self):
+        capacity = len(self.x) * 2
+        for name in ('x', 'y', 'previous_x', 'previous_y', 'velocity_x', 'velocity_y', 'owner', 'age'):
+            old = getattr(self, name)
+            new = numpy.zeros(capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def spawn(self, owner, x, y, velocity_x, velocity_y, limit=None):
+        owner_id = self.get_owner_id(owner)
+
+        if limit is not None:
+            owned = numpy.flatnonzero(self.owner[:self.count] == owner_id)
+            if len(owned) >= limit:
+                # spells are kept in the order they were cast, so the first are the oldest
+                self.remove_indices(owned[:len(owned) - limit + 1])
+
+        if self.count == len(self.x):
+            self.grow()
+
+        index = self.count
+        self.x[index] = x
+        self.y[index] = y
+        self.previous_x[index] = x
+        self.previous_y[index] = y
+        self.velocity_x[index] = velocity_x
+        self.velocity_y[index] = velocity_y
+        self.owner[index] = owner_id
+        self.age[index] = 0
+        self.count += 1
+        self.spatial_hash_dirty = True
+        return index
+
+    def replace(self, x, y, velocity_x, velocity_y):
+        # swap every live spell for the ones given, e.g. the spells of a server's snapshot,
+        # which have no owner here
+        count = len(x)
+        while len(self.x) < count:
+            self.grow()
+        self.x[:count] = x
+        self.y[:count] = y
+        self.previous_x[:count] = x
+        self.previous_y[:count] = y
+        self.velocity_x[:count] = velocity_x
+        self.velocity_y[:count] = velocity_y
+        self.owner[:count] = -1
+        self.age[:count] = 0
+        self.count = count
+        self.spatial_hash_dirty = True
+
+    def remove(self, mask):
+        # drop every live spell where mask is True, keeping the rest in order
+        keep = ~mask
+        remaining = int(numpy.count_nonzero(keep))
+        if remaining == self.count:
+            return 0
+        for array in self.arrays():
+            array[:remaining] = array[:self.count][keep]
+        removed = self.count - remaining
+        self.count = remaining
+        self.spatial_hash_dirty = True
+        return removed
+
+    def remove_indices(self, indices):
+        mask = numpy.zeros(self.count, dtype=bool)
+        mask[indices] = True
+        return self.remove(mask)
+
+    def remove_owner(self, owner):
+        # remove an owner's spells and forget the owner, e.g. a player who has left
+        owner_id = self.owner_ids.pop(owner, None)
+        if owner_id is None:
+            return 0
+        removed = self.remove(self.owner[:self.count] == owner_id)
+        self.owners[owner_id] = None
+        self.free_owner_ids.append(owner_id)
+        return removed
+
+    def count_owned(self, owner):
+        owner_id = self.owner_ids.get(owner)
+        if owner_id is None:
+            return 0
+        return int(numpy.count_nonzero(self.owner[:self.count] == owner_id))
+
+    def step(self):
+        # move every spell by its velocity, then cull the ones that are finished
+        count = self.count
+        if not count:
+            return 0
+
+        x = self.x[:count]
+        y = self.y[:count]
+        self.previous_x[:count] = x
+        self.previous_y[:count] = y
+        x += self.velocity_x[:count]
+        y += self.velocity_y[:count]
+        self.age[:count] += 1
+        self.spatial_hash_dirty = True
+
+        # the tile under the centre of each spell, outside a finite level counts as solid
+        tile_x = numpy.floor(x + self.size[0] / 2).astype(numpy.int64)
+        tile_y = numpy.floor(y + self.size[1] / 2).astype(numpy.int64)
+        collide = tile.TileAttribute.COLLIDE.value
+        attributes = self.level.get_attributes(tile_x, tile_y, outside=collide)
+
+        expired = self.age[:count] >= self.max_age
+        expired |= (attributes & collide) != 0
+        return self.remove(expired)
+
+    def get_spatial_hash(self):
+        if self.spatial_hash_dirty:
+            self.spatial_hash.rebuild(self.x[:self.count], self.y[:self.count])
+            self.spatial_hash_dirty = False
+        return self.spatial_hash
+
+    def find_hits(self, targets, target_size=(1, 1)):
+        # (spell index, target) for every spell overlapping a target's tile, a target
+        # is anything with x and y, and is never hit by the spells it owns
+        spatial_hash = self.get_spatial_hash()
+        hits = []
+        for target in targets:
+            # a spell overlaps when its top left corner is less than a spell away from the box
+            indices = spatial_hash.query(
+                target.x - self.size[0], target.y - self.size[1],
+                target.x + target_size[0], target.y + target_size[1]
+            )
+            owner_id = self.owner_ids.get(target)
+            if owner_id is not None:
+                indices = indices[self.owner[indices] != owner_id]
+            hits.extend((index, target) for index in indices.tolist())
+        return hits
+
+    def get_surface(self, width, height):
+        if self.surface is None or self.surface.get_size() != (width, height):
+            self.surface = pygame.Surface((width, height))
+            if pygame.display.get_surface() is not None:
+                self.surface = self.surface.convert()
+            self.surface.fill(self.colour)
+        return self.surface
+
+    def render(self, map, alpha=1.0, batch=None):
+        # draw every spell on screen, returns the rects drawn over, alpha is how far
+        # between the previous step and the last one to draw them, with a batch they
+        # are drawn when it's flushed
+        count = self.count
+        if not count:
+            return []
+
+        x = self.x[:count]
+        y = self.y[:count]
+        if alpha != 1.0:
+            x = self.previous_x[:count] + (x - self.previous_x[:count]) * alpha
+            y = self.previous_y[:count] + (y - self.previous_y[:count]) * alpha
+
+        screen = map.screen
+        width = self.size[0] * map_module.TILE_PIX_WIDTH
+        height = self.size[1] * map_module.TILE_PIX_HEIGHT
+        pixel_x = (x - map.centre_player.x) * map_module.TILE_PIX_WIDTH + screen.get_width() // 2
+        pixel_y = (y - map.centre_player.y) * map_module.TILE_PIX_HEIGHT + screen.get_height() // 2
+        visible = (pixel_x > -width) & (pixel_x < screen.get_width()) & (pixel_y > -height) & (pixel_y < screen.get_height())
+
+        width = int(width)
+        height = int(height)
+        surface = self.get_surface(width, height)
+        xs = pixel_x[visible].astype(numpy.int64)
+        ys = pixel_y[visible].astype(numpy.int64)
+        if batch is None:
+            return screen.blits([ (surface, position) for position in zip(xs.tolist(), ys.tolist()) ])
+
+        batch.blit_many([ (surface, position) for position in zip(xs.tolist(), ys.tolist()) ], batch_module.SPELLS)
+        # the areas the batch will draw over, clipped to the screen like blit would
+        left = numpy.maximum(xs, 0)
+        top = numpy.maximum(ys, 0)
+        right = numpy.minimum(xs + width, screen.get_width())
+        bottom = numpy.minimum(ys + height, screen.get_height())
+        return list(zip(left.tolist(), top.tolist(), (right - left).tolist(), (bottom - top).tolist()))
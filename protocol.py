@@ -0,0 +1,202 @@
+import struct
+import time
+from collections import namedtuple
+
+import numpy
+
+'''
+The binary wire format for world:position and world:combat messages.
+
+Every message is a fixed header followed by a fixed layout payload for its kind:
+
+    header   version << 4 | kind (u8), sequence (u16), timestamp in ms (u32)
+    POSITION x, y (i32 each)
+    SPELL    x, y, x velocity, y velocity (f32 each)
+    HELLO    nothing, a client joining a server
+    BYE      nothing, a client leaving a server
+    WELCOME  the client's player id (u16), the server's snapshot port (u16), level
+             seed (i64), level width and height (i32 each, 0 for a chunked level)
+
+except SNAPSHOT, the state of a whole server's world, whose payload is:
+
+    tick (u32), player count (u16), spell count (u16)
+    players  id (u16), x, y (i32 each), times hit (u16), for each player
+    spells   x, y, x velocity, y velocity (f32 each), for each spell
+
+All values are little endian. Sequence numbers count up per sender and kind and wrap
+at 2 ** 16, so receivers can drop stale or reordered state. The timestamp is the
+sender's wall clock in milliseconds, wrapped to 32 bits.
+
+'''
+
+VERSION = 1
+
+POSITION = 1
+SPELL = 2
+SNAPSHOT = 3
+HELLO = 4
+BYE = 5
+WELCOME = 6
+
+HEADER_FORMAT = '<BHI'
+HEADER = struct.Struct(HEADER_FORMAT)
+# payload layouts after the header, kept as str as Struct.format is bytes before Python 3.7
+PAYLOADS = {
+    POSITION: 'ii',
+    SPELL: 'ffff',
+    HELLO: '',
+    BYE: '',
+    WELCOME: 'HHqii',
+}
+# whole message layouts, so encoding and decoding is a single struct call
+MESSAGES = { kind: struct.Struct(HEADER_FORMAT + payload) for kind, payload in PAYLOADS.items() }
+
+SEQUENCE_MODULO = 1 << 16
+
+Message = namedtuple('Message', ['kind', 'sequence', 'timestamp', 'values'])
+
+SNAPSHOT_COUNTS = struct.Struct('<IHH')
+SNAPSHOT_PLAYER = numpy.dtype([('id', '<u2'), ('x', '<i4'), ('y', '<i4'), ('hits', '<u2')])
+SNAPSHOT_SPELL = numpy.dtype([('x', '<f4'), ('y', '<f4'), ('x_velocity', '<f4'), ('y_velocity', '<f4')])
+# players and spells are structured arrays of the dtypes above
+Snapshot = namedtuple('Snapshot', ['sequence', 'timestamp', 'tick', 'players', 'spells'])
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def timestamp_ms(now=None):
+    if now is None:
+        now = time.time()
+    return int(now * 1000) & 0xFFFFFFFF
+
+
+def encode(kind, sequence, values, timestamp=None):
+    if timestamp is None:
+        timestamp = timestamp_ms()
+    return MESSAGES[kind].pack((VERSION << 4) | kind, sequence % SEQUENCE_MODULO, timestamp, *values)
+
+
+def decode_header(data):
+    if len(data) < HEADER.size:
+        raise ProtocolError('Message too short: {0} bytes'.format(len(data)))
+    version_kind = data[0]
+    version, kind = version_kind >> 4, version_kind & 0x0F
+    if version != VERSION:
+        raise ProtocolError('Unsupported protocol version {0}'.format(version))
+    return kind
+
+
+def decode(data):
+    kind = decode_header(data)
+    layout = MESSAGES.get(kind)
+    if layout is None:
+        raise ProtocolError('Unknown message kind {0}'.format(kind))
+    if len(data) != layout.size:
+        raise ProtocolError('Message of kind {0} should be {1} bytes, got {2}'.format(kind, layout.size, len(data)))
+
+    fields = layout.unpack(data)
+    return Message(kind, fields[1], fields[2], fields[3:])
+
+
+def encode_snapshot(sequence, tick, players, spells, timestamp=None):
+    # players and spells are structured arrays of SNAPSHOT_PLAYER and SNAPSHOT_SPELL
+    if timestamp is None:
+        timestamp = timestamp_ms()
+    return b''.join((
+        HEADER.pack((VERSION << 4) | SNAPSHOT, sequence % SEQUENCE_MODULO, timestamp),
+        SNAPSHOT_COUNTS.pack(tick & 0xFFFFFFFF, len(players), len(spells)),
+        players.tobytes(),
+        spells.tobytes(),
+    ))
+
+
+def decode_snapshot(data):
+    kind = decode_header(data)
+    if kind != SNAPSHOT:
+        raise ProtocolError('Expected a snapshot, got a message of kind {0}'.format(kind))
+    if len(data) < HEADER.size + SNAPSHOT_COUNTS.size:
+        raise ProtocolError('Snapshot too short: {0} bytes'.format(len(data)))
+    version_kind, sequence, timestamp = HEADER.unpack_from(data)
+    tick, player_count, spell_count = SNAPSHOT_COUNTS.unpack_from(data, HEADER.size)
+    players_start = HEADER.size + SNAPSHOT_COUNTS.size
+    spells_start = players_start + player_count * SNAPSHOT_PLAYER.itemsize
+    size = spells_start + spell_count * SNAPSHOT_SPELL.itemsize
+    if len(data) != size:
+        raise ProtocolError('Snapshot of {0} players and {1} spells should be {2} bytes, got {3}'.format(
+            player_count, spell_count, size, len(data)))
+    players = numpy.frombuffer(data, SNAPSHOT_PLAYER, player_count, players_start)
+    spells = numpy.frombuffer(data, SNAPSHOT_SPELL, spell_count, spells_start)
+    return Snapshot(sequence, timestamp, tick, players, spells)
+
+
+def is_newer(sequence, last):
+    # serial number arithmetic, so the comparison survives wrapping
+    difference = (sequence - last) % SEQUENCE_MODULO
+    return 0 < difference < SEQUENCE_MODULO // 2
+
+
+class Encoder():
+    # numbers outgoing messages, one sequence per kind
+    def __init__(self):
+        self.sequences = {}
+
+    def encode(self, kind, values, timestamp=None):
+        sequence = self.sequences.get(kind, 0)
+        self.sequences[kind] = (sequence + 1) % SEQUENCE_MODULO
+        return encode(kind, sequence, values, timestamp)
+
+
+class SequenceTracker():
+    # remembers the newest sequence seen from each sender, per kind
+    def __init__(self):
+        self.last = {}
+        self.dropped = 0
+
+    def accept(self, sender, message):
+        key = (sender, message.kind)
+        last = self.last.get(key)
+        if last is not None and not is_newer(message.sequence, last):
+            self.dropped += 1
+            return False
+        self.last[key] = message.sequence
+        return True
+
+    def forget(self, sender):
+        for key in [ key for key in self.last if key[0] == sender ]:
+            del self.last[key]
+
+
+class ChangeFilter():
+    '''
+    Lets state through when it changes, or every keepalive seconds regardless.
+
+    Nothing is let through more often than once every min_interval seconds, the
+    newest state goes out once the interval is up. After a change one more update
+    follows at the next interval even if nothing changed, so receivers can tell a
+    player has stopped rather than that their packets are late.
+    '''
+    def __init__(self, keepalive=1.0, min_interval=0):
+        self.keepalive = keepalive
+        self.min_interval = min_interval
+        self.reset()
+
+    def reset(self):
+        self.last_state = None
+        self.last_sent = None
+        self.settle_pending = False
+
+    def should_send(self, state, now=None):
+        if now is None:
+            now = time.time()
+        if self.last_sent is not None and now - self.last_sent < self.min_interval:
+            return False
+
+        changed = state != self.last_state
+        if changed or self.settle_pending or self.last_sent is None or now - self.last_sent >= self.keepalive:
+            self.settle_pending = changed and self.min_interval > 0
+            self.last_state = state
+            self.last_sent = now
+            return True
+        return False
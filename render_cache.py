@@ -0,0 +1,78 @@
+from collections import OrderedDict
+
+import pygame
+
+'''
+RenderCache bakes square regions of a level's tiles into off-screen surfaces.
+
+A region is drawn tile by tile once, then every frame only the few baked regions
+that overlap the viewport are blitted. Regions are dropped when a tile inside them
+changes, and the least recently used ones are dropped once there are too many.
+
+'''
+
+class RenderCache():
+    def __init__(self, level, tileset, region_size=16, max_regions=32):
+        self.level = level
+        self.tileset = tileset
+        self.region_size = region_size
+        self.max_regions = max_regions
+        self.regions = OrderedDict()
+        self.bakes = 0
+        level.add_tile_listener(self.invalidate_tile)
+
+    def get_region(self, region_x, region_y):
+        # the baked surface for a region and the tile its top left corner sits on
+        key = (region_x, region_y)
+        region = self.regions.get(key)
+        if region is not None:
+            self.regions.move_to_end(key)
+            return region
+
+        region = self.bake(region_x, region_y)
+        self.regions[key] = region
+        if len(self.regions) > self.max_regions:
+            self.regions.popitem(last=False)
+        return region
+
+    def bake(self, region_x, region_y):
+        size = self.region_size
+        # regions on the edge of a finite level only cover the tiles that exist
+        min_x, min_y, max_x, max_y = self.level.clip(
+            region_x * size, region_y * size, (region_x + 1) * size, (region_y + 1) * size
+        )
+        if max_x <= min_x or max_y <= min_y:
+            return None, (min_x, min_y)
+
+        tile_width, tile_height = self.tileset.render_dimensions
+        surface = pygame.Surface(((max_x - min_x) * tile_width, (max_y - min_y) * tile_height))
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert()
+
+        tile_ids = self.level.get_tile_ids(min_x, min_y, max_x - min_x, max_y - min_y)
+        get_surface = self.tileset.get_surface_by_id
+        surface.blits([
+            (get_surface(tile_id), (x * tile_width, y * tile_height))
+            for y, row in enumerate(tile_ids.tolist())
+            for x, tile_id in enumerate(row)
+        ], False)
+
+        self.bakes += 1
+        return surface, (min_x, min_y)
+
+    def invalidate_tile(self, x, y):
+        self.regions.pop((x // self.region_size, y // self.region_size), None)
+
+    def clear(self):
+        self.regions.clear()
+
+    def render(self, screen, map, min_x, min_y, max_x, max_y):
+        # blit every region overlapping the tile range [min, max)
+        size = self.region_size
+        blits = []
+        for region_y in range(min_y // size, (max_y - 1) // size + 1):
+            for region_x in range(min_x // size, (max_x - 1) // size + 1):
+                surface, origin = self.get_region(region_x, region_y)
+                if surface is not None:
+                    blits.append((surface, map.get_pixel_pos(origin[0], origin[1])))
+        screen.blits(blits, False)
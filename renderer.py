@@ -0,0 +1,142 @@
+import pygame
+
+import map as map_module
+
+'''
+IncrementalRenderer redraws only the parts of the screen that changed since the last frame.
+
+The previous frame is kept on the screen surface. When the centre player moves it
+is scrolled by whole tiles and only the newly exposed rows and columns of the map
+are drawn. Everything drawn over the map (sprites, spells, name tags) is recorded
+so the map can be restored underneath it next frame, along with any tiles of the
+level which changed. The changed areas are handed to pygame.display.update instead
+of flipping the whole display.
+
+Restoring an area costs a fill and a clipped map render however small it is, so the
+areas are merged first, every one whose centre lies in the same merge_cell pixel
+square of the screen into one rect. If that still leaves more than max_rects areas,
+or they cover more than max_area of the screen, the whole map is redrawn instead,
+which is cheaper than many small redraws on a busy frame. With more than four times
+max_rects areas drawn over it, it isn't worth merging them to find that out.
+
+'''
+
+class IncrementalRenderer():
+    def __init__(self, screen, map, background=(255, 255, 255), merge_cell=256, max_rects=16, max_area=0.25):
+        self.screen = screen
+        self.map = map
+        self.background = background
+        self.merge_cell = merge_cell
+        self.max_rects = max_rects
+        self.max_area = max_area
+        self.previous_centre = None
+        # areas drawn over the map last frame, in screen coordinates
+        self.overlay_rects = []
+        self.new_overlay_rects = []
+        # (x, y) of level tiles changed since the last frame, to be redrawn
+        self.changed_tiles = []
+        self.dirty_rects = []
+        self.full_redraw = True
+        self.full_redraws = 0
+        map.level.add_tile_listener(self.tile_changed)
+
+    def invalidate(self):
+        # something else drew over the screen (e.g. a menu), start from scratch next frame
+        self.full_redraw = True
+
+    def tile_changed(self, x, y):
+        # kept as level coordinates, the screen may scroll before the next frame
+        self.changed_tiles.append((x, y))
+
+    def merge(self, rects):
+        # one rect covering each group of rects whose centres share a merge_cell square
+        cells = {}
+        for rect in rects:
+            cells.setdefault((rect.centerx // self.merge_cell, rect.centery // self.merge_cell), []).append(rect)
+        return [ group[0].unionall(group[1:]) if len(group) > 1 else group[0] for group in cells.values() ]
+
+    def restore(self, rect):
+        # put the map back over an area of the screen
+        rect = rect.clip(self.screen.get_rect())
+        if rect.width and rect.height:
+            self.screen.fill(self.background, rect)
+            self.map.render(rect)
+        return rect
+
+    def begin_frame(self):
+        screen_rect = self.screen.get_rect()
+        centre = (self.map.centre_player.x, self.map.centre_player.y)
+        self.dirty_rects = []
+        self.new_overlay_rects = []
+
+        if self.previous_centre is None:
+            self.full_redraw = True
+        else:
+            scroll_x = (self.previous_centre[0] - centre[0]) * map_module.TILE_PIX_WIDTH
+            scroll_y = (self.previous_centre[1] - centre[1]) * map_module.TILE_PIX_HEIGHT
+            if abs(scroll_x) >= screen_rect.width or abs(scroll_y) >= screen_rect.height:
+                self.full_redraw = True
+        self.previous_centre = centre
+
+        if self.full_redraw:
+            self.redraw(screen_rect)
+            return
+
+        if scroll_x or scroll_y:
+            self.screen.scroll(scroll_x, scroll_y)
+            # the old overlays moved with the rest of the frame
+            self.overlay_rects = [ rect.move(scroll_x, scroll_y) for rect in self.overlay_rects ]
+
+            if scroll_x > 0:
+                self.restore(pygame.Rect(0, 0, scroll_x, screen_rect.height))
+            elif scroll_x < 0:
+                self.restore(pygame.Rect(screen_rect.width + scroll_x, 0, -scroll_x, screen_rect.height))
+            if scroll_y > 0:
+                self.restore(pygame.Rect(0, 0, screen_rect.width, scroll_y))
+            elif scroll_y < 0:
+                self.restore(pygame.Rect(0, screen_rect.height + scroll_y, screen_rect.width, -scroll_y))
+            # every pixel on the display has moved
+            self.dirty_rects.append(screen_rect)
+
+        rects = list(self.overlay_rects)
+        for x, y in self.changed_tiles:
+            pixel_x, pixel_y = self.map.get_pixel_pos(x, y)
+            rects.append(pygame.Rect(pixel_x, pixel_y, map_module.TILE_PIX_WIDTH, map_module.TILE_PIX_HEIGHT))
+        self.changed_tiles = []
+        rects = [ rect for rect in (rect.clip(screen_rect) for rect in rects) if rect.width and rect.height ]
+        rects = self.merge(rects)
+
+        area = sum(rect.width * rect.height for rect in rects)
+        if len(rects) > self.max_rects or area > self.max_area * screen_rect.width * screen_rect.height:
+            self.redraw(screen_rect)
+            return
+        for rect in rects:
+            self.dirty_rects.append(self.restore(rect))
+
+    def redraw(self, screen_rect):
+        # the whole map, forgetting what was drawn over it
+        self.full_redraw = False
+        self.full_redraws += 1
+        self.overlay_rects = []
+        self.changed_tiles = []
+        self.restore(screen_rect)
+        self.dirty_rects = [screen_rect]
+
+    def drawn(self, rects):
+        # record areas drawn over the map this frame, which may include Nones for things
+        # not drawn, made Rects when they're merged
+        self.new_overlay_rects.extend(rects)
+
+    def end_frame(self):
+        if len(self.new_overlay_rects) > self.max_rects * 4:
+            # too many to be worth merging, the next frame will redraw everything anyway
+            self.full_redraw = True
+            self.overlay_rects = []
+        else:
+            # merged now, they're restored next frame and updated on the display this one
+            self.overlay_rects = self.merge([ pygame.Rect(rect) for rect in self.new_overlay_rects if rect is not None ])
+        self.new_overlay_rects = []
+        if self.full_redraw or self.screen.get_rect() in self.dirty_rects:
+            pygame.display.update()
+        else:
+            pygame.display.update(self.dirty_rects + self.overlay_rects)
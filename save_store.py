@@ -0,0 +1,237 @@
+import atexit
+import configparser
+import logging
+import os
+import tempfile
+import threading
+import time
+
+'''
+SaveStore keeps saved player profiles in memory and writes them to disk behind the
+game's back.
+
+Every profile is a section of one INI file, the default profile is the 'Player'
+section the game has always saved to and any other profile is 'Player <name>'. The
+file is read once, the first time anything is loaded, and after that loads and
+updates only touch the in-memory copy. An update marks the store dirty and wakes a
+writer thread, which waits write_delay seconds for more updates to arrive and then
+writes them all at once. A write which fails is tried again, waiting twice as long
+each time up to max_retry_delay, and until one succeeds the updates stay pending and
+flush and close report them unsaved.
+
+Writes go to a temporary file in the same directory which is flushed to disk and
+then renamed over the save, so a crash part way through leaves the previous save as
+it was rather than half written.
+
+'''
+
+DEFAULT_PROFILE = 'default'
+
+log = logging.getLogger("save_store")
+
+# one store per save file, shared by everything which saves to it
+stores = {}
+stores_lock = threading.Lock()
+
+
+def get_store(path):
+    with stores_lock:
+        store = stores.get(path)
+        if store is None:
+            store = SaveStore(path)
+            stores[path] = store
+            # write anything still pending before the interpreter exits
+            atexit.register(store.close)
+        return store
+
+
+def section_name(profile):
+    return 'Player' if profile == DEFAULT_PROFILE else 'Player {0}'.format(profile)
+
+
+class SaveStore():
+    def __init__(self, path, write_delay=0.25, max_retry_delay=30.0):
+        self.path = path
+        self.write_delay = write_delay
+        self.max_retry_delay = max_retry_delay
+        # section name: {key: value}, values are strings as they are in the file
+        self.sections = None
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        # bumped by every update, the writer notes which version it wrote
+        self.version = 0
+        self.written_version = 0
+        self.writer = None
+        # hurry skips the write delay, for flush, closing stops the writer once it's written
+        self.hurry = False
+        self.closing = False
+
+        self.reads = 0
+        self.updates = 0
+        self.writes = 0
+        self.write_errors = 0
+        # failed writes since the last one which succeeded, and why the last one failed
+        self.failures = 0
+        self.last_error = None
+
+    def read(self):
+        # the first load reads the file, called with the lock held
+        if self.sections is not None:
+            return
+        # no interpolation, a '%' in a player's name is just a '%'
+        config = configparser.ConfigParser(interpolation=None)
+        try:
+            config.read(self.path)
+        except configparser.Error:
+            log.exception("%s could not be read, starting with no saves", self.path)
+            config = configparser.ConfigParser(interpolation=None)
+        self.sections = { name: dict(config[name]) for name in config.sections() }
+        self.reads += 1
+
+    def load(self, profile=DEFAULT_PROFILE):
+        # a copy of the profile's saved values, or None if it has never been saved
+        with self.lock:
+            self.read()
+            values = self.sections.get(section_name(profile))
+            return dict(values) if values is not None else None
+
+    def profiles(self):
+        with self.lock:
+            self.read()
+            return [ DEFAULT_PROFILE if name == 'Player' else name[len('Player '):] for name in self.sections ]
+
+    def update(self, values, profile=DEFAULT_PROFILE):
+        # change some of a profile's values, they are written to disk shortly
+        values = { key: str(value) for key, value in values.items() }
+        with self.lock:
+            self.read()
+            section = self.sections.setdefault(section_name(profile), {})
+            if all(section.get(key) == value for key, value in values.items()):
+                return
+            section.update(values)
+            self.version += 1
+            self.updates += 1
+            self.start_writer()
+            self.changed.notify_all()
+
+    def start_writer(self):
+        # called with the lock held
+        if self.writer is None:
+            self.writer = threading.Thread(target=self.run, name="save store", daemon=True)
+            self.writer.start()
+
+    def run(self):
+        with self.lock:
+            try:
+                while True:
+                    while self.version == self.written_version and not self.closing:
+                        self.changed.wait()
+                    if self.version == self.written_version:
+                        return
+                    # let more updates arrive, so a burst of them is one write, and back off
+                    # after failed writes
+                    delay = self.write_delay
+                    if self.failures:
+                        delay = min(self.write_delay * 2 ** self.failures, self.max_retry_delay)
+                    deadline = time.monotonic() + delay
+                    while not self.closing and not self.hurry:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self.changed.wait(remaining)
+                    version = self.version
+                    sections = { name: dict(values) for name, values in self.sections.items() }
+
+                    self.lock.release()
+                    error = None
+                    try:
+                        self.write(sections)
+                    except Exception as e:
+                        log.exception("saving to %s failed", self.path)
+                        error = e
+                    finally:
+                        self.lock.acquire()
+
+                    if error is None:
+                        self.written_version = version
+                        self.failures = 0
+                        self.last_error = None
+                        if self.written_version == self.version:
+                            self.hurry = False
+                    else:
+                        # the updates stay pending, flush gives up waiting for them
+                        self.write_errors += 1
+                        self.failures += 1
+                        self.last_error = error
+                        self.hurry = False
+                        if self.closing:
+                            return
+                    self.changed.notify_all()
+            finally:
+                self.writer = None
+                self.changed.notify_all()
+
+    def write(self, sections):
+        config = configparser.ConfigParser(interpolation=None)
+        for name, values in sections.items():
+            config[name] = values
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        descriptor, temporary_path = tempfile.mkstemp(prefix='.save-', dir=directory)
+        try:
+            with os.fdopen(descriptor, 'w') as save_file:
+                config.write(save_file)
+                save_file.flush()
+                os.fsync(save_file.fileno())
+            os.replace(temporary_path, self.path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+        self.writes += 1
+
+    def flush(self, timeout=None):
+        # wait until everything updated so far is on disk, returns False on timeout or if
+        # writing it fails
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.lock:
+            if self.written_version == self.version:
+                return True
+            write_errors = self.write_errors
+            # don't wait out the write delay
+            self.hurry = True
+            self.start_writer()
+            self.changed.notify_all()
+            while self.written_version != self.version:
+                if self.write_errors != write_errors:
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.changed.wait(remaining)
+            return True
+
+    def close(self):
+        # write anything pending and stop the writer, a later update starts it again;
+        # returns False if what was pending couldn't be written
+        with self.lock:
+            self.closing = True
+            if self.written_version != self.version:
+                self.start_writer()
+            self.changed.notify_all()
+            writer = self.writer
+        if writer is not None:
+            writer.join()
+        with self.lock:
+            self.closing = False
+            return self.written_version == self.version
+
+    def stats(self):
+        with self.lock:
+            return {
+                'reads': self.reads,
+                'updates': self.updates,
+                'writes': self.writes,
+                'write_errors': self.write_errors,
+                'last_error': None if self.last_error is None else str(self.last_error),
+                'pending': self.version != self.written_version,
+            }
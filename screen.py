@@ -3,17 +3,18 @@ import time
 
 from enum import Enum
 
-import client
+import assets
+import settings
 
 class Screen():
     def __init__(self, pygame_screen):
         self.pygame_screen = pygame_screen
-        self.font_path = client.font
+        self.font_path = settings.font
         self.fonts = {
-            'small': pygame.font.Font(client.font, 45),
-            'normal': pygame.font.Font(client.font, 55),
-            'large': pygame.font.Font(client.font, 75),
-            'heading': pygame.font.Font(client.font, 95),
+            'small': assets.get_font(settings.font, 45),
+            'normal': assets.get_font(settings.font, 55),
+            'large': assets.get_font(settings.font, 75),
+            'heading': assets.get_font(settings.font, 95),
         }
 
 
@@ -74,7 +75,7 @@ class MainMenu(Screen):
         self.options_length = len(self.main_options)
 
     def render_text(self, font, text, pos = (0, 0), colour = (0, 0, 0)):
-        rendered_text_surface = font.render(text, False, colour)
+        rendered_text_surface = assets.render_text(font, text, colour)
         self.pygame_screen.blit(rendered_text_surface, pos)
 
     def render(self, offset = (0, 0)):
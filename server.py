@@ -0,0 +1,307 @@
+import argparse
+import logging
+import time
+
+import numpy
+import zmq
+
+import protocol
+from level import ChunkedProceduralLevel
+from level import ProceduralLevel
+from projectile import ProjectileSystem
+from timestep import FixedTimestep
+
+'''
+An authoritative game server, for clients to connect to instead of the Pyre mesh.
+
+The server owns the level, every player's position and every spell. Clients send it
+their moves and casts, the same POSITION and SPELL messages they would shout to the
+mesh, and it only accepts moves onto open tiles within reach of the player's last
+position. Spells are simulated on the server alone at a fixed tick, so there is one
+answer to who hit whom, and snapshots of the whole world are broadcast snapshot_rate
+times a second.
+
+Two ZeroMQ sockets are used. Clients connect a DEALER to the server's ROUTER, on the
+port they're given, for HELLO, BYE, moves and casts, and get a WELCOME back naming
+the port of the PUB socket snapshots are published on. A moved player the server
+won't accept is sent their real position back, on the ROUTER.
+
+Run from the project directory, then start clients with --server:
+    python3 server.py --port 5555
+    python3 client.py --server tcp://127.0.0.1:5555
+
+'''
+
+log = logging.getLogger("server")
+
+
+class ServerPlayer():
+    def __init__(self, player_id, identity, now):
+        self.id = player_id
+        self.identity = identity
+        self.x = 0
+        self.y = 0
+        self.hits = 0
+        # until the client sends where it is
+        self.placed = False
+        self.last_seen = now
+        # when the client last sent its position
+        self.last_moved = now
+        # the most spells alive at once, as Player.spell_limit
+        self.spell_limit = 50
+
+
+class GameServer():
+    def __init__(self, host='127.0.0.1', port=5555, seed=42, size=None, tick_rate=60, snapshot_rate=20,
+                 timeout=5.0, max_speed=25, max_spell_speed=0.25):
+        # size is (width, height) of a fixed size level, None for a chunked one; a port of 0
+        # binds to any free ports, see endpoints once bound. max_speed is in tiles a second.
+        self.host = host
+        self.port = port
+        self.seed = seed
+        self.size = size
+        self.level = ChunkedProceduralLevel(seed) if size is None else ProceduralLevel(seed, size[0], size[1])
+        self.projectiles = ProjectileSystem(self.level)
+        self.timestep = FixedTimestep(tick_rate, max_ticks=5)
+        self.snapshot_interval = 1.0 / snapshot_rate
+        self.timeout = timeout
+        self.max_speed = max_speed
+        self.max_spell_speed = max_spell_speed
+
+        # ZeroMQ identity: ServerPlayer
+        self.players = {}
+        self.next_id = 1
+        self.tick_count = 0
+        self.snapshots = 0
+        self.encoder = protocol.Encoder()
+        self.context = None
+        self.router = None
+        self.publisher = None
+        self.running = False
+
+        self.received = 0
+        self.rejected_moves = 0
+        self.rejected_spells = 0
+        self.decode_errors = 0
+        self.snapshot_bytes = 0
+        self.hits = 0
+
+    def bind(self):
+        self.context = zmq.Context.instance()
+        self.router = self.context.socket(zmq.ROUTER)
+        self.publisher = self.context.socket(zmq.PUB)
+        # don't let a slow subscriber queue up old snapshots, newer ones replace them anyway
+        self.publisher.setsockopt(zmq.SNDHWM, 4)
+        if self.port:
+            self.router.bind('tcp://{0}:{1}'.format(self.host, self.port))
+            self.publisher.bind('tcp://{0}:{1}'.format(self.host, self.port + 1))
+        else:
+            self.router.bind('tcp://{0}:*'.format(self.host))
+            self.publisher.bind('tcp://{0}:*'.format(self.host))
+
+    def endpoints(self):
+        # the addresses clients connect to and snapshots are published on
+        return (
+            self.router.getsockopt(zmq.LAST_ENDPOINT).decode(),
+            self.publisher.getsockopt(zmq.LAST_ENDPOINT).decode()
+        )
+
+    def publisher_port(self):
+        return int(self.endpoints()[1].rsplit(':', 1)[1])
+
+    def run(self, duration=None):
+        # serve until stop is called, or for duration seconds
+        if self.router is None:
+            self.bind()
+        poller = zmq.Poller()
+        poller.register(self.router, zmq.POLLIN)
+        self.running = True
+        start = last = time.perf_counter()
+        next_snapshot = start
+        try:
+            while self.running and (duration is None or last - start < duration):
+                # sleep in poll until the next tick is due, unless a message arrives first
+                wait = max(0.0, self.timestep.tick_time - self.timestep.accumulator)
+                if poller.poll(wait * 1000):
+                    self.receive()
+
+                now = time.perf_counter()
+                for tick in range(self.timestep.advance(now - last)):
+                    self.tick()
+                last = now
+
+                if now >= next_snapshot:
+                    self.broadcast()
+                    next_snapshot = max(next_snapshot + self.snapshot_interval, now)
+                    self.drop_silent_players()
+        finally:
+            self.running = False
+            self.router.close(0)
+            self.publisher.close(0)
+            self.router = None
+            self.publisher = None
+
+    def stop(self):
+        # may be called from another thread, the server stops within a tick
+        self.running = False
+
+    def receive(self):
+        while True:
+            try:
+                identity, data = self.router.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                return
+            except ValueError:
+                # not the two frames a DEALER sends
+                self.decode_errors += 1
+                continue
+            self.received += 1
+            try:
+                message = protocol.decode(data)
+            except protocol.ProtocolError:
+                self.decode_errors += 1
+                continue
+            self.handle(identity, message)
+
+    def handle(self, identity, message):
+        now = time.perf_counter()
+        player = self.players.get(identity)
+        if player is None:
+            if message.kind == protocol.BYE:
+                return
+            # a client which timed out, or the server restarted, is let straight back in
+            player = self.join(identity, now)
+        player.last_seen = now
+
+        if message.kind == protocol.BYE:
+            self.remove_player(player)
+        elif message.kind == protocol.POSITION:
+            self.move(player, message.values[0], message.values[1], now)
+        elif message.kind == protocol.SPELL:
+            self.cast(player, *message.values)
+
+    def join(self, identity, now):
+        # ids are 16 bits in snapshots and wrap around, skipping any still in use
+        in_use = { player.id for player in self.players.values() }
+        while self.next_id in in_use:
+            self.next_id = self.next_id % 0xFFFF + 1
+        player = ServerPlayer(self.next_id, identity, now)
+        self.next_id = self.next_id % 0xFFFF + 1
+        self.players[identity] = player
+        width, height = self.size if self.size is not None else (0, 0)
+        self.send(player, protocol.WELCOME, (player.id, self.publisher_port(), self.seed, width, height))
+        log.info("player %d joined, %d playing", player.id, len(self.players))
+        return player
+
+    def send(self, player, kind, values):
+        try:
+            self.router.send_multipart([player.identity, self.encoder.encode(kind, values)], zmq.NOBLOCK)
+        except zmq.Again:
+            pass
+
+    def move(self, player, x, y, now):
+        # moves are only accepted onto open tiles, no further from the last position sent
+        # than max_speed allows, except the first which places the player
+        reach = max(1, self.max_speed * (now - player.last_moved))
+        player.last_moved = now
+        far = player.placed and max(abs(x - player.x), abs(y - player.y)) > reach
+        if far or not self.level.can_move_to(x, y):
+            self.rejected_moves += 1
+            self.send(player, protocol.POSITION, (player.x, player.y))
+            return
+        player.x = x
+        player.y = y
+        player.placed = True
+
+    def cast(self, player, x, y, x_velocity, y_velocity):
+        # spells must start on the caster's tile and go no faster than a player's do
+        if abs(x - player.x - 0.5) > 1 or abs(y - player.y - 0.5) > 1:
+            self.rejected_spells += 1
+            return
+        speed = self.max_spell_speed
+        x_velocity = min(max(x_velocity, -speed), speed)
+        y_velocity = min(max(y_velocity, -speed), speed)
+        self.projectiles.spawn(player, x, y, x_velocity, y_velocity, player.spell_limit)
+
+    def remove_player(self, player):
+        del self.players[player.identity]
+        self.projectiles.remove_owner(player)
+        log.info("player %d left, %d playing", player.id, len(self.players))
+
+    def drop_silent_players(self):
+        # clients send their position at least once a second, one that hasn't has gone
+        now = time.perf_counter()
+        for player in [ player for player in self.players.values() if now - player.last_seen > self.timeout ]:
+            log.info("player %d timed out", player.id)
+            self.remove_player(player)
+
+    def tick(self):
+        self.projectiles.step()
+        # spells are used up by the first player they hit
+        # players who haven't said where they are yet aren't on the map
+        hits = self.projectiles.find_hits(self.placed_players())
+        for spell, player in hits:
+            player.hits += 1
+        self.hits += len(hits)
+        self.projectiles.remove_indices([ spell for spell, player in hits ])
+        self.tick_count += 1
+
+    def placed_players(self):
+        return [ player for player in self.players.values() if player.placed ]
+
+    def snapshot(self):
+        placed = self.placed_players()
+        players = numpy.empty(len(placed), dtype=protocol.SNAPSHOT_PLAYER)
+        for index, player in enumerate(placed):
+            players[index] = (player.id, player.x, player.y, player.hits & 0xFFFF)
+        count = self.projectiles.count
+        spells = numpy.empty(count, dtype=protocol.SNAPSHOT_SPELL)
+        spells['x'] = self.projectiles.x[:count]
+        spells['y'] = self.projectiles.y[:count]
+        spells['x_velocity'] = self.projectiles.velocity_x[:count]
+        spells['y_velocity'] = self.projectiles.velocity_y[:count]
+        return protocol.encode_snapshot(self.snapshots, self.tick_count, players, spells)
+
+    def broadcast(self):
+        data = self.snapshot()
+        try:
+            self.publisher.send(data, zmq.NOBLOCK)
+        except zmq.Again:
+            pass
+        self.snapshots += 1
+        self.snapshot_bytes += len(data)
+
+    def stats(self):
+        return {
+            'players': len(self.players),
+            'spells': self.projectiles.count,
+            'ticks': self.tick_count,
+            'snapshots': self.snapshots,
+            'snapshot_bytes': self.snapshot_bytes,
+            'hits': self.hits,
+            'received': self.received,
+            'rejected_moves': self.rejected_moves,
+            'rejected_spells': self.rejected_spells,
+            'decode_errors': self.decode_errors,
+            'dropped_time': self.timestep.dropped_time,
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on, * for every interface')
+    parser.add_argument('--port', type=int, default=5555, help='clients connect here, snapshots go out on the next port')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--size', type=int, nargs=2, help='width and height of a fixed size level, chunked otherwise')
+    parser.add_argument('--tick-rate', type=int, default=60)
+    parser.add_argument('--snapshot-rate', type=int, default=20)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = GameServer(args.host, args.port, args.seed, args.size, args.tick_rate, args.snapshot_rate)
+    server.bind()
+    log.info("listening on %s, snapshots on %s", *server.endpoints())
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,19 @@
+'''
+Settings shared by the client and the modules it uses, kept here rather than in
+client.py so that player.py and screen.py don't have to import the client.
+
+'''
+
+font = 'assets/fonts/alterebro-pixel-font.ttf'
+level_tileset_path = 'assets/tilesets/main.png'
+player_animation_tileset_path = 'assets/tilesets/player.png'
+music_path = 'assets/music/song.mp3'
+
+# remote players are drawn this many seconds in the past, between the updates either side
+interpolation_delay = 0.1
+# how long a remote player keeps moving when their updates are late
+max_extrapolation = 0.25
+
+# where players are saved, and which of the profiles saved there is played, see save_store.py
+save_path = 'player_save'
+save_profile = 'default'
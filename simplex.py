@@ -0,0 +1,153 @@
+import numpy
+
+from opensimplex.opensimplex import GRADIENTS_2D
+from opensimplex.opensimplex import NORM_CONSTANT_2D
+from opensimplex.opensimplex import SQUISH_CONSTANT_2D
+from opensimplex.opensimplex import STRETCH_CONSTANT_2D
+
+'''
+A NumPy port of OpenSimplex.noise2d which evaluates a whole array of points at once.
+
+Every step mirrors the scalar implementation operation for operation so the results
+are bit-for-bit identical to calling noise2d in a loop, just without the per-point
+Python overhead.
+
+noise2d can also work in float32, which is about twice as fast. Finding the lattice
+cell and each point's offset within it is still done in float64, as that's where
+precision is lost at large coordinates, and only the contributions of the vertices,
+all of order 1, are summed in float32. The result is then within FLOAT32_ERROR of the
+exact one.
+
+'''
+
+# Points evaluated per pass, keeps the temporaries small enough to stay in cache.
+BLOCK_SIZE = 1 << 14
+
+# Lattice vertices are at most one cell behind and two cells ahead of the super-cell
+# origin, so the gradient tables are padded to avoid masking with 0xFF per vertex.
+TABLE_PADDING = 1
+TABLE_STRIDE = 256 + 3
+
+# a generous bound on how far float32 results are from float64 ones, the actual error
+# is around 1e-6
+FLOAT32_ERROR = 1e-4
+
+
+class VectorisedOpenSimplex():
+    def __init__(self, open_simplex):
+        perm = numpy.array(open_simplex._perm, dtype=numpy.int64)
+        lattice = (numpy.arange(TABLE_STRIDE) - TABLE_PADDING) & 0xFF
+
+        # index = perm[(perm[xsb & 0xFF] + ysb) & 0xFF] & 0x0E, for every (xsb, ysb) pair
+        index = perm[(perm[lattice][:, None] + lattice[None, :]) & 0xFF] & 0x0E
+        gradients = numpy.array(GRADIENTS_2D, dtype=numpy.float64)
+        # dtype: (x gradients, y gradients), the gradients are small integers so exact in either
+        self.gradients = {
+            numpy.dtype(numpy.float64): (gradients[index].ravel(), gradients[index + 1].ravel()),
+            numpy.dtype(numpy.float32): (
+                gradients[index].ravel().astype(numpy.float32), gradients[index + 1].ravel().astype(numpy.float32)
+            ),
+        }
+
+    def noise2d(self, x, y, dtype=numpy.float64):
+        # dtype float32 is faster, and within FLOAT32_ERROR of float64
+        dtype = numpy.dtype(dtype)
+        x, y = numpy.broadcast_arrays(
+            numpy.asarray(x, dtype=numpy.float64),
+            numpy.asarray(y, dtype=numpy.float64)
+        )
+        flat_x = x.ravel()
+        flat_y = y.ravel()
+        result = numpy.empty(flat_x.shape, dtype=dtype)
+        for start in range(0, flat_x.size, BLOCK_SIZE):
+            end = start + BLOCK_SIZE
+            self._noise2d_block(flat_x[start:end], flat_y[start:end], result[start:end])
+        return result.reshape(x.shape)
+
+    def _contribute(self, value, key, dx, dy):
+        gradients_x, gradients_y = self.gradients[value.dtype]
+        attn = dx * dx
+        numpy.subtract(2, attn, out=attn)
+        attn -= dy * dy
+        # a non-positive attenuation contributes nothing, clamping adds +/-0.0 to the sum
+        numpy.maximum(attn, 0, out=attn)
+        attn *= attn
+        attn *= attn
+        extrapolation = gradients_x.take(key)
+        extrapolation *= dx
+        dx = gradients_y.take(key)
+        dx *= dy
+        extrapolation += dx
+        attn *= extrapolation
+        value += attn
+
+    def _noise2d_block(self, x, y, value):
+        # Place input coordinates onto grid.
+        stretch_offset = (x + y) * STRETCH_CONSTANT_2D
+        xs = x + stretch_offset
+        ys = y + stretch_offset
+
+        # Floor to get grid coordinates of rhombus (stretched square) super-cell origin.
+        xsb = numpy.floor(xs)
+        ysb = numpy.floor(ys)
+
+        # Skew out to get actual coordinates of rhombus origin.
+        squish_offset = (xsb + ysb) * SQUISH_CONSTANT_2D
+
+        # Compute grid coordinates relative to rhombus origin.
+        xins = xs - xsb
+        yins = ys - ysb
+        in_sum = xins + yins
+
+        # Positions relative to origin point, from here on in the result's precision.
+        dtype = value.dtype
+        dx0 = (x - (xsb + squish_offset)).astype(dtype, copy=False)
+        dy0 = (y - (ysb + squish_offset)).astype(dtype, copy=False)
+        xins = xins.astype(dtype, copy=False)
+        yins = yins.astype(dtype, copy=False)
+        in_sum = in_sum.astype(dtype, copy=False)
+        squish = dtype.type(SQUISH_CONSTANT_2D)
+
+        # Flat index of the origin vertex in the padded gradient tables.
+        key = (xsb.astype(numpy.intp) & 0xFF) + TABLE_PADDING
+        key *= TABLE_STRIDE
+        key += (ysb.astype(numpy.intp) & 0xFF) + TABLE_PADDING
+
+        value[:] = 0
+
+        # Contribution (1,0)
+        self._contribute(value, key + TABLE_STRIDE,
+            dx0 - 1 - squish, dy0 - 0 - squish)
+        # Contribution (0,1)
+        self._contribute(value, key + 1,
+            dx0 - 0 - squish, dy0 - 1 - squish)
+
+        # upper is 1 inside the triangle (2-Simplex) at (1,1), 0 inside the one at (0,0)
+        upper = in_sum > 1
+        zins = numpy.where(upper, 2 - in_sum, 1 - in_sum)
+        # (0,0) or (1,1) is one of the closest two triangular vertices
+        near = numpy.where(upper, (zins < xins) | (zins < yins), (zins > xins) | (zins > yins))
+
+        # The extra vertex, as an offset from the origin vertex:
+        #   (0,0) triangle: (1,-1) or (-1,1) when near, otherwise (1,1)
+        #   (1,1) triangle: (2,0) or (0,2) when near, otherwise (0,0)
+        upper = upper.astype(dtype)
+        side = numpy.where(xins > yins, dtype.type(1), dtype.type(-1))
+        ext_x = numpy.where(near, side + upper, 1 - upper)
+        ext_y = numpy.where(near, upper - side, 1 - upper)
+
+        # Contribution (0,0) or (1,1)
+        self._contribute(value, key + upper.astype(numpy.intp) * (TABLE_STRIDE + 1),
+            dx0 - upper - (upper + upper) * squish,
+            dy0 - upper - (upper + upper) * squish)
+
+        # Extra Vertex
+        self._contribute(value, key + ext_x.astype(numpy.intp) * TABLE_STRIDE + ext_y.astype(numpy.intp),
+            dx0 - ext_x - (ext_x + ext_y) * squish,
+            dy0 - ext_y - (ext_x + ext_y) * squish)
+
+        value /= dtype.type(NORM_CONSTANT_2D)
+
+
+def noise2d(open_simplex, x, y):
+    return VectorisedOpenSimplex(open_simplex).noise2d(x, y)
@@ -0,0 +1,62 @@
+import numpy
+
+'''
+SpatialHash is a uniform grid over simulation (tile) coordinates.
+
+Points are bucketed by the cell they fall in, so a rectangle query only looks at the
+points in the handful of cells the rectangle overlaps rather than every point. The
+buckets are rebuilt wholesale from position arrays, which is cheap enough to do
+every tick.
+
+'''
+
+class SpatialHash():
+    def __init__(self, cell_size=1):
+        self.cell_size = cell_size
+        self.rebuild(numpy.zeros(0), numpy.zeros(0))
+
+    def cell_keys(self, cell_x, cell_y):
+        # pack both cell coordinates into one sortable integer
+        return (numpy.asarray(cell_x, dtype=numpy.int64) << 32) + (numpy.asarray(cell_y, dtype=numpy.int64) & 0xFFFFFFFF)
+
+    def rebuild(self, xs, ys):
+        self.xs = numpy.asarray(xs, dtype=numpy.float64)
+        self.ys = numpy.asarray(ys, dtype=numpy.float64)
+        keys = self.cell_keys(
+            numpy.floor(self.xs / self.cell_size),
+            numpy.floor(self.ys / self.cell_size)
+        )
+        # indices of the points sorted by cell, and each cell's run within that order
+        self.order = numpy.argsort(keys, kind='mergesort')
+        sorted_keys = keys[self.order]
+        starts = numpy.flatnonzero(numpy.diff(sorted_keys)) + 1
+        self.keys = sorted_keys[numpy.concatenate(([0], starts))] if len(sorted_keys) else sorted_keys
+        self.starts = numpy.concatenate(([0], starts)).astype(numpy.int64)
+        self.ends = numpy.concatenate((starts, [len(sorted_keys)])).astype(numpy.int64)
+
+    def __len__(self):
+        return len(self.xs)
+
+    def candidates(self, min_x, min_y, max_x, max_y):
+        # indices of points in every cell overlapping the rectangle, unfiltered
+        if not len(self.keys):
+            return numpy.zeros(0, dtype=numpy.int64)
+        cell_xs = numpy.arange(int(numpy.floor(min_x / self.cell_size)), int(numpy.floor(max_x / self.cell_size)) + 1)
+        cell_ys = numpy.arange(int(numpy.floor(min_y / self.cell_size)), int(numpy.floor(max_y / self.cell_size)) + 1)
+        query = self.cell_keys(numpy.repeat(cell_xs, len(cell_ys)), numpy.tile(cell_ys, len(cell_xs)))
+
+        found = numpy.searchsorted(self.keys, query)
+        valid = found < len(self.keys)
+        found = found[valid]
+        found = found[self.keys[found] == query[valid]]
+        if not len(found):
+            return numpy.zeros(0, dtype=numpy.int64)
+        return numpy.concatenate([ self.order[self.starts[i]:self.ends[i]] for i in found.tolist() ])
+
+    def query(self, min_x, min_y, max_x, max_y):
+        # indices of the points inside [min_x, max_x) x [min_y, max_y)
+        indices = self.candidates(min_x, min_y, max_x, max_y)
+        xs = self.xs[indices]
+        ys = self.ys[indices]
+        inside = (xs >= min_x) & (xs < max_x) & (ys >= min_y) & (ys < max_y)
+        return indices[inside]
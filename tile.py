@@ -2,6 +2,7 @@ from enum import Enum
 
 import pygame
 
+import assets
 import map
 
 '''
@@ -15,6 +16,17 @@ class TileAttribute(Enum):
     WATER =     0b1000
 
 
+def attribute_mask(*attributes):
+    # one bitmask with every given TileAttribute set, as used by the Level queries
+    mask = 0
+    for attribute in attributes:
+        mask |= attribute.value
+    return mask
+
+# attributes which hurt a player standing on them
+HAZARDS = attribute_mask(TileAttribute.SPIKES, TileAttribute.LAVA)
+
+
 class TileType(Enum):
     DIRT = (2, [])
     BRICK = (1, [ TileAttribute.COLLIDE ])
@@ -33,16 +45,50 @@ class TileType(Enum):
 
 
 class Tileset():
-    def __init__(self, image, grid_dimensions, render_dimensions=(map.TILE_PIX_WIDTH, map.TILE_PIX_HEIGHT)):
-        self.image = pygame.image.load(image)
+    '''
+    Slices a tileset image into one scaled surface per tile.
+
+    Every tile on the grid is sliced up front and converted to the display's pixel
+    format: tiles without a single transparent pixel with convert(), so they blit
+    without blending, and the rest with convert_alpha().
+
+    With rle every tile is kept with convert_alpha() and RLE accelerated instead, which
+    is quicker to blit but slower to change. SDL blits RLE encoded opaque pixels as
+    plain copies, so this beats convert() even for opaque tiles, see
+    benchmarks/blit_throughput.py.
+    '''
+    def __init__(self, image, grid_dimensions, render_dimensions=(map.TILE_PIX_WIDTH, map.TILE_PIX_HEIGHT), rle=False):
+        self.image = assets.get_image(image)
+        assets.counters['tileset_creations'] += 1
         self.grid_dimensions = grid_dimensions
         self.render_dimensions = render_dimensions
+        self.rle = rle
         self.surfaces = {}
+        # ids of the tiles with no transparent pixels
+        self.opaque = set()
 
-    def get_surface_by_id(self, id):
-        if id in self.surfaces:
-            return self.surfaces[id]
+        ids = set(
+            self.find_id(x, y)
+            for x in range(grid_dimensions[0])
+            for y in range(grid_dimensions[1])
+        )
+        for id in sorted(ids):
+            self.surfaces[id] = self.slice(id)
 
+    def get_surface_by_id(self, id):
+        surface = self.surfaces.get(id)
+        if surface is None:
+            surface = self.surfaces[id] = self.slice(id)
+        return surface
+
+    def is_opaque(self, surface):
+        if surface.get_colorkey() is not None:
+            return False
+        if not surface.get_flags() & pygame.SRCALPHA:
+            return True
+        return pygame.surfarray.array_alpha(surface).min() == 255
+
+    def slice(self, id):
         clip_x, clip_y = self.find_position(id)
 
         cur_tile_width = (self.image.get_width() // self.grid_dimensions[0])
@@ -55,11 +101,17 @@ class Tileset():
             cur_tile_height
         )
 
-        subsurface = self.image.subsurface(clip_rect).convert_alpha()
-        subsurface = pygame.transform.scale(subsurface, self.render_dimensions)
-        self.surfaces[id] = subsurface
-
-        return self.surfaces[id]
+        subsurface = self.image.subsurface(clip_rect)
+        if self.is_opaque(subsurface):
+            self.opaque.add(id)
+        if id in self.opaque and not self.rle:
+            surface = subsurface.convert()
+        else:
+            surface = subsurface.convert_alpha()
+        surface = pygame.transform.scale(surface, self.render_dimensions)
+        if self.rle:
+            surface.set_alpha(255, pygame.RLEACCEL)
+        return surface
 
     def find_position(self, id):
         x = id % self.grid_dimensions[0]
@@ -0,0 +1,39 @@
+'''
+FixedTimestep runs the simulation at a fixed tick rate, however fast frames are drawn.
+
+Each frame adds the time it took to an accumulator and the simulation is ticked once
+for every whole tick in it. A fast machine draws several frames per tick, a slow one
+runs several ticks per frame, so spells move at the same speed on both. Whatever is
+left over (alpha, as a fraction of a tick) is how far rendering should interpolate
+from the previous tick to the last one.
+
+A frame never runs more than max_ticks ticks. If the simulation can't keep up the
+rest of the time is dropped, and the world slows down rather than every frame taking
+longer than the last.
+
+'''
+
+class FixedTimestep():
+    def __init__(self, rate=60, max_ticks=5):
+        self.rate = rate
+        self.tick_time = 1.0 / rate
+        self.max_ticks = max_ticks
+        self.accumulator = 0.0
+        self.ticks = 0
+        self.dropped_time = 0.0
+
+    def advance(self, elapsed):
+        # add elapsed seconds, returns how many ticks to run now
+        self.accumulator += elapsed
+        ticks = int(self.accumulator // self.tick_time)
+        if ticks > self.max_ticks:
+            self.dropped_time += (ticks - self.max_ticks) * self.tick_time
+            ticks = self.max_ticks
+            self.accumulator %= self.tick_time
+        else:
+            self.accumulator -= ticks * self.tick_time
+        self.ticks += ticks
+        return ticks
+
+    def alpha(self):
+        return self.accumulator / self.tick_time